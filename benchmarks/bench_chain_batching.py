@@ -0,0 +1,76 @@
+"""
+Breach recording throughput and gas per breach: one recordBreach
+transaction per breach versus recordBreaches batches.
+
+Needs the Hardhat localhost node with the current Provenance contract
+deployed (npx hardhat node; npx hardhat run scripts/deploy.js --network localhost).
+Log output goes to a temporary directory; Redis feedback is disabled.
+
+Usage: python benchmarks/bench_chain_batching.py [breaches]
+"""
+import os
+import sys
+import time
+import logging
+import tempfile
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+from blockchain.integration import BlockchainRecorder
+
+BATCH_SIZES = (1, 10, 50, 100, 200)
+
+
+def breaches(count, offset=0):
+    return [(f"PALLET_{offset + i:06d}", 9 + i % 5, [52.0, 8.0]) for i in range(count)]
+
+
+def run_single(recorder, count):
+    """(breaches/s, gas per breach) with one recordBreach transaction and receipt wait each"""
+    tx_hashes = []
+    started = time.perf_counter()
+    for pallet_id, temperature, location in breaches(count):
+        tx_hashes.append(recorder.record_temperature_breach(pallet_id, temperature, location))
+    elapsed = time.perf_counter() - started
+    if None in tx_hashes:
+        raise RuntimeError("recordBreach failed, see the recorder log")
+    gas = sum(recorder.w3.eth.get_transaction_receipt(tx_hash).gasUsed for tx_hash in tx_hashes)
+    return count / elapsed, gas / count
+
+
+def run_batched(recorder, count, batch_size):
+    """(breaches/s, gas per breach) with recordBreaches batches of `batch_size`"""
+    items = breaches(count)
+    tx_hashes = set()
+    started = time.perf_counter()
+    for start in range(0, count, batch_size):
+        results = recorder.record_temperature_breaches(items[start:start + batch_size])
+        if results is None:
+            raise RuntimeError("recordBreaches failed; is the current contract deployed?")
+        tx_hashes.update(tx_hash for tx_hash, _ in results)
+    elapsed = time.perf_counter() - started
+    gas = sum(recorder.w3.eth.get_transaction_receipt(tx_hash).gasUsed for tx_hash in tx_hashes)
+    return count / elapsed, gas / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    log_file = os.path.join(tempfile.mkdtemp(), 'blockchain_recorder.log')
+    recorder = BlockchainRecorder(simulation_mode=False, redis_enabled=False, log_file=log_file)
+    # Per-transaction INFO lines would swamp the table
+    recorder.logger.setLevel(logging.WARNING)
+
+    print(f"{count} breaches against {recorder.contract_address}")
+    print(f"{'batch':>6} {'breaches/s':>11} {'gas/breach':>11} {'speedup':>8}")
+    baseline = None
+    for batch_size in BATCH_SIZES:
+        if batch_size == 1:
+            rate, gas = run_single(recorder, count)
+            baseline = rate
+        else:
+            rate, gas = run_batched(recorder, count, batch_size)
+        print(f"{batch_size:>6} {rate:>11.1f} {gas:>11.0f} {rate / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
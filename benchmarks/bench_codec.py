@@ -0,0 +1,59 @@
+"""
+Micro-benchmark of the wire codec against plain JSON.
+
+Usage: python benchmarks/bench_codec.py [iterations]
+"""
+import os
+import sys
+import json
+import timeit
+from datetime import datetime
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+from messaging import codec
+
+SAMPLES = {
+    'sensor_data': {
+        "pallet_id": "PALLET_000123",
+        "timestamp": datetime.utcnow().isoformat() + 'Z',
+        "location": {"lat": 52.48811723611111, "lon": 11.617203131313131},
+        "temperature": 6.41,
+        "status": "IN_TRANSIT"
+    },
+    'alerts': {
+        'type': 'temperature_breach',
+        'pallet_id': "PALLET_000123",
+        'temperature': 8.37,
+        'location': {"lat": 52.48811723611111, "lon": 11.617203131313131},
+        'timestamp': datetime.now().isoformat()
+    },
+    'events': {
+        "type": "blockchain_recorded",
+        "pallet_id": "PALLET_000123",
+        "tx_hash": "9f2c4c1b7e6a3d10",
+        "timestamp": datetime.now().isoformat()
+    },
+}
+
+
+def bench(message, encoding, iterations):
+    payload = codec.encode(message, encoding)
+    encode_s = timeit.timeit(lambda: codec.encode(message, encoding), number=iterations)
+    decode_s = timeit.timeit(lambda: codec.decode(payload), number=iterations)
+    size = len(payload.encode() if isinstance(payload, str) else payload)
+    return encode_s / iterations * 1e6, decode_s / iterations * 1e6, size
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"msgpack available: {codec.msgpack is not None}")
+    print(f"{'channel':<12} {'encoding':<8} {'encode us':>10} {'decode us':>10} {'bytes':>6}")
+    for channel, message in SAMPLES.items():
+        for encoding in ('json', 'binary'):
+            encode_us, decode_us, size = bench(message, encoding, iterations)
+            print(f"{channel:<12} {encoding:<8} {encode_us:>10.2f} {decode_us:>10.2f} {size:>6}")
+
+
+if __name__ == "__main__":
+    main()
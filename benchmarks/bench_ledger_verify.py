@@ -0,0 +1,63 @@
+"""
+Ledger verification throughput: sequential re-hash, parallel audit at
+several worker counts, and an incremental check after a checkpoint.
+
+Usage: python benchmarks/bench_ledger_verify.py [blocks]
+"""
+import os
+import sys
+import time
+import logging
+import tempfile
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+from blockchain.mock_ledger import MockLedger
+from blockchain.ledger_verifier import LedgerVerifier
+
+WORKERS = (1, 2, 4, 8)
+NEW_BLOCKS = 10_000
+
+
+def fill(ledger, count):
+    for i in range(count):
+        ledger.append({
+            'type': 'temperature_breach',
+            'pallet_id': f"PALLET_{i % 5000:06d}",
+            'temperature': 8 + i % 7,
+            'location': [1.3 + i % 100 / 1000, 103.8],
+            'status': 'recorded'
+        })
+
+
+def main():
+    blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    logging.getLogger('BlockchainRecorder').setLevel(logging.WARNING)
+    ledger = MockLedger(tempfile.mkdtemp(), hot_blocks=0)
+    verifier = LedgerVerifier(ledger, key='bench')
+
+    started = time.perf_counter()
+    fill(ledger, blocks)
+    print(f"{blocks} blocks written at {blocks / (time.perf_counter() - started):,.0f} blocks/s "
+          f"({os.path.getsize(ledger.data_path) / 1e6:.0f} MB), {os.cpu_count()} CPUs")
+
+    print(f"{'mode':>16} {'blocks':>9} {'seconds':>8} {'blocks/s':>11}")
+    started = time.perf_counter()
+    assert ledger.verify() is None
+    seconds = time.perf_counter() - started
+    print(f"{'sequential':>16} {blocks:>9} {seconds:>8.2f} {blocks / seconds:>11,.0f}")
+    for workers in WORKERS:
+        report = verifier.audit(workers=workers)
+        assert report['ok']
+        print(f"{f'audit ({workers})':>16} {report['blocks']:>9} {report['seconds']:>8.2f} {report['blocks_per_s']:>11,.0f}")
+
+    verifier.checkpoint()
+    fill(ledger, NEW_BLOCKS)
+    report = verifier.verify_incremental()
+    assert report['ok']
+    print(f"{'incremental':>16} {report['blocks']:>9} {report['seconds']:>8.2f} {report['blocks_per_s']:>11,.0f}")
+    ledger.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+SimpleProductAgent throughput with synchronous versus queue-based logging.
+
+Each mode runs in its own process so that logger setup does not leak
+between runs. Console output goes to /dev/null; log files go to a
+temporary directory.
+
+Usage: python benchmarks/bench_logging.py [readings]
+"""
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+MODES = (
+    # (label, LOG_MODE, print every reading)
+    ('sync + print', 'sync', True),
+    ('sync', 'sync', False),
+    ('queue', 'queue', False),
+)
+
+
+def run_agent(readings, echo):
+    """Feed encoded readings straight into process_message and return readings/s"""
+    from mas.agents.simple_agent import SimpleProductAgent
+    from messaging.codec import encode, now_ms
+
+    log_dir = tempfile.mkdtemp()
+    agent = SimpleProductAgent(log_file=os.path.join(log_dir, 'agent.log'), echo_readings=echo)
+    start_ms = now_ms()
+    messages = [{
+        'type': 'message',
+        'data': encode({
+            'pallet_id': f"PALLET_{i % 1000:06d}",
+            'timestamp': start_ms + i,
+            'location': {'lat': 52.0, 'lon': 8.0},
+            # Steady and below threshold per pallet: no alerts, so only logging cost is measured
+            'temperature': 4.0 + (i % 1000) / 500.0,
+            'status': 'IN_TRANSIT'
+        })
+    } for i in range(readings)]
+
+    started = time.perf_counter()
+    for message in messages:
+        agent.process_message(message)
+    return readings / (time.perf_counter() - started)
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--worker':
+        readings, echo = int(sys.argv[2]), sys.argv[3] == '1'
+        with open(os.devnull, 'w') as devnull:
+            stdout, sys.stdout, sys.stderr = sys.stdout, devnull, devnull
+            rate = run_agent(readings, echo)
+        stdout.write(f"{rate:.0f}\n")
+        return
+
+    readings = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    print(f"{readings} readings per mode")
+    print(f"{'mode':>14} {'readings/s':>12}")
+    for label, mode, echo in MODES:
+        output = subprocess.run(
+            [sys.executable, __file__, '--worker', str(readings), '1' if echo else '0'],
+            env=dict(os.environ, LOG_MODE=mode), capture_output=True, text=True, check=True
+        )
+        print(f"{label:>14} {float(output.stdout.strip()):>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Merkle log append and inclusion-proof cost as the log grows.
+
+Usage: python benchmarks/bench_merkle.py [max leaves]
+"""
+import os
+import sys
+import time
+import random
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+from blockchain.merkle import MerkleLog, leaf_hash, verify_inclusion
+
+PROOFS = 2000
+
+
+def main():
+    max_leaves = int(sys.argv[1]) if len(sys.argv) > 1 else 4_000_000
+    checkpoints = [n for n in (10_000, 100_000, 1_000_000, 4_000_000, 16_000_000) if n <= max_leaves]
+    rng = random.Random(42)
+    log = MerkleLog()
+
+    print(f"{'leaves':>10} {'append µs':>10} {'root µs':>8} {'proof µs':>9} {'verify µs':>10} {'MB':>7}")
+    for n in checkpoints:
+        start = len(log)
+        started = time.perf_counter()
+        for i in range(start, n):
+            log.append(leaf_hash(i.to_bytes(8, 'big')))
+        append_us = (time.perf_counter() - started) / (n - start) * 1e6
+
+        started = time.perf_counter()
+        root = log.root()
+        root_us = (time.perf_counter() - started) * 1e6
+
+        indexes = [rng.randrange(n) for _ in range(PROOFS)]
+        started = time.perf_counter()
+        proofs = [log.proof(index) for index in indexes]
+        proof_us = (time.perf_counter() - started) / PROOFS * 1e6
+
+        started = time.perf_counter()
+        assert all(verify_inclusion(log.leaf(index), index, n, path, root) for index, path in zip(indexes, proofs))
+        verify_us = (time.perf_counter() - started) / PROOFS * 1e6
+
+        megabytes = sum(len(level) for level in log.levels) / 1e6
+        print(f"{n:>10} {append_us:>10.2f} {root_us:>8.1f} {proof_us:>9.1f} {verify_us:>10.1f} {megabytes:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
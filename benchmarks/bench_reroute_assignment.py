@@ -0,0 +1,55 @@
+"""
+Solve time of batched reroute assignment against batch size.
+
+Pallets are clustered around a heat-event centre so that the nearest
+depots run out of capacity, which is where a per-alert greedy choice
+overfills them.
+
+Usage: python benchmarks/bench_reroute_assignment.py [warehouses]
+"""
+import os
+import sys
+import random
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+from mas.agents.warehouse_index import WarehouseIndex
+from mas.agents import reroute_assignment
+from mas.agents.reroute_assignment import RerouteAssigner
+
+BATCH_SIZES = (10, 50, 100, 250, 500, 1000)
+HEAT_EVENT = (48.1, 11.6)  # Munich
+
+
+def build_index(n_warehouses, rng):
+    index = WarehouseIndex(cell_deg=0.5)
+    for n in range(n_warehouses):
+        location = [rng.uniform(36.0, 70.0), rng.uniform(-10.0, 35.0)]
+        index.add(f"warehouse_{n:05d}", location, rng.randint(1, 20), rng.random() > 0.1)
+    return index
+
+
+def pallets_near(center, count, rng):
+    return [(f"PALLET_{i:05d}", [rng.gauss(center[0], 1.0), rng.gauss(center[1], 1.5)]) for i in range(count)]
+
+
+def main():
+    n_warehouses = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    solvers = ['greedy'] + (['optimal'] if reroute_assignment.linear_sum_assignment is not None else [])
+    print(f"{n_warehouses} warehouses, solvers: {', '.join(solvers)}")
+    print(f"{'batch':>6} {'solver':>8} {'solve ms':>10} {'ms/pallet':>10} {'assigned':>9} {'mean km':>9}")
+
+    for batch_size in BATCH_SIZES:
+        for solver in solvers:
+            rng = random.Random(batch_size)
+            index = build_index(n_warehouses, rng)
+            pallets = pallets_near(HEAT_EVENT, batch_size, rng)
+            result = RerouteAssigner(index, solver=solver).assign(pallets)
+            distances = [distance for _, distance in result.assigned.values()]
+            mean_km = sum(distances) / len(distances) if distances else float('nan')
+            print(f"{batch_size:>6} {solver:>8} {result.solve_ms:>10.2f} {result.solve_ms / batch_size:>10.3f} "
+                  f"{len(result.assigned):>9} {mean_km:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Sustained transactions/s: send-and-wait-for-receipt versus the pipelined
+TransactionPipeline at several in-flight limits.
+
+Backends:
+- hardhat: recordBreach calls against the deployed Provenance contract on
+  http://127.0.0.1:8545 (npx hardhat node + scripts/deploy.js)
+- tester: plain value transfers on web3's in-process EthereumTesterProvider
+  (pip install "eth-tester[py-evm]"); measures the engine, not a real node
+
+Usage: python benchmarks/bench_tx_pipeline.py [--backend hardhat|tester] [--count N]
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+from web3 import Web3
+from blockchain.tx_pipeline import TransactionPipeline
+
+IN_FLIGHT = (1, 16, 64, 256)
+
+
+def hardhat_backend():
+    """(w3, make_transaction) for recordBreach calls on the deployed contract"""
+    from blockchain.integration import BlockchainRecorder
+    log_file = os.path.join(tempfile.mkdtemp(), 'blockchain_recorder.log')
+    recorder = BlockchainRecorder(simulation_mode=False, redis_enabled=False, log_file=log_file)
+    recorder.logger.setLevel(logging.WARNING)
+    return recorder.w3, lambda i: recorder.contract.functions.recordBreach(f"PALLET_{i:06d}", 9 + i % 5)
+
+
+def tester_backend():
+    """(w3, make_transaction) for value transfers on an in-process chain"""
+    from web3 import EthereumTesterProvider
+    w3 = Web3(EthereumTesterProvider())
+    w3.eth.default_account = w3.eth.accounts[0]
+    recipient = w3.eth.accounts[1]
+    return w3, lambda i: {'to': recipient, 'value': 1}
+
+
+def run_sequential(w3, make_transaction, count):
+    """The original pattern: send, then block on the receipt"""
+    started = time.perf_counter()
+    for i in range(count):
+        transaction = make_transaction(i)
+        if isinstance(transaction, dict):
+            tx_hash = w3.eth.send_transaction(dict(transaction, **{'from': w3.eth.default_account}))
+        else:
+            tx_hash = transaction.transact()
+        w3.eth.wait_for_transaction_receipt(tx_hash, poll_latency=0.01)
+    return count / (time.perf_counter() - started)
+
+
+def run_pipelined(w3, make_transaction, count, max_in_flight):
+    confirmed = []
+    pipeline = TransactionPipeline(w3, on_confirmed=confirmed.extend, max_in_flight=max_in_flight,
+                                   poll_interval=0.05)
+    started = time.perf_counter()
+    for i in range(count):
+        pipeline.submit(make_transaction(i), payload=i)
+    pipeline.drain(timeout=600)
+    elapsed = time.perf_counter() - started
+    pipeline.close(timeout=0)
+    if len(confirmed) != count:
+        raise RuntimeError(f"only {len(confirmed)} of {count} transactions confirmed: {pipeline.stats()}")
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--backend', choices=['hardhat', 'tester'], default='hardhat')
+    parser.add_argument('--count', type=int, default=1000)
+    args = parser.parse_args()
+
+    w3, make_transaction = hardhat_backend() if args.backend == 'hardhat' else tester_backend()
+    logging.basicConfig(level=logging.WARNING)
+
+    print(f"{args.count} transactions on {args.backend}")
+    print(f"{'mode':>18} {'tx/s':>9} {'speedup':>8}")
+    baseline = run_sequential(w3, make_transaction, args.count)
+    print(f"{'send + wait':>18} {baseline:>9.1f} {1.0:>7.1f}x")
+    for max_in_flight in IN_FLIGHT:
+        rate = run_pipelined(w3, make_transaction, args.count, max_in_flight)
+        print(f"{f'pipelined ({max_in_flight})':>18} {rate:>9.1f} {rate / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark of WarehouseIndex k-nearest queries against a linear scan.
+
+Usage: python benchmarks/bench_warehouse_index.py [warehouses] [queries]
+"""
+import os
+import sys
+import time
+import random
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+from mas.agents.warehouse_index import WarehouseIndex, haversine_km
+
+# Rough bounding box of the EU
+LAT_RANGE = (36.0, 70.0)
+LON_RANGE = (-10.0, 35.0)
+
+
+def random_location(rng):
+    return [rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)]
+
+
+def linear_scan(warehouses, location, k, min_capacity=1):
+    """Reference: what find_nearest_warehouse did, with haversine distance"""
+    distances = [
+        (haversine_km(location, data['location']), name) for name, data in warehouses.items()
+        if data['available'] and data['capacity'] >= min_capacity
+    ]
+    return [(name, distance) for distance, name in sorted(distances)[:k]]
+
+
+def timed(fn, queries):
+    started = time.perf_counter()
+    results = [fn(q) for q in queries]
+    return (time.perf_counter() - started) / len(queries) * 1e6, results
+
+
+def main():
+    n_warehouses = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    rng = random.Random(42)
+
+    started = time.perf_counter()
+    index = WarehouseIndex(cell_deg=0.5)
+    for n in range(n_warehouses):
+        index.add(f"warehouse_{n:05d}", random_location(rng), rng.randint(0, 200), rng.random() > 0.2)
+    build_ms = (time.perf_counter() - started) * 1000
+    queries = [random_location(rng) for _ in range(n_queries)]
+
+    print(f"{n_warehouses} warehouses, {n_queries} queries, index built in {build_ms:.1f} ms")
+    print(f"{'k':>4} {'index us/query':>16} {'scan us/query':>15} {'speedup':>9}")
+    for k in (1, 5, 20):
+        index_us, found = timed(lambda q: index.nearest(q, k), queries)
+        scan_us, expected = timed(lambda q: linear_scan(index.warehouses, q, k), queries[:200])
+        for got, want in zip(found, expected):
+            assert [round(d, 6) for _, d in got] == [round(d, 6) for _, d in want], "index disagrees with scan"
+        print(f"{k:>4} {index_us:>16.1f} {scan_us:>15.1f} {scan_us / index_us:>8.1f}x")
+
+    names = list(index.warehouses)
+    started = time.perf_counter()
+    for _ in range(100_000):
+        index.update(rng.choice(names), available=rng.random() > 0.2, capacity=rng.randint(0, 200))
+    print(f"availability/capacity update: {(time.perf_counter() - started) / 100_000 * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
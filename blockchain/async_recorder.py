@@ -0,0 +1,237 @@
+import heapq
+import logging
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from messaging.metrics import LatencyRecorder
+
+_Job = namedtuple('_Job', ['job_id', 'pallet_id', 'temperature', 'location', 'attempt'])
+
+
+class AsyncBlockchainRecorder:
+    """
+    Records temperature breaches on a background thread.
+
+    submit() only puts the breach on a bounded queue, so callers never wait
+    for a transaction receipt. The worker calls
+    BlockchainRecorder.record_temperature_breach, which publishes a
+    `blockchain_recorded` event on success. Failed attempts are retried with
+    exponential backoff and jitter; once `max_attempts` is reached a
+    `blockchain_failed` event is published instead. Retries wait in a
+    separate schedule, so one failing breach does not hold up the queue.
+
+    With `batch_size` > 1 the worker collects breaches until it has
+    `batch_size` of them or `batch_wait` seconds have passed since the first,
+    and records them with one BlockchainRecorder.record_temperature_breaches
+    transaction. A failed batch puts every breach in it back on the retry
+    schedule.
+    """
+
+    def __init__(self, recorder, max_queue=10_000, max_attempts=5, backoff=0.5, max_backoff=30.0,
+                 batch_size=1, batch_wait=2.0):
+        """
+        Args:
+            recorder (BlockchainRecorder): Does the actual recording and feedback publishing
+            max_queue (int): Breaches that can wait before submit() starts rejecting
+            max_attempts (int): Attempts per breach before giving up
+            backoff (float): Delay before the first retry, doubled for every further one
+            max_backoff (float): Upper bound of the retry delay
+            batch_size (int): Breaches per transaction; 1 records each breach on its own
+            batch_wait (float): Seconds a partial batch waits for more breaches
+        """
+        self.recorder = recorder
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.logger = logging.getLogger('BlockchainRecorder')
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._retries = []  # heap of (ready_at, job_id, job)
+        self._pending = OrderedDict()  # job_id -> submitted_at, oldest first
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._stopping = threading.Event()
+
+        self.record_latency = LatencyRecorder()
+        self.counters = {'submitted': 0, 'recorded': 0, 'retried': 0, 'failed': 0, 'rejected': 0, 'batches': 0}
+
+        self._worker = threading.Thread(target=self._run, name='blockchain-recorder', daemon=True)
+        self._worker.start()
+
+    def submit(self, pallet_id, temperature, location):
+        """
+        Queue a breach for recording without waiting for the chain.
+
+        Returns:
+            bool: False if the queue is full and the breach was not accepted
+        """
+        # Registered before the put: the worker may finish the job before put_nowait returns
+        with self._lock:
+            job_id = self._next_id
+            self._next_id += 1
+            self._pending[job_id] = time.monotonic()
+        try:
+            self._queue.put_nowait(_Job(job_id, pallet_id, temperature, location, 1))
+        except queue.Full:
+            with self._lock:
+                del self._pending[job_id]
+            self._count('rejected')
+            self.logger.error(f"Blockchain queue full, breach for {pallet_id} not recorded")
+            return False
+        self._count('submitted')
+        return True
+
+    def _count(self, name, n=1):
+        """Counters change on the caller's and the worker's threads"""
+        with self._lock:
+            self.counters[name] += n
+
+    # ---------------------------
+    # Worker
+    # ---------------------------
+    def _next_job(self):
+        """Next due retry, else the next queued breach, waiting until a retry becomes due"""
+        with self._lock:
+            if self._retries and self._retries[0][0] <= time.monotonic():
+                return heapq.heappop(self._retries)[2]
+            timeout = max(0.0, self._retries[0][0] - time.monotonic()) if self._retries else 0.5
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _fill_batch(self, first):
+        """Add due retries and queued breaches to `first` until the batch is full or batch_wait has passed"""
+        jobs = [first]
+        deadline = time.monotonic() + (0.0 if self._stopping.is_set() else self.batch_wait)
+        while len(jobs) < self.batch_size:
+            with self._lock:
+                if self._retries and self._retries[0][0] <= time.monotonic():
+                    jobs.append(heapq.heappop(self._retries)[2])
+                    continue
+            remaining = deadline - time.monotonic()
+            try:
+                jobs.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return jobs
+
+    def _finish(self, job):
+        with self._lock:
+            self._pending.pop(job.job_id, None)
+
+    def _failed(self, job, log=True):
+        """Schedule a retry, or give up once max_attempts is reached"""
+        if job.attempt < self.max_attempts:
+            delay = min(self.max_backoff, self.backoff * 2 ** (job.attempt - 1)) * random.uniform(0.5, 1.0)
+            self._count('retried')
+            if log:
+                self.logger.warning(
+                    f"Recording breach for {job.pallet_id} failed (attempt {job.attempt}), retrying in {delay:.1f}s"
+                )
+            with self._lock:
+                heapq.heappush(self._retries, (time.monotonic() + delay, job.job_id,
+                                               job._replace(attempt=job.attempt + 1)))
+        else:
+            self._count('failed')
+            self.logger.error(f"Giving up recording breach for {job.pallet_id} after {job.attempt} attempts")
+            self.recorder._publish_feedback(job.pallet_id, None, event_type="blockchain_failed")
+            self._finish(job)
+
+    def _record(self, jobs):
+        """True if every breach in `jobs` was recorded"""
+        if self.batch_size == 1:
+            job = jobs[0]
+            return bool(self.recorder.record_temperature_breach(job.pallet_id, job.temperature, job.location))
+        results = self.recorder.record_temperature_breaches(
+            [(job.pallet_id, job.temperature, job.location) for job in jobs]
+        )
+        return bool(results)
+
+    def _run(self):
+        while not (self._stopping.is_set() and self.depth() == 0):
+            jobs = []
+            try:
+                self._step(jobs)
+            except Exception as e:
+                # The worker must outlive any error, or submitted breaches would never be recorded
+                self.logger.error(f"Blockchain recorder worker error: {e}", exc_info=True)
+                for job in jobs:
+                    try:
+                        self._failed(job)
+                    except Exception:
+                        self.logger.error(f"Could not schedule a retry for {job.pallet_id}", exc_info=True)
+                time.sleep(min(self.backoff, 1.0))
+
+        # Anchor what was logged since the last root so shutdown loses no breach
+        try:
+            self.recorder.maybe_anchor(force=True)
+        except Exception as e:
+            self.logger.error(f"Final anchoring failed: {e}", exc_info=True)
+
+    def _step(self, jobs):
+        """One worker iteration; `jobs` holds the breaches in flight so _run can retry them on an error"""
+        # No-op unless the recorder is in anchoring mode
+        self.recorder.maybe_anchor()
+        job = self._next_job()
+        if job is None:
+            return
+        jobs.append(job)
+        if self.batch_size > 1:
+            jobs[:] = self._fill_batch(job)
+
+        started = time.perf_counter()
+        recorded = self._record(jobs)
+        self.record_latency.record(time.perf_counter() - started)
+        self._count('batches')
+
+        single = len(jobs) == 1
+        if not recorded and not single:
+            self.logger.warning(f"Recording batch of {len(jobs)} breaches failed, scheduling retries")
+        # Popped as handled, so an error part way leaves only the unhandled ones for _run to retry
+        while jobs:
+            job = jobs.pop(0)
+            if recorded:
+                self._count('recorded')
+                self._finish(job)
+            else:
+                self._failed(job, log=single)
+
+    # ---------------------------
+    # Metrics and shutdown
+    # ---------------------------
+    def depth(self):
+        """Breaches submitted but not yet recorded or given up on"""
+        with self._lock:
+            return len(self._pending)
+
+    def oldest_age(self):
+        """Seconds the oldest unfinished breach has been waiting"""
+        with self._lock:
+            if not self._pending:
+                return 0.0
+            return time.monotonic() - next(iter(self._pending.values()))
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            waiting_retry = len(self._retries)
+        return dict(
+            counters,
+            depth=self.depth(),
+            waiting_retry=waiting_retry,
+            oldest_age_s=round(self.oldest_age(), 3),
+            record_latency_ms=self.record_latency.percentiles()
+        )
+
+    def close(self, timeout=10.0):
+        """Stop accepting work and give the worker up to `timeout` seconds to drain"""
+        self._stopping.set()
+        self._worker.join(timeout)
+        if self._worker.is_alive():
+            self.logger.warning(f"Blockchain queue not drained on shutdown: {self.depth()} breaches pending")
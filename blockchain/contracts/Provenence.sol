@@ -3,8 +3,70 @@ pragma solidity ^0.8.0;
 
 contract Provenance {
     event TemperatureBreachRecorded(string palletId, uint256 timestamp, uint256 temperature);
+    event MerkleRootAnchored(uint256 indexed anchorId, bytes32 root, uint256 leafCount, uint256 timestamp);
+
+    struct Anchor {
+        bytes32 root;
+        uint256 leafCount;
+    }
+
+    // Roots of the off-chain breach log (blockchain/merkle.py), oldest first
+    Anchor[] public anchors;
 
     function recordBreach(string memory _palletId, uint256 _temperature) public {
         emit TemperatureBreachRecorded(_palletId, block.timestamp, _temperature);
     }
+
+    // One event per breach, in input order, so log indexes map back to the batch
+    function recordBreaches(string[] calldata _palletIds, uint256[] calldata _temperatures) external {
+        require(_palletIds.length == _temperatures.length, "length mismatch");
+        for (uint256 i = 0; i < _palletIds.length; i++) {
+            emit TemperatureBreachRecorded(_palletIds[i], block.timestamp, _temperatures[i]);
+        }
+    }
+
+    function anchorRoot(bytes32 _root, uint256 _leafCount) external returns (uint256 anchorId) {
+        anchorId = anchors.length;
+        anchors.push(Anchor(_root, _leafCount));
+        emit MerkleRootAnchored(anchorId, _root, _leafCount, block.timestamp);
+    }
+
+    function anchorCount() external view returns (uint256) {
+        return anchors.length;
+    }
+
+    // RFC 9162 inclusion proof against an anchored root, hashed with sha256 like the Python log
+    function verifyInclusion(
+        uint256 _anchorId,
+        bytes32 _leafHash,
+        uint256 _leafIndex,
+        bytes32[] calldata _proof
+    ) external view returns (bool) {
+        Anchor storage anchor = anchors[_anchorId];
+        if (_leafIndex >= anchor.leafCount) {
+            return false;
+        }
+        uint256 fn = _leafIndex;
+        uint256 sn = anchor.leafCount - 1;
+        bytes32 r = _leafHash;
+        for (uint256 i = 0; i < _proof.length; i++) {
+            if (sn == 0) {
+                return false;
+            }
+            if ((fn & 1) == 1 || fn == sn) {
+                r = sha256(abi.encodePacked(bytes1(0x01), _proof[i], r));
+                if ((fn & 1) == 0) {
+                    while (fn != 0 && (fn & 1) == 0) {
+                        fn >>= 1;
+                        sn >>= 1;
+                    }
+                }
+            } else {
+                r = sha256(abi.encodePacked(bytes1(0x01), r, _proof[i]));
+            }
+            fn >>= 1;
+            sn >>= 1;
+        }
+        return sn == 0 && r == anchor.root;
+    }
 }
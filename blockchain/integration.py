@@ -1,6 +1,6 @@
 import logging
-import hashlib
-import random
+import threading
+import time
 from datetime import datetime
 from web3 import Web3
 import json
@@ -8,28 +8,64 @@ import os
 import redis
 
 from config.logging_config import LogConfigure
+from messaging.codec import encode
+from messaging.transport import make_transport
+from blockchain.merkle import MerkleLog, leaf_hash, record_bytes
+from blockchain.mock_ledger import MockLedger
+from blockchain.ledger_verifier import LedgerVerifier
+from blockchain.tx_pipeline import TransactionPipeline
 
 
 class BlockchainRecorder:
-    def __init__(self, simulation_mode=False, redis_enabled=True, log_file='../../logs/blockchain_recorder.log'):
+    def __init__(self, simulation_mode=False, redis_enabled=True, log_file='../../logs/blockchain_recorder.log',
+                 transport=None, anchor_interval=None, max_in_flight=None, ledger_dir=None, anchor_dir=None):
         self.logger = logging.getLogger('BlockchainRecorder')
         self.simulation_mode = simulation_mode
-        self.mock_chain = []
+        self.ledger = None
+        self.ledger_verifier = None
+        # Anchoring mode: breaches go into an off-chain Merkle log whose root is
+        # put on chain every `anchor_interval` seconds (see maybe_anchor())
+        self.anchor_interval = anchor_interval
+        self.merkle = MerkleLog() if anchor_interval else None
+        # Leaf records (height == leaf index) and anchors on disk, so proofs survive restarts
+        self.leaf_store = None
+        self.anchors_path = None
+        self.anchors = []  # {'anchor_id', 'root', 'size', 'tx_hash'}, oldest first
+        self._unanchored = []  # (pallet_id, leaf_index) waiting for the next anchor
+        self._next_anchor = time.monotonic() + (anchor_interval or 0)
+        self._merkle_lock = threading.Lock()
+        self.tx_pipeline = None
         self.redis_enabled = redis_enabled
         self.redis_client = None
+        self.transport = None
         self.logger = logging.getLogger('BlockchainRecorder')
         if not self.logger.handlers:
             LogConfigure().setup_logging(log_file, self.logger)
 
+        if anchor_interval:
+            project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            anchor_dir = anchor_dir or os.getenv('ANCHOR_DIR', os.path.join(project_root, 'anchors'))
+            self.leaf_store = MockLedger(os.path.join(anchor_dir, 'leaves'), hot_blocks=1000)
+            self.anchors_path = os.path.join(anchor_dir, 'anchors.jsonl')
+            self._restore_anchors()
+
         if self.redis_enabled:
             try:
                 self.redis_client = redis.Redis(host='localhost', port=6379, db=0)
+                self.transport = make_transport(self.redis_client, kind=transport)
                 self.logger.info("Redis Connected for blockchain feedback")
             except Exception as e:
                 self.logger.warning(f"Redis-blockchain connection failed: {e}")
 
         if simulation_mode:
-            self.logger.info("Blockchain recorder initialized in simulation mode")
+            # Simulated blocks persist across restarts, hash-chained on disk
+            project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            ledger_dir = ledger_dir or os.getenv('MOCK_LEDGER_DIR', os.path.join(project_root, 'ledger'))
+            self.ledger = MockLedger(ledger_dir)
+            # Signs a checkpoint every 10k blocks when LEDGER_CHECKPOINT_KEY is set
+            self.ledger_verifier = LedgerVerifier(self.ledger)
+            self.logger.info(f"Blockchain recorder initialized in simulation mode, ledger at {ledger_dir} "
+                             f"({len(self.ledger)} blocks)")
         else:
             self.logger.info("Blockchain recorder initialized in production mode")
 
@@ -60,12 +96,22 @@ class BlockchainRecorder:
                 address=self.contract_address, abi=self.abi
             )
 
+            # Pipelined mode: up to `max_in_flight` breach transactions unconfirmed at once,
+            # confirmations published from the pipeline's receipt tracker
+            if max_in_flight:
+                self.tx_pipeline = TransactionPipeline(
+                    self.w3, on_confirmed=self._on_confirmed, on_failed=self._on_failed, max_in_flight=max_in_flight
+                )
+
     # ---------------------------
     # Redis Feedback Publisher
     # ---------------------------
-    def _publish_feedback(self, pallet_id, tx_hash, event_type="blockchain_recorded"):
-        """Publish feedback to Redis channel"""
-        if not self.redis_enabled or not self.redis_client:
+    def _publish_feedback(self, pallet_id, tx_hash, event_type="blockchain_recorded", client=None, **extra):
+        """
+        Publish feedback to Redis channel; pass a pipeline as `client` to batch.
+        Extra keyword arguments that are not None (log_index, leaf_index, anchor_id) are added to the event.
+        """
+        if not self.redis_enabled or not self.transport:
             return
 
         try:
@@ -75,7 +121,8 @@ class BlockchainRecorder:
                 "tx_hash": tx_hash,
                 "timestamp": datetime.now().isoformat()
             }
-            self.redis_client.publish("events", json.dumps(feedback))
+            feedback.update((key, value) for key, value in extra.items() if value is not None)
+            self.transport.publish("events", encode(feedback), client)
             self.logger.info(f"Published blockchain feedback for {pallet_id}")
         except Exception as e:
             self.logger.error(f"Error to publish blockchain feedback: {e}")
@@ -85,26 +132,44 @@ class BlockchainRecorder:
     # ---------------------------
     def record_temperature_breach(self, pallet_id, temperature, location):
         """Record a temperature breach on blockchain"""
+        if self.merkle is not None:
+            return self._record_anchored(pallet_id, temperature, location)
         if self.simulation_mode:
             return self._record_simulation(pallet_id, temperature, location)
         else:
             return self._record_real_blockchain(pallet_id, temperature, location)
 
+    def record_temperature_breaches(self, breaches):
+        """
+        Record several breaches in one transaction.
+
+        Args:
+            breaches (list): (pallet_id, temperature, location) tuples
+
+        Returns:
+            list: (tx_hash, log_index) per breach in input order, or None if the batch failed
+        """
+        if not breaches:
+            return []
+        if self.merkle is not None:
+            # Nothing is on chain until the next anchor, so there is no log index yet
+            return [(self._record_anchored(*breach), None) for breach in breaches]
+        if self.simulation_mode:
+            return self._record_simulation_batch(breaches)
+        else:
+            return self._record_real_blockchain_batch(breaches)
+
     def _record_simulation(self, pallet_id, temperature, location):
         """Simulate blockchain recording"""
         try:
-            block_data = {
+            block_data = self.ledger.append({
                 'type': 'temperature_breach',
                 'pallet_id': pallet_id,
                 'temperature': temperature,
                 'location': location,
-                'timestamp': datetime.now().isoformat(),
-                'block_hash': self._generate_mock_hash(),
-                'previous_hash': self._get_last_hash(),
                 'status': 'recorded'
-            }
-
-            self.mock_chain.append(block_data)
+            })
+            self.ledger_verifier.maybe_checkpoint()
 
             self.logger.info(
                 f"SIMULATION: Recorded temperature breach - "
@@ -123,6 +188,9 @@ class BlockchainRecorder:
     def _record_real_blockchain(self, pallet_id, temperature, location):
         """Record on real blockchain via Hardhat node"""
         try:
+            if self.tx_pipeline:
+                return self._submit_pipelined(self.contract.functions.recordBreach(str(pallet_id), int(temperature)),
+                                              [pallet_id])
             tx_hash = self.contract.functions.recordBreach(
                 str(pallet_id),
                 int(temperature)
@@ -142,17 +210,266 @@ class BlockchainRecorder:
             self.logger.error(f"Blockchain tx failed: {e}")
             return None
 
-    def _generate_mock_hash(self):
-        """Generate a mock hash for simulation"""
-        data = str(random.random()) + str(datetime.now())
-        return hashlib.sha256(data.encode()).hexdigest()[:16]
+    def _record_simulation_batch(self, breaches):
+        """Simulate a batch: one block per breach, as _record_simulation does"""
+        results = []
+        for pallet_id, temperature, location in breaches:
+            tx_hash = self._record_simulation(pallet_id, temperature, location)
+            if tx_hash is None:
+                return None
+            results.append((tx_hash, 0))
+        return results
+
+    def _record_real_blockchain_batch(self, breaches):
+        """Record a batch with one recordBreaches transaction and one receipt wait"""
+        try:
+            if self.tx_pipeline:
+                tx_hash = self._submit_pipelined(self.contract.functions.recordBreaches(
+                    [str(pallet_id) for pallet_id, _, _ in breaches],
+                    [int(temperature) for _, temperature, _ in breaches]
+                ), [pallet_id for pallet_id, _, _ in breaches])
+                if tx_hash is None:
+                    return None
+                # Log indexes are known once mined; they go out with the confirmations
+                return [(tx_hash, None)] * len(breaches)
+            tx_hash = self.contract.functions.recordBreaches(
+                [str(pallet_id) for pallet_id, _, _ in breaches],
+                [int(temperature) for _, temperature, _ in breaches]
+            ).transact()
+
+            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            if receipt.status != 1:
+                raise RuntimeError(f"transaction {receipt.transactionHash.hex()} reverted")
+
+            tx_hex = receipt.transactionHash.hex()
+            # The contract emits one event per breach in input order
+            events = self.contract.events.TemperatureBreachRecorded().process_receipt(receipt)
+            if len(events) != len(breaches):
+                raise RuntimeError(f"expected {len(breaches)} events in {tx_hex}, got {len(events)}")
+            results = [(tx_hex, event.logIndex) for event in events]
+
+            self.logger.info(
+                f"REAL: Recorded {len(breaches)} breaches → tx {tx_hex}, "
+                f"gas {receipt.gasUsed} ({receipt.gasUsed / len(breaches):.0f}/breach)"
+            )
+
+            pipe = self.redis_client.pipeline(transaction=False) if self.redis_client else None
+            # Several breaches share a tx when batched; the log index tells them apart
+            for (pallet_id, _, _), (_, log_index) in zip(breaches, results):
+                self._publish_feedback(pallet_id, tx_hex, log_index=log_index, client=pipe)
+            if pipe is not None:
+                try:
+                    pipe.execute()
+                except redis.RedisError as e:
+                    self.logger.error(f"Error to publish blockchain feedback: {e}")
+            return results
+
+        except Exception as e:
+            self.logger.error(f"Blockchain batch tx failed: {e}")
+            return None
+
+    # ---------------------------
+    # Pipelined Submission
+    # ---------------------------
+    def _submit_pipelined(self, transaction, pallet_ids):
+        """
+        Hand a transaction to the pipeline. Returns its hash, or 'pending' if the
+        first send failed; either way the pipeline owns it from here on. None if
+        the pipeline stayed full and did not take it.
+        """
+        tx_hash = self.tx_pipeline.submit(transaction, payload=pallet_ids)
+        if tx_hash is None:
+            self.logger.error(f"Pipeline full, breach tx for {', '.join(map(str, pallet_ids))} not submitted")
+            return None
+        self.logger.debug(f"Submitted breach tx for {', '.join(map(str, pallet_ids))}: {tx_hash}")
+        return tx_hash
+
+    def _on_confirmed(self, confirmed):
+        """Pipeline callback: publish one blockchain_recorded event per breach"""
+        contract_address = self.contract_address.lower()
+        pipe = self.redis_client.pipeline(transaction=False) if self.redis_client else None
+        for pallet_ids, receipt in confirmed:
+            # One event per breach, in order; see Provenance.recordBreaches
+            log_indexes = [index for address, index in receipt['logs'] if address == contract_address]
+            if len(log_indexes) != len(pallet_ids):
+                log_indexes = [None] * len(pallet_ids)
+            for pallet_id, log_index in zip(pallet_ids, log_indexes):
+                self._publish_feedback(pallet_id, receipt['tx_hash'], log_index=log_index, client=pipe)
+        if pipe is not None:
+            try:
+                pipe.execute()
+            except redis.RedisError as e:
+                self.logger.error(f"Error to publish blockchain feedback: {e}")
+
+    def _on_failed(self, pallet_ids):
+        for pallet_id in pallet_ids:
+            self._publish_feedback(pallet_id, None, event_type="blockchain_failed")
+
+    def close(self, timeout=30.0):
+        """Wait for in-flight transactions to be confirmed and close the simulation ledger"""
+        if self.tx_pipeline:
+            self.tx_pipeline.close(timeout)
+        if self.ledger:
+            self.ledger.close()
+        if self.leaf_store:
+            self.leaf_store.close()
+
+    # ---------------------------
+    # Merkle Anchoring
+    # ---------------------------
+    def _record_anchored(self, pallet_id, temperature, location):
+        """Append a breach to the Merkle log; it is confirmed once its root is anchored"""
+        record = {
+            'pallet_id': str(pallet_id),
+            'temperature': temperature,
+            'location': location,
+            'timestamp': datetime.now().isoformat()
+        }
+        data = record_bytes(record)
+        leaf = leaf_hash(data)
+        with self._merkle_lock:
+            # Stored first: a leaf that is not on disk must never be anchored
+            self.leaf_store.append({'pallet_id': record['pallet_id'], 'record': data.decode()})
+            index = self.merkle.append(leaf)
+            self._unanchored.append((pallet_id, index))
+        self.logger.debug(f"Logged breach for {pallet_id} as leaf {index}")
+        return leaf.hex()
+
+    def _restore_anchors(self):
+        """Rebuild the Merkle log and anchor list from disk; leaves past the last anchor wait for the next one"""
+        for block in self.leaf_store.iter_blocks():
+            self.merkle.append(leaf_hash(block['record'].encode()))
+
+        if os.path.exists(self.anchors_path):
+            with open(self.anchors_path) as f:
+                for line in f:
+                    try:
+                        anchor = json.loads(line)
+                        anchor['root'] = bytes.fromhex(anchor['root'])
+                    except (ValueError, KeyError, TypeError):
+                        self.logger.warning(f"Skipping unreadable line in {self.anchors_path}")
+                        continue
+                    if anchor['size'] > len(self.merkle) or self.merkle.root(anchor['size']) != anchor['root']:
+                        self.logger.error(f"Anchor {anchor['anchor_id']} does not match the stored breach log; "
+                                          f"breaches cannot be proven against it")
+                        continue
+                    self.anchors.append(anchor)
+
+        anchored = self.anchors[-1]['size'] if self.anchors else 0
+        self._unanchored = [(block['pallet_id'], block['height']) for block in self.leaf_store.iter_blocks(anchored)]
+        if len(self.merkle):
+            self.logger.info(f"Restored Merkle log of {len(self.merkle)} breaches, {len(self.anchors)} anchors, "
+                             f"{len(self._unanchored)} breaches awaiting an anchor")
+
+    def maybe_anchor(self, force=False):
+        """Anchor the Merkle root if `anchor_interval` has passed; call regularly from the recording thread"""
+        if self.merkle is None:
+            return None
+        now = time.monotonic()
+        if not force and now < self._next_anchor:
+            return None
+        self._next_anchor = now + self.anchor_interval
+        return self.anchor_root()
+
+    def anchor_root(self):
+        """
+        Put the current Merkle root on chain and confirm every breach it newly covers.
+
+        Returns:
+            int: The anchor id, or None if there was nothing to anchor or the transaction failed
+        """
+        with self._merkle_lock:
+            if not self._unanchored:
+                return None
+            size = len(self.merkle)
+            root = self.merkle.root(size)
+            pending, self._unanchored = self._unanchored, []
+
+        try:
+            if self.simulation_mode:
+                anchor_id = len(self.anchors)
+                tx_hex = self.ledger.append({
+                    'type': 'merkle_root',
+                    'anchor_id': anchor_id,
+                    'root': root.hex(),
+                    'leaf_count': size,
+                    'status': 'recorded'
+                })['block_hash']
+            else:
+                tx_hash = self.contract.functions.anchorRoot(root, size).transact()
+                receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+                if receipt.status != 1:
+                    raise RuntimeError(f"transaction {receipt.transactionHash.hex()} reverted")
+                tx_hex = receipt.transactionHash.hex()
+                anchor_id = self.contract.events.MerkleRootAnchored().process_receipt(receipt)[0].args.anchorId
+        except Exception as e:
+            self.logger.error(f"Anchoring Merkle root failed, {len(pending)} breaches wait for the next anchor: {e}")
+            with self._merkle_lock:
+                self._unanchored = pending + self._unanchored
+            return None
+
+        with self._merkle_lock:
+            anchor = {'anchor_id': anchor_id, 'root': root, 'size': size, 'tx_hash': tx_hex}
+            self.anchors.append(anchor)
+            with open(self.anchors_path, 'a') as f:
+                f.write(json.dumps(dict(anchor, root=root.hex())) + "\n")
+        self.logger.info(f"Anchored Merkle root {root.hex()[:16]}… of {size} breaches as anchor {anchor_id} → tx {tx_hex}")
+
+        pipe = self.redis_client.pipeline(transaction=False) if self.redis_client else None
+        for pallet_id, index in pending:
+            self._publish_feedback(pallet_id, tx_hex, anchor_id=anchor_id, leaf_index=index, client=pipe)
+        if pipe is not None:
+            try:
+                pipe.execute()
+            except redis.RedisError as e:
+                self.logger.error(f"Error to publish blockchain feedback: {e}")
+        return anchor_id
+
+    def prove_breach(self, leaf_index):
+        """
+        Inclusion proof of one logged breach against the latest anchored root.
+
+        Returns:
+            dict: record, leaf_index, tree_size, root, anchor_id, tx_hash and the
+                hex `path`; check it with blockchain.merkle.verify_breach_proof or
+                Provenance.verifyInclusion. None if the breach is not anchored yet.
+        """
+        with self._merkle_lock:
+            if not self.anchors or leaf_index >= self.anchors[-1]['size']:
+                return None
+            anchor = self.anchors[-1]
+            path = self.merkle.proof(leaf_index, anchor['size'])
+        data = self.leaf_store.get(leaf_index)['record']
+        return {
+            'record': json.loads(data),
+            'leaf_index': leaf_index,
+            'tree_size': anchor['size'],
+            'root': anchor['root'].hex(),
+            'anchor_id': anchor['anchor_id'],
+            'tx_hash': anchor['tx_hash'],
+            'path': [node.hex() for node in path]
+        }
+
+    def prove_pallet_breaches(self, pallet_id):
+        """Inclusion proofs of every anchored breach of one pallet, oldest first"""
+        proofs = (self.prove_breach(index) for index in self.leaf_store.heights_for_pallet(pallet_id).tolist())
+        # The pallet index is keyed by hash; drop any colliding pallet
+        return [proof for proof in proofs if proof is not None and proof['record']['pallet_id'] == str(pallet_id)]
+
+    def get_chain_data(self, offset=0, limit=100, pallet_id=None, since_ms=None, until_ms=None):
+        """
+        Page through the simulated chain, oldest first, streaming blocks from disk.
 
-    def _get_last_hash(self):
-        """Get the hash of the last block in the chain"""
-        if not self.mock_chain:
-            return "0" * 16  # Genesis block
-        return self.mock_chain[-1]['block_hash']
+        Args:
+            offset (int): Matching blocks to skip
+            limit (int): Maximum blocks to return, None for all of them
+            pallet_id (str): Only blocks of this pallet
+            since_ms (int): Only blocks at or after this epoch time in ms
+            until_ms (int): Only blocks before this epoch time in ms
 
-    def get_chain_data(self):
-        """Get all recorded data for debugging or display"""
-        return self.mock_chain
+        Returns:
+            generator: Block dicts, or nothing outside simulation mode
+        """
+        if self.ledger is None:
+            return iter(())
+        return self.ledger.blocks(offset, limit, pallet_id, since_ms, until_ms)
@@ -0,0 +1,262 @@
+"""
+Integrity checks of the simulation ledger (blockchain/mock_ledger.py).
+
+Incremental: every `checkpoint_every` blocks the verifier re-hashes the
+blocks since the last checkpoint and, if they are intact, appends a
+checkpoint (height, hash of block height - 1) signed with HMAC-SHA256 to
+checkpoints.jsonl in the ledger directory. A later check trusts the newest
+checkpoint with a valid signature and only re-hashes the blocks after it:
+rewriting anything before it changes the hash the next block links to.
+
+Audit: the whole ledger is split into ranges, cut at every checkpoint and
+then into roughly equal pieces, and the ranges are verified by a process
+pool. Each range returns the hash its first block links to and the hash
+of its last block; stitching checks every link across range boundaries
+and every checkpoint against the block it names.
+
+The signing key comes from LEDGER_CHECKPOINT_KEY unless one is passed in.
+Only on-disk simulated blocks are covered; the real chain is secured by
+the node itself and, in anchoring mode, by the Merkle roots on chain.
+
+Usage: python blockchain/ledger_verifier.py [--ledger DIR] {verify,audit,checkpoint} [--workers N]
+"""
+import os
+import sys
+import hmac
+import json
+import time
+import logging
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+if __name__ == "__main__":
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from blockchain.mock_ledger import GENESIS_HASH, LedgerError, MockLedger, verify_range
+
+MIN_RANGE_BLOCKS = 50_000  # smaller ranges cost more in process overhead than they save
+
+
+class LedgerVerifier:
+    """Signed checkpoints, incremental checks and parallel audits of a MockLedger"""
+
+    def __init__(self, ledger, key=None, checkpoint_every=10_000, workers=None):
+        """
+        Args:
+            ledger (MockLedger): The ledger to check
+            key (str | bytes): HMAC key for checkpoints; LEDGER_CHECKPOINT_KEY by default,
+                without one checks start from genesis and no checkpoints are written
+            checkpoint_every (int): Blocks between checkpoints written by maybe_checkpoint()
+            workers (int): Audit processes, os.cpu_count() by default
+        """
+        self.logger = logging.getLogger('BlockchainRecorder')
+        self.ledger = ledger
+        key = key or os.getenv('LEDGER_CHECKPOINT_KEY')
+        self.key = key.encode() if isinstance(key, str) else key
+        self.checkpoint_every = checkpoint_every
+        self.workers = workers or os.cpu_count() or 1
+        self.path = os.path.join(ledger.directory, 'checkpoints.jsonl')
+        self._checkpoints = None  # loaded lazily, newest last
+
+    # ---------------------------
+    # Checkpoints
+    # ---------------------------
+    def _sign(self, height, block_hash):
+        return hmac.new(self.key, f"{height}:{block_hash}".encode(), hashlib.sha256).hexdigest()
+
+    def checkpoints(self):
+        """Checkpoints with a valid signature, oldest first; forged or corrupt lines are logged and skipped"""
+        if self._checkpoints is not None:
+            return self._checkpoints
+        self._checkpoints = []
+        if not self.key or not os.path.exists(self.path):
+            return self._checkpoints
+        with open(self.path) as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    checkpoint = json.loads(line)
+                    valid = hmac.compare_digest(
+                        checkpoint['hmac'], self._sign(checkpoint['height'], checkpoint['block_hash'])
+                    )
+                except (ValueError, KeyError, TypeError):
+                    valid = False
+                if valid:
+                    self._checkpoints.append(checkpoint)
+                else:
+                    self.logger.warning(f"Ignoring checkpoint on line {number} of {self.path}: bad signature")
+        return self._checkpoints
+
+    def last_checkpoint(self):
+        """Newest valid checkpoint, or None"""
+        checkpoints = self.checkpoints()
+        return checkpoints[-1] if checkpoints else None
+
+    def _truncated(self, end, started, **extra):
+        """Failure report if a signed checkpoint lies beyond the ledger, i.e. its tail was removed"""
+        last = self.last_checkpoint()
+        if last is None or last['height'] <= end:
+            return None
+        self.logger.error(f"Ledger has {end} blocks but height {last['height']} was checkpointed")
+        return self._report(end, end, end, None, started, **extra)
+
+    def checkpoint(self):
+        """
+        Verify the blocks since the last checkpoint and sign the current tip.
+
+        Returns:
+            dict: The new checkpoint, or None if verification failed
+        """
+        if not self.key:
+            raise LedgerError("No checkpoint key: pass one or set LEDGER_CHECKPOINT_KEY")
+        report = self.verify_incremental()
+        if not report['ok']:
+            return None
+        last = self.last_checkpoint()
+        if report['end'] == 0 or (last and last['height'] == report['end']):
+            return last
+        checkpoint = {
+            'height': report['end'],
+            'block_hash': report['last_hash'],
+            'created_ms': time.time_ns() // 1_000_000
+        }
+        checkpoint['hmac'] = self._sign(checkpoint['height'], checkpoint['block_hash'])
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(checkpoint) + "\n")
+        self.checkpoints().append(checkpoint)
+        self.logger.info(f"Ledger checkpoint at height {checkpoint['height']}: {checkpoint['block_hash'][:16]}…")
+        return checkpoint
+
+    def maybe_checkpoint(self):
+        """Checkpoint once `checkpoint_every` blocks have been added since the last one"""
+        if not self.key:
+            return None
+        last = self.last_checkpoint()
+        if len(self.ledger) - (last['height'] if last else 0) < self.checkpoint_every:
+            return None
+        return self.checkpoint()
+
+    # ---------------------------
+    # Verification
+    # ---------------------------
+    def _report(self, start, end, first_bad, last_hash, started, **extra):
+        seconds = time.perf_counter() - started
+        blocks = (end if first_bad is None else first_bad) - start
+        report = dict(
+            ok=first_bad is None,
+            first_bad=first_bad,
+            start=start,
+            end=end,
+            blocks=blocks,
+            last_hash=last_hash.hex() if last_hash else None,
+            seconds=seconds,
+            blocks_per_s=blocks / seconds if seconds > 0 else 0.0,
+            **extra
+        )
+        if first_bad is None:
+            self.logger.info(f"Ledger blocks {start}-{end} intact: {blocks} blocks in {seconds:.2f}s "
+                             f"({report['blocks_per_s']:,.0f} blocks/s)")
+        else:
+            self.logger.error(f"Ledger verification failed at block {first_bad}")
+        return report
+
+    def verify_incremental(self):
+        """
+        Re-hash only the last checkpointed block and the blocks after it.
+
+        Returns:
+            dict: ok, first_bad, start, end, blocks, last_hash, seconds, blocks_per_s, checkpoint
+        """
+        started = time.perf_counter()
+        end = len(self.ledger)
+        checkpoint = self.last_checkpoint()
+        truncated = self._truncated(end, started, checkpoint=checkpoint['height'] if checkpoint else None)
+        if truncated:
+            return truncated
+        start = checkpoint['height'] if checkpoint else 0
+        previous = bytes.fromhex(checkpoint['block_hash']) if checkpoint else GENESIS_HASH
+        first_bad, last_hash = None, previous
+        if checkpoint:
+            # The checkpointed block itself must still hash to the signed value
+            bad, _, tip_hash = verify_range(self.ledger.data_path, self.ledger.offset(start - 1), start - 1, start)
+            if bad is not None or tip_hash != previous:
+                return self._report(start - 1, end, start - 1, None, started, checkpoint=start)
+        if start < end:
+            first_bad, _, last_hash = verify_range(self.ledger.data_path, self.ledger.offset(start),
+                                                   start, end, previous)
+        return self._report(start, end, first_bad, last_hash if end else None, started,
+                            checkpoint=checkpoint['height'] if checkpoint else None)
+
+    def _ranges(self, end, workers):
+        """[start, end) audit ranges cut at every checkpoint height, then evenly"""
+        size = max(MIN_RANGE_BLOCKS, -(-end // (workers * 4)))
+        cuts = {0, end} | {c['height'] for c in self.checkpoints() if 0 < c['height'] < end}
+        cuts |= set(range(0, end, size))
+        cuts = sorted(cuts)
+        return list(zip(cuts, cuts[1:]))
+
+    def audit(self, workers=None):
+        """
+        Verify the whole ledger across a process pool and stitch the range boundaries.
+
+        Returns:
+            dict: ok, first_bad, start, end, blocks, last_hash, seconds, blocks_per_s, workers, ranges
+        """
+        started = time.perf_counter()
+        workers = workers or self.workers
+        end = len(self.ledger)
+        ranges = self._ranges(end, workers)
+        truncated = self._truncated(end, started, workers=workers, ranges=len(ranges))
+        if truncated:
+            return truncated
+        jobs = [(self.ledger.data_path, self.ledger.offset(lo), lo, hi) for lo, hi in ranges]
+        if workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(min(workers, len(jobs))) as pool:
+                results = list(pool.map(verify_range, *zip(*jobs)))
+        else:
+            results = [verify_range(*job) for job in jobs]
+
+        signed = {c['height']: bytes.fromhex(c['block_hash']) for c in self.checkpoints()}
+        previous, first_bad = GENESIS_HASH, None
+        for (lo, hi), (bad, first_link, last_hash) in zip(ranges, results):
+            if first_link != previous:
+                first_bad = lo
+            elif bad is not None:
+                first_bad = bad
+            elif hi in signed and signed[hi] != last_hash:
+                # Internally consistent, but not the chain that was signed: rewritten up to here
+                first_bad = hi - 1
+            if first_bad is not None:
+                break
+            previous = last_hash
+        return self._report(0, end, first_bad, previous if end else None, started,
+                            workers=workers, ranges=len(ranges))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify the simulation ledger's hash chain")
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument('--ledger', default=os.getenv('MOCK_LEDGER_DIR', os.path.join(project_root, 'ledger')))
+    parser.add_argument('command', choices=['verify', 'audit', 'checkpoint'],
+                        help="verify: since the last checkpoint; audit: everything, in parallel; "
+                             "checkpoint: verify, then sign the tip")
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    # Read-only: the recorder may be appending, and recovery would truncate its half-written block
+    ledger = MockLedger(args.ledger, hot_blocks=0, read_only=True)
+    verifier = LedgerVerifier(ledger, workers=args.workers)
+    try:
+        if args.command == 'checkpoint':
+            ok = verifier.checkpoint() is not None
+        elif args.command == 'audit':
+            ok = verifier.audit()['ok']
+        else:
+            ok = verifier.verify_incremental()['ok']
+    finally:
+        ledger.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
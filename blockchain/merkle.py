@@ -0,0 +1,159 @@
+"""
+Append-only Merkle log for anchoring breach records.
+
+Hashing follows RFC 6962 / RFC 9162 (Certificate Transparency), with
+SHA-256 so that Provenance.verifyInclusion can check proofs on chain:
+
+    leaf  = sha256(0x00 || record bytes)
+    node  = sha256(0x01 || left || right)
+    empty = sha256("")
+
+The root of n leaves splits at the largest power of two below n, so a
+tree is never padded and earlier roots stay provable. MerkleLog keeps
+every complete, aligned subtree hash, level by level, in flat bytearrays
+(about 64 bytes per leaf): appending costs O(log n) hashes in the worst
+case and O(1) amortized, and an inclusion proof for any leaf against any
+earlier tree size is assembled from stored hashes in O(log^2 n) without
+rehashing the leaves.
+"""
+import json
+import hashlib
+
+HASH_SIZE = 32
+
+
+def leaf_hash(data):
+    return hashlib.sha256(b'\x00' + data).digest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(b'\x01' + left + right).digest()
+
+
+def record_bytes(record):
+    """Canonical encoding of a breach record, so anyone holding it can recompute its leaf hash"""
+    return json.dumps(record, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def verify_inclusion(leaf, index, size, path, root):
+    """
+    RFC 9162 inclusion proof check.
+
+    Args:
+        leaf (bytes): Leaf hash
+        index (int): Position of the leaf
+        size (int): Tree size the proof was made for
+        path (list): Sibling hashes from the leaf up
+        root (bytes): Root of the tree of `size` leaves
+
+    Returns:
+        bool: True if the leaf is at `index` in the tree with that root
+    """
+    if index >= size:
+        return False
+    fn, sn = index, size - 1
+    r = leaf
+    for p in path:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            r = node_hash(p, r)
+            if not fn & 1:
+                while fn and not fn & 1:
+                    fn >>= 1
+                    sn >>= 1
+        else:
+            r = node_hash(r, p)
+        fn >>= 1
+        sn >>= 1
+    return sn == 0 and r == root
+
+
+def verify_breach_proof(proof):
+    """Check a proof from BlockchainRecorder.prove_breach against the root it names"""
+    return verify_inclusion(
+        leaf_hash(record_bytes(proof['record'])),
+        proof['leaf_index'],
+        proof['tree_size'],
+        [bytes.fromhex(node) for node in proof['path']],
+        bytes.fromhex(proof['root'])
+    )
+
+
+class MerkleLog:
+    """Append-only Merkle tree with historical roots and inclusion proofs; not thread-safe"""
+
+    def __init__(self):
+        # levels[k] holds the hashes of the complete subtrees of 2**k leaves, left to right
+        self.levels = [bytearray()]
+
+    def __len__(self):
+        return len(self.levels[0]) // HASH_SIZE
+
+    def _node(self, level, position):
+        offset = position * HASH_SIZE
+        return bytes(self.levels[level][offset:offset + HASH_SIZE])
+
+    def append(self, leaf):
+        """Append a leaf hash and return its index"""
+        index = len(self)
+        self.levels[0] += leaf
+        # Every right child completes a subtree one level up
+        position, level, node = index, 0, leaf
+        while position & 1:
+            node = node_hash(self._node(level, position - 1), node)
+            level += 1
+            if level == len(self.levels):
+                self.levels.append(bytearray())
+            self.levels[level] += node
+            position >>= 1
+        return index
+
+    def append_record(self, record):
+        return self.append(leaf_hash(record_bytes(record)))
+
+    def leaf(self, index):
+        return self._node(0, index)
+
+    def _range_hash(self, start, end):
+        """Hash of leaves [start, end), where start is aligned to the tree split of that range"""
+        peaks = []
+        position = start
+        while position < end:
+            # Largest aligned complete subtree starting at `position` that fits
+            level = (end - position).bit_length() - 1
+            while position & ((1 << level) - 1):
+                level -= 1
+            peaks.append(self._node(level, position >> level))
+            position += 1 << level
+        node = peaks.pop()
+        while peaks:
+            node = node_hash(peaks.pop(), node)
+        return node
+
+    def root(self, size=None):
+        """Root of the first `size` leaves (all of them by default)"""
+        size = len(self) if size is None else size
+        if size > len(self):
+            raise ValueError(f"Tree has only {len(self)} leaves, not {size}")
+        if size == 0:
+            return hashlib.sha256(b'').digest()
+        return self._range_hash(0, size)
+
+    def proof(self, index, size=None):
+        """Sibling hashes, leaf first, proving leaf `index` is in the tree of the first `size` leaves"""
+        size = len(self) if size is None else size
+        if not 0 <= index < size <= len(self):
+            raise IndexError(f"Leaf {index} is not in a tree of {size} leaves")
+        path = []
+        lo, hi = 0, size
+        while hi - lo > 1:
+            split = lo + (1 << ((hi - lo - 1).bit_length() - 1))
+            if index < split:
+                path.append(self._range_hash(split, hi))
+                hi = split
+            else:
+                path.append(self._range_hash(lo, split))
+                lo = split
+        path.reverse()
+        return path
@@ -0,0 +1,382 @@
+"""
+Append-only, hash-chained ledger on disk for simulation mode.
+
+Two files in the ledger directory:
+
+    blocks.dat  file header, then one frame per block:
+                height (uint64) | timestamp ms (int64) | previous hash (32 bytes) |
+                block hash (32 bytes) | payload length (uint32) | payload
+    blocks.idx  24 bytes per block: frame offset (uint64) | timestamp ms (int64) | pallet key (uint64)
+
+The payload is the block data as canonical JSON, and
+
+    block hash = sha256(previous hash || height || timestamp ms || payload)
+
+so every hash commits to the block's content and to the whole chain before
+it. Timestamps never decrease, which keeps blocks.idx sorted by time; time
+range lookups run on a memory map of it. Pallet lookups use an in-RAM map
+of pallet key to heights, built from blocks.idx on open and kept up to date
+by append(). Only the newest `hot_blocks` blocks are kept decoded in RAM.
+"""
+import os
+import json
+import time
+import struct
+import hashlib
+import threading
+from array import array
+from collections import deque
+
+import numpy as np
+
+FILE_MAGIC = b"PGLEDG"
+FILE_VERSION = 1
+_FILE_HEADER = struct.Struct("<6sH8x")
+_FRAME_HEADER = struct.Struct("<Qq32s32sI")
+_HEIGHT = struct.Struct("<Qq")
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('timestamp', '<i8'), ('pallet', '<u8')])
+
+GENESIS_HASH = bytes(32)
+
+
+def pallet_key(pallet_id):
+    """64-bit key of a pallet id in blocks.idx; lookups re-check the id, so collisions are harmless"""
+    if pallet_id is None:
+        return 0
+    return int.from_bytes(hashlib.blake2b(str(pallet_id).encode(), digest_size=8).digest(), 'little')
+
+
+def block_hash(previous_hash, height, timestamp_ms, payload):
+    return hashlib.sha256(previous_hash + _HEIGHT.pack(height, timestamp_ms) + payload).digest()
+
+
+def verify_range(data_path, offset, start, end, previous=None):
+    """
+    Recompute hashes and links of blocks [start, end), reading frames from `offset`.
+    Runs on a path rather than a MockLedger so process pools can call it.
+
+    Args:
+        previous (bytes): Hash block `start` must link to; None skips that one
+            check so that ranges verified in parallel can be stitched afterwards
+
+    Returns:
+        tuple: (height of the first bad block or None, hash block `start` links to,
+            hash of the last good block)
+    """
+    first_link = None
+    with open(data_path, 'rb', buffering=1 << 20) as f:
+        f.seek(offset)
+        for expected in range(start, end):
+            header = f.read(_FRAME_HEADER.size)
+            if len(header) < _FRAME_HEADER.size:
+                return expected, first_link, previous
+            height, timestamp, linked, digest, length = _FRAME_HEADER.unpack(header)
+            payload = f.read(length)
+            if first_link is None:
+                first_link = linked
+                previous = linked if previous is None else previous
+            if (len(payload) < length or height != expected or linked != previous
+                    or block_hash(linked, height, timestamp, payload) != digest):
+                return expected, first_link, previous
+            previous = digest
+    return None, first_link, previous
+
+
+class LedgerError(Exception):
+    pass
+
+
+class MockLedger:
+    """Append-only hash-chained block store with pallet and time indexes"""
+
+    def __init__(self, directory, hot_blocks=10_000, fsync=False, read_only=False):
+        """
+        Args:
+            directory (str): Ledger directory, created if missing
+            hot_blocks (int): Newest blocks kept decoded in RAM
+            fsync (bool): fsync both files after every block instead of only flushing them
+            read_only (bool): Open without recovery, e.g. while another process appends;
+                sees the blocks indexed at open time and append() raises LedgerError
+        """
+        self.directory = directory
+        self.fsync = fsync
+        self.read_only = read_only
+        self.hot = deque(maxlen=hot_blocks)
+        self._lock = threading.Lock()
+        self._index_map = None  # memory map of blocks.idx, refreshed when stale
+        self._by_pallet = {}  # pallet key -> array of heights, ascending
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+        self.data_path = os.path.join(directory, 'blocks.dat')
+        self.index_path = os.path.join(directory, 'blocks.idx')
+        self._open()
+
+    # ---------------------------
+    # Opening and recovery
+    # ---------------------------
+    def _open(self):
+        if self.read_only:
+            self._open_read_only()
+            return
+        new = not os.path.exists(self.data_path) or os.path.getsize(self.data_path) == 0
+        self._data = open(self.data_path, 'r+b' if not new else 'w+b')
+        self._index = open(self.index_path, 'a+b')
+        if new:
+            self._data.write(_FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION))
+            self._data.flush()
+            self._index.truncate(0)
+        else:
+            magic, version = _FILE_HEADER.unpack(self._data.read(_FILE_HEADER.size))
+            if magic != FILE_MAGIC or version != FILE_VERSION:
+                raise LedgerError(f"{self.data_path} is not a version {FILE_VERSION} ledger")
+
+        # A crash can leave half an index entry behind; drop it
+        index_size = os.path.getsize(self.index_path)
+        self.height = index_size // INDEX_DTYPE.itemsize
+        if index_size % INDEX_DTYPE.itemsize:
+            self._index.truncate(self.height * INDEX_DTYPE.itemsize)
+
+        self.last_hash = GENESIS_HASH
+        self.last_timestamp = 0
+        end = _FILE_HEADER.size
+        if self.height:
+            last = self._read_index(self.height - 1, self.height)[0]
+            block, end = self._read_frame(int(last['offset']))
+            self.last_hash = bytes.fromhex(block['block_hash'])
+            self.last_timestamp = block['timestamp']
+        end = self._reindex_tail(end)
+        self._data.truncate(end)
+        self._data.seek(end)
+        self._end = end
+        self._index_pallets()
+
+        for block in self.iter_blocks(max(0, self.height - self.hot.maxlen)):
+            self.hot.append(block)
+
+    def _open_read_only(self):
+        """
+        Take the indexed blocks as they are: the writer may be between its two
+        writes, so a partial index entry or unindexed frames are left alone.
+        """
+        if not os.path.exists(self.data_path) or os.path.getsize(self.data_path) == 0:
+            raise LedgerError(f"No ledger at {self.directory}")
+        self._data = open(self.data_path, 'rb')
+        self._index = open(self.index_path, 'rb') if os.path.exists(self.index_path) else open(os.devnull, 'rb')
+        magic, version = _FILE_HEADER.unpack(self._data.read(_FILE_HEADER.size))
+        if magic != FILE_MAGIC or version != FILE_VERSION:
+            raise LedgerError(f"{self.data_path} is not a version {FILE_VERSION} ledger")
+
+        self.height = os.fstat(self._index.fileno()).st_size // INDEX_DTYPE.itemsize
+        self.last_hash = GENESIS_HASH
+        self.last_timestamp = 0
+        self._end = _FILE_HEADER.size
+        if self.height:
+            last = self._read_index(self.height - 1, self.height)[0]
+            block, self._end = self._read_frame(int(last['offset']))
+            self.last_hash = bytes.fromhex(block['block_hash'])
+            self.last_timestamp = block['timestamp']
+        self._index_pallets()
+
+        for block in self.iter_blocks(max(0, self.height - self.hot.maxlen)):
+            self.hot.append(block)
+
+    def _reindex_tail(self, offset):
+        """
+        Index complete, correctly linked frames written after the last indexed
+        block (a crash between the two writes, or a lost blocks.idx).
+        Returns the offset where the valid data ends.
+        """
+        entries = []
+        with open(self.data_path, 'rb') as f:
+            f.seek(offset)
+            while True:
+                header = f.read(_FRAME_HEADER.size)
+                if len(header) < _FRAME_HEADER.size:
+                    break
+                height, timestamp, linked, digest, length = _FRAME_HEADER.unpack(header)
+                payload = f.read(length)
+                if (len(payload) < length or height != self.height or linked != self.last_hash
+                        or block_hash(linked, height, timestamp, payload) != digest):
+                    break
+                entries.append((offset, timestamp, pallet_key(json.loads(payload).get('pallet_id'))))
+                offset += _FRAME_HEADER.size + length
+                self.height += 1
+                self.last_hash = digest
+                self.last_timestamp = timestamp
+        if entries:
+            self._index.write(np.array(entries, dtype=INDEX_DTYPE).tobytes())
+            self._index.flush()
+            self._index_map = None
+        return offset
+
+    def _index_pallets(self):
+        """Group the heights in blocks.idx by pallet key"""
+        keys = self._read_index(0, self.height)['pallet']
+        order = np.argsort(keys, kind='stable')
+        bounds = np.flatnonzero(np.diff(keys[order])) + 1
+        self._by_pallet = {}
+        for group in np.split(order, bounds) if self.height else []:
+            heights = array('q')
+            heights.frombytes(group.astype('<i8').tobytes())
+            self._by_pallet[int(keys[group[0]])] = heights
+
+    def _read_index(self, start, end):
+        if self._index_map is None or len(self._index_map) < end:
+            self._index.flush()
+            self._index_map = np.memmap(self.index_path, dtype=INDEX_DTYPE, mode='r', shape=(self.height,)) \
+                if self.height else np.empty(0, dtype=INDEX_DTYPE)
+        return self._index_map[start:end]
+
+    def _read_frame(self, offset):
+        """Decode the block at `offset`; returns (block, offset of the next frame)"""
+        self._data.flush()
+        with open(self.data_path, 'rb') as f:
+            f.seek(offset)
+            header = f.read(_FRAME_HEADER.size)
+            if len(header) < _FRAME_HEADER.size:
+                raise LedgerError(f"Truncated block header at offset {offset}")
+            height, timestamp, previous, digest, length = _FRAME_HEADER.unpack(header)
+            payload = f.read(length)
+        if len(payload) < length:
+            raise LedgerError(f"Truncated block {height} at offset {offset}")
+        return self._to_block(height, timestamp, previous, digest, payload), offset + _FRAME_HEADER.size + length
+
+    @staticmethod
+    def _to_block(height, timestamp, previous, digest, payload):
+        return dict(json.loads(payload), height=height, timestamp=timestamp,
+                    previous_hash=previous.hex(), block_hash=digest.hex())
+
+    # ---------------------------
+    # Writing
+    # ---------------------------
+    def __len__(self):
+        return self.height
+
+    def append(self, data):
+        """
+        Append one block.
+
+        Args:
+            data (dict): JSON-serializable block content; a `pallet_id` key is indexed
+
+        Returns:
+            dict: The block, with height, timestamp (epoch ms), previous_hash and block_hash added
+        """
+        if self.read_only:
+            raise LedgerError(f"{self.directory} is open read-only")
+        payload = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str).encode()
+        with self._lock:
+            height = self.height
+            # Never earlier than the previous block, so blocks.idx stays sorted by time
+            timestamp = max(time.time_ns() // 1_000_000, self.last_timestamp)
+            digest = block_hash(self.last_hash, height, timestamp, payload)
+
+            offset = self._end
+            self._data.write(_FRAME_HEADER.pack(height, timestamp, self.last_hash, digest, len(payload)))
+            self._data.write(payload)
+            self._data.flush()
+            key = pallet_key(data.get('pallet_id'))
+            self._index.write(np.array([(offset, timestamp, key)], dtype=INDEX_DTYPE).tobytes())
+            self._index.flush()
+            if self.fsync:
+                os.fsync(self._data.fileno())
+                os.fsync(self._index.fileno())
+
+            block = self._to_block(height, timestamp, self.last_hash, digest, payload)
+            self._end = offset + _FRAME_HEADER.size + len(payload)
+            self.height = height + 1
+            self.last_hash = digest
+            self.last_timestamp = timestamp
+            self.hot.append(block)
+            self._by_pallet.setdefault(key, array('q')).append(height)
+        return block
+
+    # ---------------------------
+    # Reading
+    # ---------------------------
+    def get(self, height):
+        # Under the lock: height, hot and the index map must not move underneath an append
+        with self._lock:
+            if not 0 <= height < self.height:
+                raise IndexError(f"No block {height} in a ledger of {self.height}")
+            hot_start = self.height - len(self.hot)
+            if height >= hot_start:
+                return self.hot[height - hot_start]
+            return self._read_frame(int(self._read_index(height, height + 1)[0]['offset']))[0]
+
+    def offset(self, height):
+        """Position of block `height`'s frame in blocks.dat"""
+        with self._lock:
+            return int(self._read_index(height, height + 1)[0]['offset'])
+
+    def iter_blocks(self, start=0, end=None):
+        """Stream blocks [start, end) from disk in order, one frame at a time"""
+        end = self.height if end is None else min(end, self.height)
+        if start >= end:
+            return
+        offset = self.offset(start)
+        self._data.flush()
+        with open(self.data_path, 'rb', buffering=1 << 20) as f:
+            f.seek(offset)
+            for _ in range(start, end):
+                height, timestamp, previous, digest, length = _FRAME_HEADER.unpack(f.read(_FRAME_HEADER.size))
+                yield self._to_block(height, timestamp, previous, digest, f.read(length))
+
+    def heights_for_pallet(self, pallet_id):
+        """Heights of the blocks whose pallet_id hashes like this one (verify the id on the block)"""
+        with self._lock:
+            return np.array(self._by_pallet.get(pallet_key(pallet_id), ()), dtype=np.int64)
+
+    def height_range(self, since_ms=None, until_ms=None):
+        """[start, end) heights of the blocks with since_ms <= timestamp < until_ms"""
+        with self._lock:
+            timestamps = self._read_index(0, self.height)['timestamp']
+        start = 0 if since_ms is None else int(np.searchsorted(timestamps, since_ms, side='left'))
+        end = self.height if until_ms is None else int(np.searchsorted(timestamps, until_ms, side='left'))
+        return start, max(start, end)
+
+    def blocks(self, offset=0, limit=None, pallet_id=None, since_ms=None, until_ms=None):
+        """
+        Stream blocks matching the filters, oldest first, skipping `offset` of
+        them and yielding at most `limit`.
+        """
+        start, end = self.height_range(since_ms, until_ms)
+        if pallet_id is None:
+            stop = end if limit is None else min(end, start + offset + limit)
+            yield from self.iter_blocks(start + offset, stop)
+            return
+
+        heights = self.heights_for_pallet(pallet_id)
+        heights = heights[(heights >= start) & (heights < end)]
+        produced = skipped = 0
+        for height in heights.tolist():
+            if limit is not None and produced >= limit:
+                return
+            block = self.get(height)
+            if str(block.get('pallet_id')) != str(pallet_id):
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            produced += 1
+            yield block
+
+    def verify(self, start=0, end=None):
+        """
+        Recompute hashes and links of blocks [start, end).
+
+        Returns:
+            int: Height of the first bad block, or None if the range is intact
+        """
+        end = self.height if end is None else min(end, self.height)
+        if start >= end:
+            return None
+        previous = GENESIS_HASH if start == 0 else bytes.fromhex(self.get(start - 1)['block_hash'])
+        self._data.flush()
+        return verify_range(self.data_path, self.offset(start), start, end, previous)[0]
+
+    def close(self):
+        with self._lock:
+            self._index_map = None
+            self._data.close()
+            self._index.close()
@@ -0,0 +1,363 @@
+import logging
+import threading
+import time
+
+from web3.exceptions import TransactionNotFound
+
+
+def _int(value):
+    """Receipt fields are hex strings in raw RPC responses and ints once web3 has formatted them"""
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+def _hex(value):
+    value = value if isinstance(value, str) else value.hex()
+    return value if value.startswith('0x') else '0x' + value
+
+
+def _receipt_fields(receipt):
+    return {
+        'tx_hash': _hex(receipt['transactionHash']),
+        'status': _int(receipt['status']),
+        'block_number': _int(receipt['blockNumber']),
+        'gas_used': _int(receipt['gasUsed']),
+        'logs': [(_hex(log['address']).lower(), _int(log['logIndex'])) for log in receipt['logs']]
+    }
+
+
+class NonceManager:
+    """
+    Hands out nonces locally so transactions can be sent back to back.
+
+    Starts from the node's pending transaction count and only asks the node
+    again on resync(), e.g. after a "nonce too low" error.
+    """
+
+    def __init__(self, w3, account):
+        self.w3 = w3
+        self.account = account
+        self._lock = threading.Lock()
+        self._next = w3.eth.get_transaction_count(account, 'pending')
+
+    def next(self):
+        with self._lock:
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def resync(self):
+        """Skip ahead to the node's pending count, e.g. after a "nonce too low" error; never goes back"""
+        with self._lock:
+            self._next = max(self._next, self.w3.eth.get_transaction_count(self.account, 'pending'))
+            return self._next
+
+    def confirmed(self):
+        """Nonces below this have been mined"""
+        return self.w3.eth.get_transaction_count(self.account, 'latest')
+
+
+class _InFlight:
+    __slots__ = ('nonce', 'transaction', 'payload', 'hashes', 'fillers', 'sent_at', 'resubmits', 'sending')
+
+    def __init__(self, nonce, transaction, payload):
+        self.nonce = nonce
+        self.transaction = transaction
+        self.payload = payload
+        self.hashes = []  # every hash sent for this entry; any of them may be mined
+        self.fillers = set()  # hashes of self-transfers sent to fill the nonce once given up
+        self.sent_at = time.monotonic()
+        self.resubmits = 0
+        self.sending = True  # the tracker leaves it alone until the send returns
+
+
+class TransactionPipeline:
+    """
+    Keeps many transactions in flight from one account.
+
+    submit() assigns the nonce locally, sends the transaction and returns its
+    hash without waiting for the receipt; it blocks only when `max_in_flight`
+    transactions are unconfirmed, for at most `submit_timeout` seconds. A tracker thread polls receipts of all
+    in-flight hashes every `poll_interval` seconds, in JSON-RPC batches of
+    `poll_batch` where the provider supports it. A transaction without a
+    receipt after `resubmit_after` seconds is sent again: with the same nonce
+    and higher fees if its nonce is still free (dropped or stuck), with a new
+    nonce if another transaction took it (replaced). After `max_resubmits`
+    the entry is given up and its nonce, if still free, is filled with an
+    empty self-transfer so later nonces are not blocked. The entry stays
+    tracked until the filler (or one of its own sends) is mined or another
+    transaction takes the nonce; a failed filler send is retried.
+
+    `on_confirmed(confirmed)` receives a list of (payload, receipt fields) per
+    poll; `on_failed(payload)` is called for reverted transactions and for
+    abandoned ones once their nonce is used up.
+    Both run on the tracker thread.
+    """
+
+    def __init__(self, w3, account=None, on_confirmed=None, on_failed=None, max_in_flight=256, poll_interval=0.25,
+                 poll_batch=100, resubmit_after=30.0, max_resubmits=3, fee_bump=1.125, submit_timeout=60.0):
+        """
+        Args:
+            w3 (Web3): Connected client; the account must be unlocked on the node (Hardhat, eth-tester)
+            account (str): Sender, defaults to w3.eth.default_account
+            on_confirmed (callable): Called with [(payload, receipt fields)] for mined, successful transactions
+            on_failed (callable): Called with the payload of a reverted or abandoned transaction
+            max_in_flight (int): Unconfirmed transactions before submit() waits
+            poll_interval (float): Seconds between receipt polls
+            poll_batch (int): Receipts requested per JSON-RPC batch
+            resubmit_after (float): Seconds without a receipt before a transaction is sent again
+            max_resubmits (int): Resends before giving up
+            fee_bump (float): Fee multiplier for a same-nonce replacement; nodes require at least 1.1
+            submit_timeout (float): Seconds submit() waits for room before giving up
+        """
+        self.w3 = w3
+        self.account = account or w3.eth.default_account
+        self.nonces = NonceManager(w3, self.account)
+        self.on_confirmed = on_confirmed or (lambda confirmed: None)
+        self.on_failed = on_failed or (lambda payload: None)
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        self.poll_batch = poll_batch
+        self.resubmit_after = resubmit_after
+        self.max_resubmits = max_resubmits
+        self.fee_bump = fee_bump
+        self.submit_timeout = submit_timeout
+        self.logger = logging.getLogger('BlockchainRecorder')
+
+        self._in_flight = {}  # nonce -> _InFlight
+        self._lock = threading.Lock()
+        self._room = threading.Condition(self._lock)
+        self._batch_requests = hasattr(w3.provider, 'make_batch_request')
+        self.counters = {'submitted': 0, 'confirmed': 0, 'reverted': 0, 'resubmitted': 0, 'abandoned': 0}
+
+        self._stopping = threading.Event()
+        self._tracker = threading.Thread(target=self._run, name='tx-tracker', daemon=True)
+        self._tracker.start()
+
+    # ---------------------------
+    # Submission
+    # ---------------------------
+    def submit(self, transaction, payload=None, timeout=None):
+        """
+        Send a transaction without waiting for its receipt.
+
+        Args:
+            transaction: A contract function call (e.g. contract.functions.recordBreach(...)) or a tx dict
+            payload: Handed back to on_confirmed / on_failed
+            timeout (float): Seconds to wait for room, `submit_timeout` by default
+
+        Returns:
+            str: The transaction hash, 'pending' if it could not be sent yet (the tracker keeps trying),
+                or None if the pipeline stayed full for `timeout` seconds and the transaction was not taken
+        """
+        timeout = self.submit_timeout if timeout is None else timeout
+        with self._room:
+            if not self._room.wait_for(lambda: len(self._in_flight) < self.max_in_flight, timeout):
+                self.logger.error(f"{len(self._in_flight)} transactions in flight for {timeout}s, not submitting")
+                return None
+            entry = _InFlight(self.nonces.next(), transaction, payload)
+            self._in_flight[entry.nonce] = entry
+            self.counters['submitted'] += 1
+        return self._send(entry) or 'pending'
+
+    def _build(self, entry, bump=1.0):
+        params = {'from': self.account, 'nonce': entry.nonce}
+        if isinstance(entry.transaction, dict):
+            tx = dict(entry.transaction, **params)
+        else:
+            tx = entry.transaction.build_transaction(params)
+        if bump != 1.0:
+            fee_fields = [field for field in ('gasPrice', 'maxFeePerGas', 'maxPriorityFeePerGas') if field in tx]
+            if not fee_fields:
+                # Plain dicts leave fees to the node; a replacement needs them explicit
+                tx['gasPrice'] = self.w3.eth.gas_price
+                fee_fields = ['gasPrice']
+            for field in fee_fields:
+                tx[field] = int(tx[field] * bump)
+        return tx
+
+    def _send(self, entry, bump=1.0):
+        entry.sending = True
+        try:
+            tx_hash = _hex(self.w3.eth.send_transaction(self._build(entry, bump)))
+        except Exception as e:
+            self.logger.warning(f"Sending transaction with nonce {entry.nonce} failed: {e}")
+            tx_hash = None
+            try:
+                if entry.nonce < self.nonces.confirmed() and not entry.hashes:
+                    # Someone else used this nonce ("nonce too low"); move the entry to a fresh one
+                    self._renumber(entry)
+            except Exception:
+                pass  # node unreachable; the tracker retries
+        with self._lock:
+            if tx_hash:
+                entry.hashes.append(tx_hash)
+            entry.sent_at = time.monotonic()
+            entry.sending = False
+        return tx_hash
+
+    def _renumber(self, entry):
+        self.nonces.resync()
+        with self._lock:
+            self._in_flight.pop(entry.nonce, None)
+            entry.nonce = self.nonces.next()
+            self._in_flight[entry.nonce] = entry
+
+    # ---------------------------
+    # Receipt tracking
+    # ---------------------------
+    def _fetch_receipts(self, hashes):
+        """tx hash -> receipt fields for the hashes that have been mined"""
+        receipts = {}
+        for start in range(0, len(hashes), self.poll_batch):
+            chunk = hashes[start:start + self.poll_batch]
+            if self._batch_requests:
+                try:
+                    responses = self.w3.provider.make_batch_request(
+                        [('eth_getTransactionReceipt', [tx_hash]) for tx_hash in chunk]
+                    )
+                    for response in responses:
+                        if response.get('result'):
+                            fields = _receipt_fields(response['result'])
+                            receipts[fields['tx_hash']] = fields
+                    continue
+                except Exception as e:
+                    self.logger.info(f"Batch requests unavailable, polling receipts one by one: {e}")
+                    self._batch_requests = False
+            for tx_hash in chunk:
+                try:
+                    receipts[tx_hash] = _receipt_fields(self.w3.eth.get_transaction_receipt(tx_hash))
+                except TransactionNotFound:
+                    pass
+        return receipts
+
+    def poll(self):
+        """Collect receipts, report outcomes and resubmit overdue transactions; run by the tracker thread"""
+        with self._lock:
+            entries = [entry for entry in self._in_flight.values() if not entry.sending]
+        if not entries:
+            return
+
+        receipts = self._fetch_receipts([tx_hash for entry in entries for tx_hash in entry.hashes])
+        confirmed, done, overdue = [], [], []
+        now = time.monotonic()
+        for entry in entries:
+            receipt = next((receipts[tx_hash] for tx_hash in entry.hashes if tx_hash in receipts), None)
+            if receipt is None:
+                # Entries whose send failed are retried sooner, backing off
+                wait = self.resubmit_after if entry.hashes else min(self.resubmit_after, 2.0 ** entry.resubmits)
+                if now - entry.sent_at >= wait:
+                    overdue.append(entry)
+                continue
+            done.append(entry)
+            if receipt['tx_hash'] in entry.fillers:
+                # The filler took the nonce, so the given-up transaction can no longer be mined
+                self.counters['abandoned'] += 1
+                self.on_failed(entry.payload)
+            elif receipt['status'] == 1:
+                confirmed.append((entry.payload, receipt))
+            else:
+                self.counters['reverted'] += 1
+                self.logger.error(f"Transaction {receipt['tx_hash']} reverted")
+                self.on_failed(entry.payload)
+
+        if done:
+            with self._room:
+                for entry in done:
+                    self._in_flight.pop(entry.nonce, None)
+                self._room.notify_all()
+        if confirmed:
+            self.counters['confirmed'] += len(confirmed)
+            self.on_confirmed(confirmed)
+        if overdue:
+            self._resubmit(overdue)
+
+    def _resubmit(self, entries):
+        mined_below = self.nonces.confirmed()
+        for entry in entries:
+            nonce_taken = entry.nonce < mined_below
+            if entry.resubmits >= self.max_resubmits:
+                self._abandon(entry, nonce_taken)
+                continue
+            entry.resubmits += 1
+            self.counters['resubmitted'] += 1
+            if nonce_taken:
+                if entry.hashes and self._fetch_receipts(entry.hashes):
+                    # Mined after this poll fetched receipts; the next poll reports it
+                    entry.resubmits -= 1
+                    self.counters['resubmitted'] -= 1
+                    continue
+                # None of our hashes has a receipt, so another transaction used the nonce
+                self.logger.warning(f"Transaction with nonce {entry.nonce} was replaced, resending with a new nonce")
+                self._renumber(entry)
+                self._send(entry)
+            elif not entry.hashes:
+                self.logger.warning(f"Retrying send of transaction with nonce {entry.nonce}")
+                self._send(entry)
+            else:
+                # Dropped from the mempool or underpriced: same nonce, higher fees
+                self.logger.warning(f"No receipt for nonce {entry.nonce}, resending with higher fees")
+                self._send(entry, self.fee_bump ** entry.resubmits)
+
+    def _abandon(self, entry, nonce_taken):
+        """
+        Fill the nonce of a given-up entry with an empty self-transfer. The entry
+        is reported failed only once the nonce is used up: by the filler (see
+        poll) or, here, by a transaction that is none of ours.
+        """
+        if nonce_taken:
+            if self._fetch_receipts(entry.hashes):
+                return  # one of our sends or fillers was mined after all; the next poll reports it
+            self.logger.error(f"Giving up transaction with nonce {entry.nonce}: the nonce was used by another one")
+            with self._room:
+                self._in_flight.pop(entry.nonce, None)
+                self._room.notify_all()
+            self.counters['abandoned'] += 1
+            self.on_failed(entry.payload)
+            return
+
+        if not entry.fillers:
+            self.logger.error(f"Giving up transaction with nonce {entry.nonce} after {entry.resubmits} resubmits")
+        # Fill the nonce so the transactions after it can be mined; each retry outbids the last send
+        entry.resubmits += 1
+        filler = _InFlight(entry.nonce, {'to': self.account, 'value': 0}, None)
+        try:
+            tx_hash = _hex(self.w3.eth.send_transaction(self._build(filler, self.fee_bump ** entry.resubmits)))
+        except Exception as e:
+            self.logger.error(f"Could not fill nonce {entry.nonce}, retrying: {e}")
+            tx_hash = None
+        with self._lock:
+            if tx_hash:
+                entry.hashes.append(tx_hash)
+                entry.fillers.add(tx_hash)
+            entry.sent_at = time.monotonic()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                self.logger.error(f"Receipt polling failed: {e}")
+            self._stopping.wait(self.poll_interval)
+
+    # ---------------------------
+    # Metrics and shutdown
+    # ---------------------------
+    def in_flight(self):
+        with self._lock:
+            return len(self._in_flight)
+
+    def stats(self):
+        return dict(self.counters, in_flight=self.in_flight())
+
+    def drain(self, timeout=30.0):
+        """Wait up to `timeout` seconds for every in-flight transaction to be confirmed; True if none is left"""
+        deadline = time.monotonic() + timeout
+        while self.in_flight() and time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+        return not self.in_flight()
+
+    def close(self, timeout=30.0):
+        if not self.drain(timeout):
+            self.logger.warning(f"Closing with {self.in_flight()} transactions unconfirmed")
+        self._stopping.set()
+        self._tracker.join()
@@ -1,27 +1,113 @@
+import os
+import json
+import queue
+import atexit
+import random
 import logging
+import logging.handlers
+import multiprocessing as mp
+from datetime import datetime, timezone
+
+# 'sync' writes from the calling thread; 'queue' hands records to a background listener
+LOG_MODE = os.getenv("LOG_MODE", "sync")
+# Fraction of per-reading INFO records kept in queue mode
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 0.01))
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 50 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 100_000))
+
+# Pass as `extra=SAMPLED` on high-volume per-reading logs; only these are sampled
+SAMPLED = {'sampled': True}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'logger': record.name,
+            'level': record.levelname,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SamplingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks on INFO and never loses WARNING.
+
+    Records marked with SAMPLED below WARNING are kept with probability
+    `sample_rate`. Records below WARNING are dropped (and counted) when the
+    queue is full; WARNING and above wait for room instead.
+    """
+
+    def __init__(self, log_queue, sample_rate=1.0):
+        super().__init__(log_queue)
+        self.sample_rate = sample_rate
+        self.sampled_out = 0
+        self.dropped = 0
+
+    def emit(self, record):
+        if record.levelno < logging.WARNING:
+            if getattr(record, 'sampled', False) and random.random() >= self.sample_rate:
+                self.sampled_out += 1
+                return
+            try:
+                self.queue.put_nowait(self.prepare(record))
+            except queue.Full:
+                self.dropped += 1
+            except Exception:
+                self.handleError(record)
+            return
+
+        try:
+            self.queue.put(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+
+def process_log_file(log_file):
+    """Log file for this process: child processes (worker pool) add their pid, as rotation is not multi-process safe"""
+    if mp.parent_process() is None:
+        return log_file
+    root, ext = os.path.splitext(log_file)
+    return f"{root}.{os.getpid()}{ext}"
 
 
 class LogConfigure():
     def __init__(self):
         self.log_configure_name = ""
 
-    def setup_logging(self, log_file, logger):
-        """Set up logging to file"""
+    def setup_logging(self, log_file, logger, mode=None):
+        """
+        Set up logging to file.
+
+        Args:
+            log_file (str): Log file path
+            logger (logging.Logger): Logger to configure
+            mode (str): 'sync' or 'queue', defaults to LOG_MODE
+        """
         self.logger = logger
         self.logger.setLevel(logging.INFO)
 
-        fh = logging.FileHandler(log_file)
-        fh.setLevel(logging.INFO)
+        if (mode or LOG_MODE) == 'queue':
+            self._setup_queue_logging(log_file)
+        else:
+            fh = logging.FileHandler(log_file)
+            fh.setLevel(logging.INFO)
 
-        ch = logging.StreamHandler()
-        ch.setLevel(logging.INFO)
+            ch = logging.StreamHandler()
+            ch.setLevel(logging.INFO)
 
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        fh.setFormatter(formatter)
-        ch.setFormatter(formatter)
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+            fh.setFormatter(formatter)
+            ch.setFormatter(formatter)
 
-        self.logger.addHandler(fh)
-        self.logger.addHandler(ch)
+            self.logger.addHandler(fh)
+            self.logger.addHandler(ch)
 
 
         if self.logger.name == 'LogisticsAgent':
@@ -30,7 +116,29 @@ class LogConfigure():
             self.log_configure_name = 'Supply Chain Agent'
         elif self.logger.name == 'BlockchainRecorder':
             self.log_configure_name = 'Blockchain recorder'
+        elif self.logger.name == 'WorkerPool':
+            self.log_configure_name = 'Worker pool'
         else:
             self.log_configure_name = '{There is some error for the "log_configure_name"}'
 
         self.logger.info(f"{self.log_configure_name} initialized")
+
+    def _setup_queue_logging(self, log_file):
+        """Size-rotated JSON lines file plus console, written by a QueueListener thread"""
+        fh = logging.handlers.RotatingFileHandler(process_log_file(log_file), maxBytes=LOG_MAX_BYTES,
+                                                  backupCount=LOG_BACKUP_COUNT)
+        fh.setLevel(logging.INFO)
+        fh.setFormatter(JsonFormatter())
+
+        # The console only gets warnings; the full stream is in the file
+        ch = logging.StreamHandler()
+        ch.setLevel(logging.WARNING)
+        ch.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self.listener = logging.handlers.QueueListener(log_queue, fh, ch, respect_handler_level=True)
+        self.listener.start()
+        # Flush what is still queued when the process exits
+        atexit.register(self.listener.stop)
+
+        self.logger.addHandler(SamplingQueueHandler(log_queue, sample_rate=LOG_SAMPLE_RATE))
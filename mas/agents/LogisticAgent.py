@@ -1,72 +1,141 @@
 import json
 import redis
+import argparse
 import time
 import logging
 import os
 import sys
 from datetime import datetime
+from collections import Counter
 
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 appended_path = sys.path.append(project_root)
 
 # Now you can import from the blockchain package
 from blockchain.integration import BlockchainRecorder
+from blockchain.async_recorder import AsyncBlockchainRecorder
 from config.logging_config import LogConfigure
 from blockchain.state_tracker import PalletStateTracker
+from messaging.codec import encode, decode, CodecError
+from messaging.transport import make_transport
+from messaging.backpressure import BufferedTransport, SHED_POLICIES
+from mas.agents.warehouse_index import WarehouseIndex, haversine_km
+from mas.agents.warehouse_registry import WarehouseRegistry, UnknownWarehouseError
+from mas.agents.reroute_assignment import RerouteAssigner
+
+
+DEFAULT_WAREHOUSES = {
+    "warehouse_amsterdam": {"location": [52.3676, 4.9041], "capacity": 100, "available": True},
+    "warehouse_berlin": {"location": [52.5200, 13.4050], "capacity": 80, "available": True},
+    "warehouse_paris": {"location": [48.8566, 2.3522], "capacity": 120, "available": True},
+    "warehouse_brussels": {"location": [50.8503, 4.3517], "capacity": 60, "available": True}
+}
 
 
 class LogisticsAgent:
-    def __init__(self, log_file='../../logs/logistics_agent.log'):
+    def __init__(self, log_file='../../logs/logistics_agent.log', transport=None, reroute_window=None,
+                 reroute_batch_size=200, buffer_size=10_000, shed_policy='coalesce', chain_batch_size=1,
+                 chain_batch_wait=2.0, anchor_interval=None, max_in_flight=None):
         self.redis_client = None
-        self.pubsub = None
-        self.warehouses = {
-            "warehouse_amsterdam": {"location": [52.3676, 4.9041], "capacity": 100, "available": True},
-            "warehouse_berlin": {"location": [52.5200, 13.4050], "capacity": 80, "available": True},
-            "warehouse_paris": {"location": [48.8566, 2.3522], "capacity": 120, "available": True},
-            "warehouse_brussels": {"location": [50.8503, 4.3517], "capacity": 60, "available": True}
-        }
-        self.blockchain_recorder = BlockchainRecorder(simulation_mode=False)
+        self.transport_kind = transport  # 'pubsub' or 'streams', defaults to MESSAGE_TRANSPORT
+        self.transport = None
+        # Bounded in-process buffer; only predicted-breach alerts may be shed. 0 disables it
+        self.buffer_size = buffer_size
+        self.shed_policy = shed_policy
+        # Local cache of the shared warehouse registry; the defaults seed an empty registry
+        self.warehouse_index = WarehouseIndex.from_dict(DEFAULT_WAREHOUSES)
+        self.warehouses = self.warehouse_index.warehouses
+        self.registry = None
+        # Batch reroute mode: alerts collected for `reroute_window` seconds are assigned in one solve
+        self.reroute_window = reroute_window
+        self.reroute_batch_size = reroute_batch_size
+        self.assigner = RerouteAssigner(self.warehouse_index)
+        self.pending_reroutes = {}  # pallet_id -> (alert, [lat, lon]), latest alert wins
+        self.reroute_solve_times = []  # (batch size, solve ms)
+        self._next_flush = time.monotonic()
+        # anchor_interval: log breaches in a Merkle tree and only put its root on chain
+        # max_in_flight: send breach transactions without waiting for each receipt
+        self.blockchain_recorder = BlockchainRecorder(simulation_mode=False, transport=transport,
+                                                      anchor_interval=anchor_interval, max_in_flight=max_in_flight)
         self.logger = logging.getLogger('LogisticsAgent')
         if not self.logger.handlers:
             LogConfigure().setup_logging(log_file, self.logger)
+        # Breaches are recorded on a background thread; completion arrives on the 'events' channel
+        # chain_batch_size > 1 records breaches with one recordBreaches transaction per batch
+        self.chain_queue = AsyncBlockchainRecorder(self.blockchain_recorder, batch_size=chain_batch_size,
+                                                   batch_wait=chain_batch_wait)
+        self.stats_interval = 10.0
+        self._next_stats = time.monotonic() + self.stats_interval
         self.state_tracker = PalletStateTracker()
 
     def connect_to_redis(self):
         """Connect to Redis server"""
         try:
             self.redis_client = redis.Redis(host='localhost', port=6379, db=0)
-            self.pubsub = self.redis_client.pubsub()
-            self.pubsub.subscribe('alerts')  # Subscribe to alerts channel
-            self.pubsub.subscribe('logistics_commands')  # Subscribe to commands channel
-            self.pubsub.subscribe('events')
-            self.logger.info("Connected to Redis and subscribed to channels")
+            # Alerts, warehouse commands and blockchain feedback events
+            self.transport = make_transport(
+                self.redis_client,
+                ['alerts', 'logistics_commands', 'events'],
+                kind=self.transport_kind,
+                group='logistics_agents'
+            )
+            if self.buffer_size:
+                self.transport = BufferedTransport(
+                    self.transport, self.buffer_size, self.shed_policy, classify=self.classify_message
+                )
+            self.logger.info(f"Connected to Redis and subscribed to channels via {self.transport.kind}")
+            self.connect_registry()
             return True
         except redis.ConnectionError:
             self.logger.error("Could not connect to Redis")
             return False
 
+    def connect_registry(self):
+        """Load the shared warehouse registry into the local index, seeding it if empty"""
+        self.registry = WarehouseRegistry(index=self.warehouse_index)
+        self.registry.load()
+        if not len(self.registry):
+            self.registry.import_rows(
+                (name, data['location'], data['capacity'], data['available'])
+                for name, data in DEFAULT_WAREHOUSES.items()
+            )
+            self.registry.load()
+
+    def persist_reservations(self, counts):
+        """Take reserved slots off the shared capacity; the local index is already updated"""
+        if not self.registry or not counts:
+            return
+        try:
+            self.registry.adjust_capacities({name: -count for name, count in counts.items()})
+        except redis.RedisError as e:
+            self.logger.error(f"Could not persist warehouse capacity: {e}")
+
     def calculate_distance(self, loc1, loc2):
         """
-        Calculate simplified distance between two coordinates.
-        In a real implementation, you would use a proper geospatial library.
+        Calculate the great-circle (haversine) distance between two coordinates.
 
         Args:
             loc1 (list): [lat1, lon1]
             loc2 (list): [lat2, lon2]
 
         Returns:
-            float: Distance between the points
+            float: Distance between the points in km
         """
         try:
-            # Simple Euclidean distance for demonstration
-            # In production, use Haversine formula for real distances
-            lat_diff = loc1[0] - loc2[0]
-            lon_diff = loc1[1] - loc2[1]
-            return (lat_diff**2 + lon_diff**2)**0.5
+            return haversine_km(loc1, loc2)
         except (IndexError, TypeError) as e:
             self.logger.error(f"Error calculating distance: {e}")
             raise ValueError("Invalid coordinate format")
 
+    def find_nearest_warehouses(self, current_location, k=1, min_capacity=1):
+        """
+        Find the k nearest available warehouses with at least `min_capacity` free.
+
+        Returns:
+            list: (name, distance_km) pairs, nearest first
+        """
+        return self.warehouse_index.nearest(current_location, k=k, min_capacity=min_capacity)
+
     def find_nearest_warehouse(self, current_location):
         """
         Find the nearest available warehouse to the current location.
@@ -78,35 +147,13 @@ class LogisticsAgent:
             str: Name of the nearest available warehouse, or None if none available
         """
         try:
-            available_warehouses = {
-                name: data for name, data in self.warehouses.items() 
-                if data['available'] and data['capacity'] > 0
-            }
-
-            if not available_warehouses:
+            nearest = self.find_nearest_warehouses(current_location)
+            if not nearest:
                 self.logger.warning("No available warehouses with capacity")
                 return None
 
-            # Calculate distances to all available warehouses
-            distances = {}
-            for name, data in available_warehouses.items():
-                try:
-                    warehouse_loc = data['location']
-                    distance = self.calculate_distance(current_location, warehouse_loc)
-                    distances[name] = distance
-                except (KeyError, TypeError) as e:
-                    self.logger.error(f"Error calculating distance to {name}: {e}")
-                    continue
-
-            if not distances:
-                self.logger.error("Could not calculate distances to any warehouse")
-                return None
-
-            # Find the nearest warehouse
-            nearest_warehouse = min(distances.items(), key=lambda x: x[1])[0]
-            self.logger.info(
-                f"Selected {nearest_warehouse} at distance {distances[nearest_warehouse]:.2f} units"
-            )
+            nearest_warehouse, distance = nearest[0]
+            self.logger.info(f"Selected {nearest_warehouse} at distance {distance:.2f} km")
 
             return nearest_warehouse
 
@@ -127,7 +174,6 @@ class LogisticsAgent:
             pallet_id = alert_data.get('pallet_id', 'UNKNOWN_PALLET')
             temperature = alert_data.get('temperature', 0)
             location = alert_data.get('location', {})
-            timestamp = alert_data.get('timestamp', datetime.now().isoformat())
 
             # Log the received alert
             self.logger.warning(
@@ -151,71 +197,30 @@ class LogisticsAgent:
                 self.logger.error(f"Invalid coordinate format for {pallet_id}: {e}")
                 return
 
+            # Batch mode: hold the alert and assign it together with the rest of the window
+            if self.reroute_window is not None:
+                self.pending_reroutes[pallet_id] = (alert_data, current_location)
+                return
+
             # Find the nearest available warehouse
             warehouse = self.find_nearest_warehouse(current_location)
 
             if not warehouse:
                 self.logger.error(f"No available warehouse found for {pallet_id}")
-
-                # Send a failure notification
-                failure_alert = {
-                    'type': 'reroute_failed',
-                    'pallet_id': pallet_id,
-                    'reason': 'No available warehouses',
-                    'timestamp': timestamp,
-                    'original_alert': alert_data
-                }
-                self.redis_client.publish('alerts', json.dumps(failure_alert))
+                self.publish_reroute_failed(alert_data)
                 return
 
-            # Create reroute command
-            reroute_command = {
-                'type': 'reroute',
-                'pallet_id': pallet_id,
-                'warehouse': warehouse,
-                'original_location': location,
-                'new_location': self.warehouses[warehouse]['location'],
-                'temperature': temperature,
-                'timestamp': timestamp,
-                'reason': f'Temperature breach: {temperature}°C'
-            }
-
             # Publish reroute command
             try:
-                self.redis_client.publish('commands', json.dumps(reroute_command))
-                self.logger.info(
-                    f"Issued reroute command for {pallet_id} to {warehouse} "
-                    f"at {self.warehouses[warehouse]['location']}"
-                )
-
-                tx_hash = self.blockchain_recorder.record_temperature_breach(pallet_id, temperature, location)
-                if tx_hash:
-                    self.state_tracker.update_pallet(
-                        pallet_id,
-                        status="recorded_on_blockchain",
-                        temperature=temperature,
-                        warehouse=warehouse,
-                        tx_hash=tx_hash
-                    )
-                    self.logger.info(f"Temperature breach recorded on blockchain: {tx_hash}")
-                    self.logger.info("BlockchainRecorder will handle Redis feedback publication")
-                else:
-                    self.logger.warning("Failed to record temperature breach on blockchain")
-
-                # Record success in log with all relevant details
-                success_log = {
-                    'event': 'reroute_commanded',
-                    'pallet_id': pallet_id,
-                    'from_location': location,
-                    'to_warehouse': warehouse,
-                    'to_location': self.warehouses[warehouse]['location'],
-                    'temperature': temperature,
-                    'timestamp': timestamp
-                }
-                self.logger.info(f"Reroute details: {json.dumps(success_log)}")
-
+                self.transport.publish('commands', encode(self.build_reroute_command(alert_data, warehouse)))
             except Exception as e:
                 self.logger.error(f"Failed to publish reroute command for {pallet_id}: {e}")
+                return
+
+            # Reserve the slot only once the command is out, so later alerts see the remaining capacity
+            self.warehouse_index.update(warehouse, capacity=self.warehouses[warehouse]['capacity'] - 1)
+            self.persist_reservations({warehouse: 1})
+            self.record_reroute(alert_data, warehouse)
 
         except KeyError as e:
             self.logger.error(f"Missing key in alert data for {pallet_id}: {e}")
@@ -230,6 +235,139 @@ class LogisticsAgent:
             # Log the full alert data for debugging
             self.logger.debug(f"Alert data that caused error: {alert_data}")
 
+    def publish_reroute_failed(self, alert_data, client=None):
+        """Send a failure notification for an alert no warehouse could take"""
+        failure_alert = {
+            'type': 'reroute_failed',
+            'pallet_id': alert_data.get('pallet_id'),
+            'reason': 'No available warehouses',
+            'timestamp': alert_data.get('timestamp', datetime.now().isoformat()),
+            'original_alert': alert_data
+        }
+        self.transport.publish('alerts', encode(failure_alert), client=client)
+
+    def build_reroute_command(self, alert_data, warehouse):
+        """Create the reroute command for a pallet going to `warehouse`"""
+        temperature = alert_data.get('temperature', 0)
+        return {
+            'type': 'reroute',
+            'pallet_id': alert_data['pallet_id'],
+            'warehouse': warehouse,
+            'original_location': alert_data.get('location', {}),
+            'new_location': self.warehouses[warehouse]['location'],
+            'temperature': temperature,
+            'timestamp': alert_data.get('timestamp', datetime.now().isoformat()),
+            'reason': f'Temperature breach: {temperature}°C'
+        }
+
+    def record_reroute(self, alert_data, warehouse):
+        """Queue a published reroute for the blockchain and record it in the state tracker and the log"""
+        pallet_id = alert_data['pallet_id']
+        temperature = alert_data.get('temperature', 0)
+        location = alert_data.get('location', {})
+        self.logger.info(
+            f"Issued reroute command for {pallet_id} to {warehouse} "
+            f"at {self.warehouses[warehouse]['location']}"
+        )
+
+        if self.chain_queue.submit(pallet_id, temperature, location):
+            self.state_tracker.update_pallet(
+                pallet_id,
+                status="blockchain_pending",
+                temperature=temperature,
+                warehouse=warehouse
+            )
+            self.logger.info("Temperature breach queued for blockchain recording")
+        else:
+            self.logger.warning("Failed to queue temperature breach for blockchain recording")
+
+        # Record success in log with all relevant details
+        success_log = {
+            'event': 'reroute_commanded',
+            'pallet_id': pallet_id,
+            'from_location': location,
+            'to_warehouse': warehouse,
+            'to_location': self.warehouses[warehouse]['location'],
+            'temperature': temperature,
+            'timestamp': alert_data.get('timestamp', datetime.now().isoformat())
+        }
+        self.logger.info(f"Reroute details: {json.dumps(success_log)}")
+
+    def flush_reroutes(self):
+        """
+        Assign every pending alert in one solve and publish all reroute commands in one pipeline.
+
+        Returns:
+            Assignment: The solver result, or None if nothing was pending
+        """
+        if not self.pending_reroutes:
+            return None
+        pending, self.pending_reroutes = self.pending_reroutes, {}
+        self._next_flush = time.monotonic() + self.reroute_window
+
+        result = self.assigner.assign([(pallet_id, location) for pallet_id, (_, location) in pending.items()])
+        self.logger.info(
+            f"Assigned {len(result.assigned)}/{len(pending)} pallets in {result.solve_ms:.2f} ms "
+            f"({result.solver})"
+        )
+        self.reroute_solve_times.append((len(pending), result.solve_ms))
+        # The solver already took these slots off the local index
+        reserved = Counter(warehouse for warehouse, _ in result.assigned.values())
+
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for pallet_id, (warehouse, _) in result.assigned.items():
+                command = self.build_reroute_command(pending[pallet_id][0], warehouse)
+                self.transport.publish('commands', encode(command), client=pipe)
+            for pallet_id in result.unassigned:
+                self.logger.error(f"No available warehouse found for {pallet_id}")
+                self.publish_reroute_failed(pending[pallet_id][0], client=pipe)
+            pipe.execute()
+        except Exception as e:
+            self.logger.error(f"Failed to publish reroute batch: {e}")
+            # No command went out: give the window's slots back
+            for warehouse, count in reserved.items():
+                if warehouse in self.warehouses:
+                    self.warehouse_index.update(warehouse, capacity=self.warehouses[warehouse]['capacity'] + count)
+            return result
+
+        self.persist_reservations(reserved)
+        for pallet_id, (warehouse, _) in result.assigned.items():
+            self.record_reroute(pending[pallet_id][0], warehouse)
+        return result
+
+    def handle_predicted_breach(self, alert_data):
+        """Record an early warning; the reroute itself waits for an actual breach"""
+        pallet_id = alert_data.get('pallet_id', 'UNKNOWN_PALLET')
+        eta = alert_data.get('eta_seconds')
+        self.logger.warning(
+            f"Predicted breach for {pallet_id} in {eta}s "
+            f"({alert_data.get('temperature')}°C, {alert_data.get('rate_per_minute')}°C/min)"
+        )
+        self.state_tracker.update_pallet(
+            pallet_id,
+            status="breach_predicted",
+            temperature=alert_data.get('temperature'),
+            eta_seconds=eta
+        )
+
+    def handle_breach_state_change(self, alert_data):
+        """Track escalation, resolution and reminders of a breach that was already rerouted"""
+        pallet_id = alert_data.get('pallet_id', 'UNKNOWN_PALLET')
+        state = alert_data.get('state', alert_data.get('type'))
+        prefix = "Breach still" if alert_data.get('renotify') else "Breach"
+        message = (f"{prefix} {state.lower()} for {pallet_id}: {alert_data.get('temperature')}°C "
+                   f"after {alert_data.get('breach_seconds')}s")
+        if alert_data.get('type') == 'temperature_escalated':
+            self.logger.critical(message)
+        else:
+            self.logger.info(message)
+        self.state_tracker.update_pallet(
+            pallet_id,
+            status=f"breach_{state.lower()}",
+            temperature=alert_data.get('temperature')
+        )
+
     def handle_spoilage_alert(self, alert_data):
         """Handle goods spoilage alerts"""
         try:
@@ -253,7 +391,7 @@ class LogisticsAgent:
             }
 
             # Publish disposal command
-            self.redis_client.publish('commands', json.dumps(disposal_command))
+            self.transport.publish('commands', encode(disposal_command))
             self.logger.info(f"Issued disposal command for {pallet_id}")
             self.state_tracker.update_pallet(
                 pallet_id,
@@ -274,14 +412,19 @@ class LogisticsAgent:
             tx_hash = event_data.get('tx_hash', None)
 
             if event_type == 'blockchain_recorded':
-                self.state_tracker.update_pallet(
-                    pallet_id,
-                    status="confirmed_on_chain",
-                    tx_hash=tx_hash
-                )
+                fields = {'status': "confirmed_on_chain", 'tx_hash': tx_hash}
+                # Where the breach sits in a batch tx or in an anchored Merkle log
+                for key in ('log_index', 'leaf_index', 'anchor_id'):
+                    if event_data.get(key) is not None:
+                        fields[key] = event_data[key]
+                self.state_tracker.update_pallet(pallet_id, **fields)
                 self.logger.info(f"Blockchain confirmation received for {pallet_id}: {tx_hash}")
                 print(f"Pallet {pallet_id} recorded on blockchian (tx: {tx_hash[:10]}...)")
             
+            elif event_type == 'blockchain_failed':
+                self.state_tracker.update_pallet(pallet_id, status="blockchain_failed")
+                self.logger.error(f"Blockchain recording failed for {pallet_id}")
+
             elif event_type == 'reroute_completed':
                 self.logger.info(f"Reroute completed for {pallet_id}")
                 print(f"Pallet {pallet_id} rerouted successfully.")
@@ -298,12 +441,92 @@ class LogisticsAgent:
         status = command_data.get('status')
 
         if warehouse in self.warehouses:
-            self.warehouses[warehouse]['available'] = status
+            changed = self.warehouses[warehouse]['available'] != status
+            self.warehouse_index.update(warehouse, available=status)
+            if self.registry and changed:
+                try:
+                    self.registry.set_available(warehouse, status)
+                except (UnknownWarehouseError, redis.RedisError) as e:
+                    self.logger.error(f"Could not persist status of {warehouse}: {e}")
             status_text = "available" if status else "unavailable"
             self.logger.info(f"Updated {warehouse} status to {status_text}")
         else:
             self.logger.warning(f"Unknown warehouse: {warehouse}")
 
+    def classify_message(self, message):
+        """
+        Buffer classification: (pallet_id, critical). Predictions are advisory and
+        may be coalesced or shed; breaches, commands and feedback events never are.
+        """
+        try:
+            data = message['decoded'] = decode(message['data'])
+        except CodecError:
+            return None, True
+        if not isinstance(data, dict):
+            return None, True  # Left for processing to report
+        if message['channel'] == b'alerts' and data.get('type') == 'predicted_breach':
+            return data.get('pallet_id'), False
+        return None, True
+
+    def process_message(self, message):
+        """Dispatch one message to the handler for its channel"""
+        channel = None
+        try:
+            data = message['decoded'] if 'decoded' in message else decode(message['data'])
+            channel = message['channel'].decode()
+            if not isinstance(data, dict):
+                raise CodecError(f"payload on {channel} is a {type(data).__name__}, not an object")
+
+            self.logger.debug(f"Received message on channel {channel}: {data}")
+
+            if channel == 'alerts':
+                alert_type = data.get('type')
+                if data.get('renotify'):
+                    # Reminder of a breach that was already rerouted and recorded
+                    self.handle_breach_state_change(data)
+                elif alert_type == 'temperature_breach':
+                    self.handle_temperature_alert(data)
+                elif alert_type == 'spoilage':
+                    self.handle_spoilage_alert(data)
+                elif alert_type == 'predicted_breach':
+                    self.handle_predicted_breach(data)
+                elif alert_type in ('temperature_escalated', 'breach_resolved'):
+                    self.handle_breach_state_change(data)
+                else:
+                    self.logger.warning(f"Unknown alert type: {alert_type}")
+
+            elif channel == 'logistics_commands':
+                command_type = data.get('type')
+                if command_type == 'warehouse_status':
+                    self.handle_warehouse_status(data)
+                else:
+                    self.logger.warning(f"Unknown command type: {command_type}")
+
+            elif channel == 'events':
+                self.handle_feedback_event(data)
+
+        except CodecError as e:
+            self.logger.error(f"Error processing message: {e}")
+        except (KeyError) as e:
+            self.logger.error(f"KeyError occure: {channel}")
+
+    def stats(self):
+        """Blockchain queue depth/age and reroute batch metrics"""
+        return {
+            'blockchain_queue': self.chain_queue.stats(),
+            'tx_pipeline': self.blockchain_recorder.tx_pipeline.stats() if self.blockchain_recorder.tx_pipeline else None,
+            'pending_reroutes': len(self.pending_reroutes),
+            'warehouses_available': sum(1 for data in self.warehouses.values() if data['available']),
+            'registry_version': self.registry.version if self.registry else None,
+            'buffer': self.transport.stats() if isinstance(self.transport, BufferedTransport) else None
+        }
+
+    def _report_stats(self):
+        now = time.monotonic()
+        if now >= self._next_stats:
+            self.logger.info(f"Agent stats: {json.dumps(self.stats())}")
+            self._next_stats = now + self.stats_interval
+
     def run(self):
         """Main loop to process messages"""
         if not self.connect_to_redis():
@@ -314,41 +537,19 @@ class LogisticsAgent:
 
         try:
             while True:
-                # Check for new messages
-                message = self.pubsub.get_message(timeout=1.0)
-                print(f"message: {message}")
-                if message and message['type'] == 'message':
-                    try:
-                        data = json.loads(message['data'])
-                        channel = message['channel'].decode()
-
-                        self.logger.debug(f"Received message on channel {channel}: {data}")
-
-                        if channel == 'alerts':
-                            alert_type = data.get('type')
-                            if alert_type == 'temperature_breach':
-                                self.handle_temperature_alert(data)
-                            elif alert_type == 'spoilage':
-                                self.handle_spoilage_alert(data)
-                            else:
-                                self.logger.warning(f"Unknown alert type: {alert_type}")
-
-                        elif channel == 'logistics_commands':
-                            command_type = data.get('type')
-                            if command_type == 'warehouse_status':
-                                self.handle_warehouse_status(data)
-                            else:
-                                self.logger.warning(f"Unknown command type: {command_type}")
-                        
-                        elif channel == 'events':
-                            self.handle_feedback_event(data)                            
-
-                    except (json.JSONDecodeError) as e:
-                        self.logger.error(f"Error processing message: {e}")
-                    except (KeyError) as e:
-                        self.logger.error(f"KeyError occure: {channel}")
-
-                time.sleep(0.1)
+                # Wait for new messages, then handle everything that is pending
+                messages = self.transport.read(timeout=1.0 if self.reroute_window is None else self.reroute_window)
+                for message in messages:
+                    self.process_message(message)
+                self.transport.ack(messages)
+
+                if self.pending_reroutes and (len(self.pending_reroutes) >= self.reroute_batch_size
+                                              or time.monotonic() >= self._next_flush):
+                    self.flush_reroutes()
+                # Only when an announcement arrived or a version check is due; no Redis round trip otherwise
+                if self.registry.refresh_due():
+                    self.registry.refresh()
+                self._report_stats()
 
         except KeyboardInterrupt:
             self.logger.info("Logistics Agent stopped by user")
@@ -357,10 +558,34 @@ class LogisticsAgent:
             self.logger.error(f"Unexpected error: {e}")
             print(f"Unexpected error: {e}")
         finally:
-            if self.pubsub:
-                self.pubsub.close()
-            self.logger.info("Logistics Agent shutdown complete")
+            self.chain_queue.close()
+            self.blockchain_recorder.close()
+            if self.registry:
+                self.registry.close()
+            if self.transport:
+                self.transport.close()
+            self.logger.info(f"Logistics Agent shutdown complete: {json.dumps(self.stats())}")
 
 if __name__ == "__main__":
-    agent = LogisticsAgent()
+    parser = argparse.ArgumentParser(description="Logistics agent")
+    parser.add_argument('--reroute-window', type=float,
+                        help="Collect breach alerts for this many seconds and assign them in one batch")
+    parser.add_argument('--reroute-batch-size', type=int, default=200)
+    parser.add_argument('--buffer-size', type=int, default=10_000,
+                        help="Messages buffered in process before shedding; 0 disables the buffer")
+    parser.add_argument('--shed-policy', choices=SHED_POLICIES, default='coalesce')
+    parser.add_argument('--chain-batch-size', type=int, default=1,
+                        help="Breaches per recordBreaches transaction; needs the redeployed contract")
+    parser.add_argument('--chain-batch-wait', type=float, default=2.0,
+                        help="Seconds a partial breach batch waits before it is sent")
+    parser.add_argument('--anchor-interval', type=float,
+                        help="Log breaches off chain and anchor their Merkle root every this many seconds")
+    parser.add_argument('--max-in-flight', type=int,
+                        help="Keep up to this many breach transactions unconfirmed instead of waiting for each receipt")
+    args = parser.parse_args()
+
+    agent = LogisticsAgent(reroute_window=args.reroute_window, reroute_batch_size=args.reroute_batch_size,
+                           buffer_size=args.buffer_size, shed_policy=args.shed_policy,
+                           chain_batch_size=args.chain_batch_size, chain_batch_wait=args.chain_batch_wait,
+                           anchor_interval=args.anchor_interval, max_in_flight=args.max_in_flight)
     agent.run()
@@ -0,0 +1,155 @@
+from collections import Counter
+
+from mas.agents.breach_detector import CRITICAL_TEMP
+
+NORMAL = "NORMAL"
+BREACHED = "BREACHED"
+ESCALATED = "ESCALATED"
+RESOLVED = "RESOLVED"
+
+
+class _PalletAlertState:
+    __slots__ = ('state', 'breach_since', 'entered_at', 'last_notified', 'spoiled')
+
+    def __init__(self):
+        self.state = NORMAL
+        self.breach_since = None  # first reading of the current excursion, for the hold-off
+        self.entered_at = None
+        self.last_notified = None
+        self.spoiled = False
+
+
+class AlertStateMachine:
+    """
+    Per-pallet alert state: NORMAL -> BREACHED -> ESCALATED -> RESOLVED.
+
+    Only state transitions produce alerts; readings that do not change the
+    state are counted as suppressed. A breach is reported once it has
+    lasted `hold_off` seconds, escalated when the temperature goes critical
+    or the breach lasts `escalate_after` seconds, and resolved when the
+    temperature drops `hysteresis` °C below the threshold. While a pallet
+    stays breached, its current alert is repeated every
+    `renotify_interval` seconds. Spoilage is reported once per pallet.
+
+    Only pallets that are not quietly NORMAL are kept, so memory follows
+    the number of open incidents rather than the fleet size.
+    """
+
+    def __init__(self, hold_off=0.0, renotify_interval=300.0, escalate_after=600.0,
+                 critical_temp=CRITICAL_TEMP, hysteresis=0.5):
+        """
+        Args:
+            hold_off (float): Seconds a breach must persist before it is reported
+            renotify_interval (float): Seconds between repeats of an open alert, None to disable
+            escalate_after (float): Seconds of continuous breach before escalating
+            critical_temp (float): Temperature that escalates immediately
+            hysteresis (float): °C below the threshold needed to resolve
+        """
+        self.hold_off = hold_off
+        self.renotify_interval = renotify_interval
+        self.escalate_after = escalate_after
+        self.critical_temp = critical_temp
+        self.hysteresis = hysteresis
+
+        self.pallets = {}  # pallet_id -> _PalletAlertState, NORMAL pallets are dropped
+        self.sent = Counter()
+        self.suppressed = Counter()
+
+    def __len__(self):
+        return len(self.pallets)
+
+    def __contains__(self, pallet_id):
+        return pallet_id in self.pallets
+
+    def state_of(self, pallet_id):
+        entry = self.pallets.get(pallet_id)
+        return entry.state if entry else NORMAL
+
+    def _notify(self, entry, alerts, alert_type, now, **extra):
+        entry.last_notified = now
+        self.sent[alert_type] += 1
+        alerts.append((alert_type, extra))
+
+    def observe(self, pallet_id, temperature, threshold, now, status=None):
+        """
+        Feed one reading through the pallet's state machine.
+
+        Args:
+            pallet_id (str): Pallet identifier
+            temperature (float): Reading in °C
+            threshold (float): Breach threshold for this pallet
+            now (float): Reading time in epoch seconds
+            status (str): Pallet status from the reading
+
+        Returns:
+            list: (alert_type, extra fields) for each alert to send downstream
+        """
+        if status in ("DELIVERED", "AWAITING_DISPOSAL"):
+            # Nothing left to alert on for this pallet
+            self.pallets.pop(pallet_id, None)
+            return []
+
+        breached = temperature > threshold
+        entry = self.pallets.get(pallet_id)
+        if entry is None:
+            if not breached and status != "SPOILED":
+                return []
+            entry = self.pallets[pallet_id] = _PalletAlertState()
+
+        alerts = []
+        if status == "SPOILED":
+            if entry.spoiled:
+                self.suppressed['spoilage'] += 1
+            else:
+                entry.spoiled = True
+                self._notify(entry, alerts, 'spoilage', now)
+
+        state = entry.state
+        if breached:
+            if state in (NORMAL, RESOLVED):
+                if entry.breach_since is None:
+                    entry.breach_since = now
+                if now - entry.breach_since >= self.hold_off:
+                    entry.state, entry.entered_at = BREACHED, now
+                    self._notify(entry, alerts, 'temperature_breach', now, state=BREACHED)
+                else:
+                    self.suppressed['hold_off'] += 1
+
+            elif state == BREACHED and (temperature > self.critical_temp
+                                        or now - entry.breach_since >= self.escalate_after):
+                entry.state, entry.entered_at = ESCALATED, now
+                self._notify(entry, alerts, 'temperature_escalated', now, state=ESCALATED,
+                             breach_seconds=round(now - entry.breach_since, 1))
+
+            elif self.renotify_interval is not None and now - entry.last_notified >= self.renotify_interval:
+                alert_type = 'temperature_breach' if state == BREACHED else 'temperature_escalated'
+                self._notify(entry, alerts, alert_type, now, state=state, renotify=True,
+                             breach_seconds=round(now - entry.breach_since, 1))
+            else:
+                self.suppressed[state] += 1
+
+        elif state in (BREACHED, ESCALATED):
+            if temperature <= threshold - self.hysteresis:
+                entry.state, entry.entered_at = RESOLVED, now
+                self._notify(entry, alerts, 'breach_resolved', now, state=RESOLVED,
+                             breach_seconds=round(now - entry.breach_since, 1))
+                entry.breach_since = None
+            else:
+                self.suppressed[state] += 1
+
+        else:
+            # Back under the threshold before the hold-off expired, or settled after resolving
+            entry.breach_since = None
+            if not entry.spoiled:
+                del self.pallets[pallet_id]
+
+        return alerts
+
+    def stats(self):
+        states = Counter(entry.state for entry in self.pallets.values())
+        return {
+            'open': {state: states[state] for state in (BREACHED, ESCALATED, RESOLVED)},
+            'sent': dict(self.sent),
+            'suppressed': dict(self.suppressed),
+            'suppressed_total': sum(self.suppressed.values())
+        }
@@ -0,0 +1,66 @@
+import csv
+from collections import namedtuple
+import numpy as np
+
+CRITICAL_TEMP = 10.0  # °C, as in SimpleProductAgent.handle_temperature_breach
+
+BatchResult = namedtuple('BatchResult', ['readings', 'temperatures', 'thresholds', 'breach', 'critical', 'spoiled'])
+
+
+class ThresholdTable:
+    """Per-pallet temperature thresholds with a default for pallets not in the table."""
+
+    def __init__(self, default=8.0, thresholds=None):
+        self.default = float(default)
+        self.thresholds = dict(thresholds or {})
+
+    @classmethod
+    def from_csv(cls, path, default=8.0):
+        """
+        Load thresholds from a CSV file with `pallet_id,threshold` columns.
+
+        Args:
+            path (str): CSV file path
+            default (float): Threshold for pallets missing from the file
+        """
+        with open(path, newline='') as f:
+            thresholds = {row['pallet_id']: float(row['threshold']) for row in csv.DictReader(f)}
+        return cls(default, thresholds)
+
+    def __len__(self):
+        return len(self.thresholds)
+
+    def get(self, pallet_id):
+        return self.thresholds.get(pallet_id, self.default)
+
+    def lookup(self, pallet_ids):
+        """Thresholds for a sequence of pallet ids as one array."""
+        get = self.thresholds.get
+        default = self.default
+        return np.fromiter((get(pallet_id, default) for pallet_id in pallet_ids), dtype=np.float64,
+                           count=len(pallet_ids))
+
+
+class BatchBreachDetector:
+    """Evaluates breach, critical and spoilage conditions for a batch of readings in one pass."""
+
+    def __init__(self, thresholds, critical_temp=CRITICAL_TEMP):
+        self.thresholds = thresholds
+        self.critical_temp = critical_temp
+
+    def evaluate(self, readings):
+        """
+        Args:
+            readings (list): Decoded sensor readings (dicts with pallet_id, temperature, status)
+
+        Returns:
+            BatchResult: Input readings plus per-reading arrays and condition masks
+        """
+        n = len(readings)
+        temperatures = np.fromiter((float(r.get('temperature', 0)) for r in readings), dtype=np.float64, count=n)
+        spoiled = np.fromiter((r.get('status') == 'SPOILED' for r in readings), dtype=bool, count=n)
+        thresholds = self.thresholds.lookup([r['pallet_id'] for r in readings])
+
+        breach = temperatures > thresholds
+        critical = temperatures > self.critical_temp
+        return BatchResult(readings, temperatures, thresholds, breach, critical, spoiled)
@@ -0,0 +1,229 @@
+from collections import OrderedDict
+
+import numpy as np
+
+# Pallets in these states will not send further readings worth tracking
+FINAL_STATUSES = ("DELIVERED", "SPOILED")
+
+
+class PalletAnalytics:
+    """
+    Incremental per-pallet temperature statistics in fixed-size arrays.
+
+    Every pallet is assigned a slot in preallocated arrays, so memory is
+    bounded by `capacity` regardless of fleet size. Each reading updates
+    the slot in O(1):
+
+    - a ring buffer of the last `window` readings and their times
+    - an EWMA of the temperature
+    - the rate of change, from a least-squares fit over the ring buffer
+      maintained with running sums (the evicted sample is subtracted, and
+      the sums are recomputed from the buffer, relative to its oldest
+      sample, each time the ring wraps, so rounding cannot accumulate)
+    - cumulative thermal exposure in degree-minutes above the threshold
+
+    A `predicted_breach` is reported once when the trend reaches the
+    threshold within `horizon` seconds. Slots are released when a pallet is
+    delivered or spoiled or idle for too long (evict_idle), and the least
+    recently updated pallet's slot is reused when the table is full.
+    """
+
+    def __init__(self, capacity=100_000, window=16, alpha=0.3, horizon=1800.0, min_samples=4):
+        """
+        Args:
+            capacity (int): Maximum number of pallets tracked at once
+            window (int): Readings kept per pallet for the trend fit
+            alpha (float): EWMA smoothing factor
+            horizon (float): Seconds ahead within which a breach is predicted
+            min_samples (int): Readings needed before predicting
+        """
+        self.capacity = capacity
+        self.window = window
+        self.alpha = alpha
+        self.horizon = horizon
+        self.min_samples = min_samples
+
+        self.slots = OrderedDict()  # pallet_id -> slot, least recently updated first
+        self.pallet_ids = [None] * capacity
+        self.free = list(range(capacity - 1, -1, -1))
+        self.evictions = 0
+        self.latest = 0.0  # newest reading time seen, the clock for evict_idle
+
+        self.temps = np.zeros((capacity, window), dtype=np.float64)
+        self.times = np.zeros((capacity, window), dtype=np.float64)
+        self.head = np.zeros(capacity, dtype=np.int32)
+        self.count = np.zeros(capacity, dtype=np.int32)
+        self.origin = np.zeros(capacity, dtype=np.float64)  # oldest buffered reading time, keeps sums well conditioned
+        self.last_seen = np.full(capacity, np.inf)  # inf while free, as release() leaves it
+        self.ewma = np.zeros(capacity, dtype=np.float64)
+        self.degree_minutes = np.zeros(capacity, dtype=np.float64)
+        self.predicted = np.zeros(capacity, dtype=bool)
+        # Running sums over the ring buffer: x = seconds since origin, y = temperature
+        self.sum_x = np.zeros(capacity)
+        self.sum_y = np.zeros(capacity)
+        self.sum_xx = np.zeros(capacity)
+        self.sum_xy = np.zeros(capacity)
+
+    def __len__(self):
+        return len(self.slots)
+
+    # ---------------------------
+    # Slot management
+    # ---------------------------
+    def _allocate(self, pallet_id, now):
+        if not self.free:
+            # Table full: reuse the least recently updated slot
+            self.release(next(iter(self.slots)))
+            self.evictions += 1
+        slot = self.free.pop()
+        self.slots[pallet_id] = slot
+        self.pallet_ids[slot] = pallet_id
+        self.head[slot] = 0
+        self.count[slot] = 0
+        self.origin[slot] = now
+        self.degree_minutes[slot] = 0.0
+        self.predicted[slot] = False
+        self.sum_x[slot] = self.sum_y[slot] = self.sum_xx[slot] = self.sum_xy[slot] = 0.0
+        return slot
+
+    def release(self, pallet_id):
+        """Stop tracking a pallet and free its slot"""
+        slot = self.slots.pop(pallet_id, None)
+        if slot is not None:
+            self.pallet_ids[slot] = None
+            self.last_seen[slot] = np.inf  # never picked by evict_idle while free
+            self.free.append(slot)
+
+    def evict_idle(self, max_idle, now=None):
+        """Release every pallet not updated in the `max_idle` seconds before `now` (the newest reading by default)"""
+        now = self.latest if now is None else now
+        released = 0
+        for slot in np.flatnonzero(self.last_seen < now - max_idle).tolist():
+            if self.pallet_ids[slot] is not None:
+                self.release(self.pallet_ids[slot])
+                released += 1
+        self.evictions += released
+        return released
+
+    # ---------------------------
+    # Updates
+    # ---------------------------
+    def _slope(self, slot):
+        """Least-squares temperature change per second over the ring buffer"""
+        n = self.count[slot]
+        denominator = n * self.sum_xx[slot] - self.sum_x[slot] ** 2
+        if n < 2 or denominator <= 1e-9:
+            return 0.0
+        return float((n * self.sum_xy[slot] - self.sum_x[slot] * self.sum_y[slot]) / denominator)
+
+    def _rebase(self, slot):
+        """Recompute the running sums of a full ring buffer, measured from its oldest sample"""
+        self.origin[slot] = self.times[slot, self.head[slot]]
+        x = self.times[slot] - self.origin[slot]
+        y = self.temps[slot]
+        self.sum_x[slot] = x.sum()
+        self.sum_y[slot] = y.sum()
+        self.sum_xx[slot] = (x * x).sum()
+        self.sum_xy[slot] = (x * y).sum()
+
+    def update(self, pallet_id, temperature, timestamp, threshold, status=None):
+        """
+        Add one reading.
+
+        Args:
+            pallet_id (str): Pallet identifier
+            temperature (float): Reading in °C
+            timestamp (float): Reading time in epoch seconds
+            threshold (float): Breach threshold for this pallet
+            status (str): Pallet status; final statuses release the slot
+
+        Returns:
+            dict: Prediction details when a breach is newly predicted, else None
+        """
+        slot = self.slots.get(pallet_id)
+        if slot is None:
+            slot = self._allocate(pallet_id, timestamp)
+        else:
+            self.slots.move_to_end(pallet_id)
+        self.latest = max(self.latest, timestamp)
+
+        n = int(self.count[slot])
+        x = timestamp - self.origin[slot]
+        y = float(temperature)
+
+        if n:
+            # Thermal exposure since the previous reading, in degree-minutes
+            previous = (self.head[slot] - 1) % self.window
+            elapsed = max(0.0, timestamp - self.times[slot, previous])
+            excess = max(0.0, float(self.temps[slot, previous]) - threshold)
+            self.degree_minutes[slot] += excess * elapsed / 60.0
+            self.ewma[slot] = self.alpha * y + (1 - self.alpha) * self.ewma[slot]
+        else:
+            self.ewma[slot] = y
+
+        head = self.head[slot]
+        if n == self.window:
+            # Ring buffer full: drop the oldest sample from the running sums
+            old_x = self.times[slot, head] - self.origin[slot]
+            old_y = float(self.temps[slot, head])
+            self.sum_x[slot] -= old_x
+            self.sum_y[slot] -= old_y
+            self.sum_xx[slot] -= old_x * old_x
+            self.sum_xy[slot] -= old_x * old_y
+        else:
+            self.count[slot] = n + 1
+
+        self.temps[slot, head] = y
+        self.times[slot, head] = timestamp
+        self.head[slot] = (head + 1) % self.window
+        if self.head[slot] == 0 and self.count[slot] == self.window:
+            # Once per lap: O(window) every `window` readings keeps updates O(1) amortized
+            self._rebase(slot)
+        else:
+            self.sum_x[slot] += x
+            self.sum_y[slot] += y
+            self.sum_xx[slot] += x * x
+            self.sum_xy[slot] += x * y
+        self.last_seen[slot] = timestamp
+
+        prediction = self._predict(pallet_id, slot, y, threshold)
+
+        if status in FINAL_STATUSES:
+            self.release(pallet_id)
+        return prediction
+
+    def _predict(self, pallet_id, slot, temperature, threshold):
+        if temperature > threshold:
+            # Already breached; the regular breach alert covers it
+            self.predicted[slot] = False
+            return None
+
+        slope = self._slope(slot)
+        if self.count[slot] < self.min_samples or slope <= 0:
+            self.predicted[slot] = False
+            return None
+
+        eta = (threshold - self.ewma[slot]) / slope
+        if eta > self.horizon or self.predicted[slot]:
+            return None
+
+        self.predicted[slot] = True
+        return {
+            'pallet_id': pallet_id,
+            'eta_seconds': round(max(0.0, float(eta)), 1),
+            'rate_per_minute': round(slope * 60.0, 4),
+            'ewma': round(float(self.ewma[slot]), 2),
+            'degree_minutes': round(float(self.degree_minutes[slot]), 2)
+        }
+
+    def snapshot(self, pallet_id):
+        """Current statistics for a pallet, or None if it is not tracked"""
+        slot = self.slots.get(pallet_id)
+        if slot is None:
+            return None
+        return {
+            'readings': int(self.count[slot]),
+            'ewma': round(float(self.ewma[slot]), 2),
+            'rate_per_minute': round(self._slope(slot) * 60.0, 4),
+            'degree_minutes': round(float(self.degree_minutes[slot]), 2)
+        }
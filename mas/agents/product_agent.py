@@ -1,54 +1,135 @@
-import asyncio
+import os
+import sys
 import json
-import redis
+import asyncio
+import redis.asyncio as aioredis
 from spade.agent import Agent
-from spade.behaviour import CyclicBehaviour
+from spade.behaviour import CyclicBehaviour, PeriodicBehaviour
+from spade.message import Message
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(project_root)
+from messaging.codec import decode, to_epoch_ms, CodecError
+from messaging.transport import make_async_transport
+from mas.agents.alert_state import AlertStateMachine
+from mas.agents.breach_detector import ThresholdTable
+from mas.agents.pallet_analytics import PalletAnalytics
 
 class ProductAgent(Agent):
-    def __init__(self, jid: str, password: str, threshold: float = 8.0):
+    """
+    SPADE agent watching every pallet on 'sensor_data'.
+
+    Readings are read through redis.asyncio, so waiting for Redis never
+    blocks the event loop. Each reading updates that pallet's trend and
+    alert state; alert state changes are queued and sent to the logistics
+    agent as one XMPP message per `alert_interval`.
+    """
+
+    def __init__(self, jid: str, password: str, threshold: float = 8.0,
+                 logistics_jid: str = "logistics_agent@localhost", alert_interval: float = 1.0,
+                 batch_size: int = 500):
         super().__init__(jid, password)
         self.temperature_threshold = threshold
+        self.logistics_jid = logistics_jid
+        self.alert_interval = alert_interval
+        self.batch_size = batch_size
+
+        # Per-pallet state, shared by the behaviours
+        self.thresholds = ThresholdTable(default=threshold)
+        self.analytics = PalletAnalytics()
+        self.alert_states = AlertStateMachine()
+        self.pending_alerts = []
 
     class SensorBehaviour(CyclicBehaviour):
         def __init__(self, agent, threshold):
             super().__init__()
             self.agent = agent
             self.threshold = threshold
+            self.processed = 0
 
         async def on_start(self):
             # Connect to Redis
             print("Connecting to Redis...")
             try:
-                self.redis_client = redis.Redis(host='localhost', port=6379, db=0)
-                self.pubsub = self.redis_client.pubsub()
-                self.pubsub.subscribe('sensor_data')
+                self.redis_client = aioredis.Redis(host='localhost', port=6379, db=0)
+                self.transport = await make_async_transport(
+                    self.redis_client, ['sensor_data'], group='spade_product_agents'
+                )
                 print(f"Subscribed to 'sensor_data' channel. Listening for temperature above {self.threshold}°C")
             except Exception as e:
                 print(f"Redis connection error: {e}")
+                self.kill()
+
+        async def on_end(self):
+            # on_start may have failed before either was set; do not mask its error here
+            transport = getattr(self, 'transport', None)
+            redis_client = getattr(self, 'redis_client', None)
+            try:
+                if transport is not None:
+                    await transport.close()
+            finally:
+                if redis_client is not None:
+                    await redis_client.aclose()
+
+        def handle_reading(self, data):
+            """Update one pallet's trend and alert state, queueing any alerts"""
+            pallet_id = data['pallet_id']
+            temperature = float(data['temperature'])
+            status = data.get('status')
+            threshold = self.agent.thresholds.get(pallet_id)
+            timestamp = to_epoch_ms(data.get('timestamp')) / 1000.0
+            location = data.get('location', 'Unknown')
+
+            prediction = self.agent.analytics.update(pallet_id, temperature, timestamp, threshold, status)
+            if prediction:
+                self.agent.pending_alerts.append(dict(
+                    prediction, type='predicted_breach', temperature=temperature, location=location
+                ))
+
+            for alert_type, extra in self.agent.alert_states.observe(pallet_id, temperature, threshold,
+                                                                     timestamp, status):
+                if alert_type == 'temperature_breach':
+                    print(f"🚨 ALERT: Temperature breach detected! {pallet_id} {temperature}°C is above {threshold}°C")
+                self.agent.pending_alerts.append(dict(
+                    extra, type=alert_type, pallet_id=pallet_id, temperature=temperature, location=location
+                ))
 
         async def run(self):
             try:
-                message = self.pubsub.get_message(timeout=1.0)
-                if message and message['type'] == 'message':
+                messages = await self.transport.read(timeout=1.0, count=self.agent.batch_size)
+                for message in messages:
                     try:
-                        data = json.loads(message['data'])
-                        pallet_id = data['pallet_id']
-                        temperature = data['temperature']
-                        print(f"[{pallet_id}] Current Temp: {temperature}°C")
-
-                        if temperature > self.threshold:
-                            print(f"🚨 ALERT: Temperature breach detected! {temperature}°C is above {self.threshold}°C")
-                            
-                    except (json.JSONDecodeError, KeyError) as e:
+                        self.handle_reading(decode(message['data']))
+                    except (CodecError, KeyError, ValueError) as e:
                         print(f"Error processing message: {e}")
+                await self.transport.ack(messages)
+                self.processed += len(messages)
             except Exception as e:
                 print(f"Error in run loop: {e}")
-                
-            await asyncio.sleep(0.1)
+                await asyncio.sleep(1.0)
+
+            # Let other behaviours run between batches
+            await asyncio.sleep(0)
+
+    class AlertBehaviour(PeriodicBehaviour):
+        """Send all alerts queued since the last period as one XMPP message"""
+
+        async def run(self):
+            if not self.agent.pending_alerts:
+                return
+            alerts, self.agent.pending_alerts = self.agent.pending_alerts, []
+
+            msg = Message(to=self.agent.logistics_jid)
+            msg.set_metadata("performative", "inform")
+            msg.set_metadata("ontology", "temperature_alerts")
+            msg.body = json.dumps(alerts, default=str)
+            await self.send(msg)
+            print(f"Sent {len(alerts)} alerts to {self.agent.logistics_jid}")
 
     async def setup(self):
         sensor_behaviour = self.SensorBehaviour(self, self.temperature_threshold)
         self.add_behaviour(sensor_behaviour)
+        self.add_behaviour(self.AlertBehaviour(period=self.alert_interval))
 
 async def main():
     # Create agent with proper configuration to handle self-signed certs
@@ -0,0 +1,119 @@
+import time
+from collections import namedtuple
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # Optional: without it, batches are assigned greedily by distance
+    linear_sum_assignment = None
+
+from mas.agents.warehouse_index import EARTH_RADIUS_KM
+
+Assignment = namedtuple('Assignment', ['assigned', 'unassigned', 'solver', 'solve_ms'])
+
+
+def haversine_matrix_km(points, targets):
+    """Pairwise great-circle distances between (n, 2) and (m, 2) lat/lon arrays"""
+    lat1, lon1 = np.radians(points[:, :1]), np.radians(points[:, 1:])
+    lat2, lon2 = np.radians(targets[:, 0]), np.radians(targets[:, 1])
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+class RerouteAssigner:
+    """
+    Assigns a batch of pallets to warehouses at minimum total distance without exceeding capacity.
+
+    Candidates are the `candidates` nearest open warehouses of each pallet
+    (widened until they can hold the whole batch). With scipy installed the
+    batch is solved exactly with linear_sum_assignment, each warehouse
+    contributing one column per free slot; otherwise pairs are taken
+    greedily in order of distance. Assigned capacity is taken off the
+    warehouse index.
+    """
+
+    def __init__(self, index, candidates=8, solver=None):
+        """
+        Args:
+            index (WarehouseIndex): Warehouses with their availability and capacity
+            candidates (int): Nearest warehouses considered per pallet
+            solver (str): 'optimal' or 'greedy', defaults to 'optimal' when scipy is installed
+        """
+        self.index = index
+        self.candidates = candidates
+        self.solver = solver or ('optimal' if linear_sum_assignment is not None else 'greedy')
+        if self.solver == 'optimal' and linear_sum_assignment is None:
+            raise ImportError("scipy is required for the optimal solver")
+
+    def _candidate_warehouses(self, locations):
+        k = self.candidates
+        while True:
+            names = {}
+            for location in locations:
+                for name, _ in self.index.nearest(location, k=k):
+                    names[name] = self.index[name]['capacity']
+            if sum(names.values()) >= len(locations) or k >= len(self.index):
+                return list(names)
+            k *= 2
+
+    def _solve_optimal(self, distances, capacities):
+        n = distances.shape[0]
+        slots = np.minimum(capacities, n)
+        columns = np.repeat(np.arange(len(capacities)), slots)
+        rows, cols = linear_sum_assignment(distances[:, columns])
+        return rows, columns[cols]
+
+    def _solve_greedy(self, distances, capacities):
+        n, m = distances.shape
+        remaining = capacities.copy()
+        done = np.zeros(n, dtype=bool)
+        rows, warehouses = [], []
+        for flat in np.argsort(distances, axis=None).tolist():
+            row, col = divmod(flat, m)
+            if done[row] or remaining[col] <= 0:
+                continue
+            done[row] = True
+            remaining[col] -= 1
+            rows.append(row)
+            warehouses.append(col)
+            if len(rows) == n:
+                break
+        return np.asarray(rows, dtype=np.int64), np.asarray(warehouses, dtype=np.int64)
+
+    def assign(self, pallets):
+        """
+        Args:
+            pallets (list): (pallet_id, [lat, lon]) pairs
+
+        Returns:
+            Assignment: assigned maps pallet_id to (warehouse, distance_km);
+                unassigned lists pallets no warehouse could take
+        """
+        started = time.perf_counter()
+        if not pallets:
+            return Assignment({}, [], self.solver, 0.0)
+
+        locations = np.asarray([location for _, location in pallets], dtype=np.float64)
+        names = self._candidate_warehouses(locations.tolist())
+        if not names:
+            return Assignment({}, [pallet_id for pallet_id, _ in pallets], self.solver,
+                              (time.perf_counter() - started) * 1000)
+
+        targets = np.asarray([self.index[name]['location'] for name in names], dtype=np.float64)
+        capacities = np.asarray([self.index[name]['capacity'] for name in names], dtype=np.int64)
+        distances = haversine_matrix_km(locations, targets)
+
+        if self.solver == 'optimal':
+            rows, cols = self._solve_optimal(distances, capacities)
+        else:
+            rows, cols = self._solve_greedy(distances, capacities)
+
+        assigned = {}
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            assigned[pallets[row][0]] = (names[col], float(distances[row, col]))
+        for col, taken in zip(*np.unique(cols, return_counts=True)):
+            name = names[col]
+            self.index.update(name, capacity=self.index[name]['capacity'] - int(taken))
+
+        unassigned = [pallet_id for pallet_id, _ in pallets if pallet_id not in assigned]
+        return Assignment(assigned, unassigned, self.solver, (time.perf_counter() - started) * 1000)
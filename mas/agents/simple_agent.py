@@ -4,20 +4,53 @@ import json
 import redis
 import time
 import logging
+import argparse
+import numpy as np
 from datetime import datetime
 
 
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 appended_path = sys.path.append(project_root)
-from config.logging_config import LogConfigure
+from config.logging_config import LogConfigure, SAMPLED
 from blockchain.state_tracker import PalletStateTracker
+from messaging.codec import encode, decode, now_ms, to_epoch_ms, CodecError
+from messaging.metrics import LatencyRecorder, ThroughputMeter
+from messaging.transport import make_transport
+from messaging.backpressure import BufferedTransport, SHED_POLICIES
+from mas.agents.breach_detector import ThresholdTable, BatchBreachDetector
+from mas.agents.pallet_analytics import PalletAnalytics
+from mas.agents.alert_state import AlertStateMachine
+from mas.agents.warehouse_index import WarehouseIndex
+
+REROUTE_WAREHOUSES = WarehouseIndex.from_dict({
+    "warehouse_1": {"location": [52.3676, 4.9041]},  # Amsterdam
+    "warehouse_2": {"location": [52.5200, 13.4050]},  # Berlin
+})
 
 
 class SimpleProductAgent:
-    def __init__(self, threshold=8.0, log_file='../../logs/supply_chain.log'):
+    def __init__(self, threshold=8.0, log_file='../../logs/supply_chain.log', transport=None, thresholds_file=None,
+                 alert_hold_off=0.0, renotify_interval=300.0, echo_readings=True, buffer_size=10_000,
+                 shed_policy='drop_oldest', pallet_idle_timeout=3600.0):
         self.threshold = threshold
+        self.echo_readings = echo_readings  # print every reading to stdout
+        # Per-pallet thresholds; pallets missing from the table use `threshold`
+        if thresholds_file:
+            self.thresholds = ThresholdTable.from_csv(thresholds_file, default=threshold)
+        else:
+            self.thresholds = ThresholdTable(default=threshold)
+        self.detector = BatchBreachDetector(self.thresholds)
+        # Trend per pallet, used to warn before the threshold is crossed
+        self.analytics = PalletAnalytics()
+        self.pallet_idle_timeout = pallet_idle_timeout  # seconds without readings before a pallet is forgotten
+        # Only alert state changes go downstream; repeated breach readings are suppressed
+        self.alert_states = AlertStateMachine(hold_off=alert_hold_off, renotify_interval=renotify_interval)
         self.redis_client = None
-        self.pubsub = None
+        self.transport_kind = transport  # 'pubsub' or 'streams', defaults to MESSAGE_TRANSPORT
+        self.transport = None
+        # Readings are drained into a bounded buffer; 0 reads straight from the transport
+        self.buffer_size = buffer_size
+        self.shed_policy = shed_policy
 
         self.logger = logging.getLogger('SupplyChainAgent')
         if not self.logger.handlers:
@@ -25,13 +58,25 @@ class SimpleProductAgent:
 
         self.state_tracker = PalletStateTracker()
 
-    def connect_to_redis(self):
-        """Connect to Redis server"""
+        self.processing_latency = LatencyRecorder()
+        self.delivery_latency = LatencyRecorder()
+        self.throughput = ThroughputMeter()
+        self.stats_interval = 10.0
+        self._next_stats = time.monotonic() + self.stats_interval
+
+    def connect_to_redis(self, subscribe=True):
+        """Connect to Redis server; with subscribe=False the agent only publishes alerts"""
         try:
             self.redis_client = redis.Redis(host='localhost', port=6379, db=0)
-            self.pubsub = self.redis_client.pubsub()
-            self.pubsub.subscribe('sensor_data')
-            self.logger.info("Connected to Redis and subscribed to 'sensor_data' channel")  # <-- Log
+            self.transport = make_transport(
+                self.redis_client, ['sensor_data'] if subscribe else [],
+                kind=self.transport_kind, group='simple_product_agents'
+            )
+            if subscribe and self.buffer_size:
+                self.transport = BufferedTransport(
+                    self.transport, self.buffer_size, self.shed_policy, classify=self.classify_reading
+                )
+            self.logger.info(f"Connected to Redis and subscribed to 'sensor_data' via {self.transport.kind}")  # <-- Log
             return True
         except redis.ConnectionError:
             self.logger.error("Could not connect to Redis")  # <-- Log error
@@ -60,19 +105,13 @@ class SimpleProductAgent:
 
     def initiate_reroute(self, pallet_id, current_location):
         """Simulate finding the nearest warehouse"""
-        # This is a simple simulation - in real life, you'd use GPS coordinates
-        warehouses = {
-            "warehouse_1": [52.3676, 4.9041],  # Amsterdam
-            "warehouse_2": [52.5200, 13.4050],  # Berlin
-        }
-
-        # Find closest warehouse (simple distance calculation)
-        closest_warehouse = min(warehouses, key=lambda wh: 
-            abs(warehouses[wh][0] - current_location[0]) + 
-            abs(warehouses[wh][1] - current_location[1])
-        )
+        # Closest by great-circle distance, same index as the LogisticsAgent
+        nearest = REROUTE_WAREHOUSES.nearest(current_location, k=1, min_capacity=0)
+        if not nearest:
+            return
+        closest_warehouse, distance = nearest[0]
 
-        print(f"📦 Rerouting {pallet_id} to {closest_warehouse}")
+        print(f"📦 Rerouting {pallet_id} to {closest_warehouse} ({distance:.0f} km)")
         # TODO: Actually communicate this to the logistics system
 
     def notify_logistics(self, pallet_id, temperature, location):
@@ -89,6 +128,9 @@ class SimpleProductAgent:
             'location': data.get('location', 'Unknown'),
             'timestamp': datetime.now().isoformat()
         }
+        # Alert-specific extras, e.g. the ETA of a predicted breach
+        for key in data.keys() - alert_data.keys():
+            alert_data[key] = data[key]
 
         try:
             self.state_tracker.update_pallet(
@@ -97,60 +139,250 @@ class SimpleProductAgent:
                 temperature=data.get('temperature'),
                 location=json.dumps(data.get('location', {}))
             )
-            self.redis_client.publish('alerts', json.dumps(alert_data))
+            self.transport.publish('alerts', encode(alert_data))
             self.logger.info(f"Sent {alert_type} alert for {data['pallet_id']}")
         except Exception as e:
             self.logger.error(f"Failed to send alert: {e}")
 
-    def run(self):
-        """Main loop to process messages"""
+    def track_reading(self, data, temperature, threshold, timestamp):
+        """Update the pallet's trend and send a predicted_breach alert when it will cross the threshold soon"""
+        pallet_id = data['pallet_id']
+        prediction = self.analytics.update(pallet_id, temperature, timestamp, threshold, data.get('status'))
+        if prediction:
+            self.logger.warning(
+                f"Predicted breach: {pallet_id} reaches {threshold}°C in {prediction['eta_seconds']}s "
+                f"({prediction['rate_per_minute']}°C/min)"
+            )
+            self.send_alert('predicted_breach', dict(
+                prediction, temperature=temperature, threshold=threshold,
+                location=data.get('location', 'Unknown')
+            ))
+
+    def raise_alerts(self, data, temperature, threshold, timestamp):
+        """Run a reading through the pallet's alert state machine and send only the transitions"""
+        pallet_id = data['pallet_id']
+        transitions = self.alert_states.observe(pallet_id, temperature, threshold, timestamp, data.get('status'))
+        if not transitions and temperature > threshold:
+            self.logger.debug(f"Suppressed repeat breach for {pallet_id}: {self.alert_states.state_of(pallet_id)}")
+
+        for alert_type, extra in transitions:
+            if alert_type == 'spoilage':
+                self.logger.critical(f"GOODS SPOILED: {pallet_id}")
+                print("❌ GOODS HAVE SPOILED! Taking action...")
+            elif alert_type == 'temperature_escalated':
+                self.logger.critical(f"EMERGENCY: {pallet_id} escalated at {temperature}°C")
+                print(f"🆘 EMERGENCY: {pallet_id} breach escalated!")
+            elif alert_type == 'breach_resolved':
+                self.logger.info(f"Breach resolved: {pallet_id} back to {temperature}°C")
+            else:
+                self.logger.warning(f"Temperature breach: {pallet_id} {temperature}°C > threshold {threshold}°C")
+                print(f"🚨 ALERT: Temperature breach! {temperature}°C > {threshold}°C")
+            # Send alert to LogisticsAgent
+            self.send_alert(alert_type, dict(
+                extra, pallet_id=pallet_id, temperature=temperature, threshold=threshold,
+                location=data.get('location', 'Unknown')
+            ))
+
+    def classify_reading(self, message):
+        """
+        Buffer classification: (pallet_id, critical). Readings above threshold or
+        SPOILED are critical and never shed. Runs on the buffer's reader thread.
+        """
+        try:
+            # Kept on the message so processing does not decode it again
+            data = message['decoded'] = decode(message['data'])
+            if not isinstance(data, dict):
+                return None, True  # Left for processing to report
+            pallet_id = data.get('pallet_id')
+            critical = (data.get('status') == 'SPOILED'
+                        or float(data.get('temperature', 0)) > self.thresholds.get(pallet_id))
+            return pallet_id, critical
+        except (CodecError, TypeError, ValueError):
+            # Left for processing to report
+            return None, False
+
+    @staticmethod
+    def _invalid(data):
+        """Why a decoded reading cannot be evaluated, or None if it can"""
+        if not isinstance(data, dict):
+            return f"reading is a {type(data).__name__}, not an object"
+        if 'pallet_id' not in data:
+            return "reading has no pallet_id"
+        try:
+            float(data.get('temperature', 0))
+            to_epoch_ms(data.get('timestamp'))
+        except (CodecError, TypeError, ValueError) as e:
+            return f"bad temperature or timestamp in reading of {data['pallet_id']}: {e}"
+        return None
+
+    def process_reading(self, data):
+        """Check one decoded sensor reading and raise alerts"""
+        pallet_id = data['pallet_id']
+        temperature = float(data.get('temperature', 0))
+        status = data.get('status', 'UNKNOWN')
+        threshold = self.thresholds.get(pallet_id)
+        timestamp = to_epoch_ms(data.get('timestamp')) / 1000.0
+
+        # Log the regular temperature reading (sampled in queue logging mode)
+        self.logger.info(f"[{pallet_id}] Temp: {temperature}°C, Status: {status}", extra=SAMPLED)
+        if self.echo_readings:
+            print(f"[{pallet_id}] Temp: {temperature}°C, Status: {status}")
+
+        self.track_reading(data, temperature, threshold, timestamp)
+        self.raise_alerts(data, temperature, threshold, timestamp)
+
+    def process_message(self, message):
+        """Decode and process one pub/sub message, recording its latency"""
+        if not message or message['type'] != 'message':
+            return
+        started = time.perf_counter()
+        try:
+            data = message['decoded'] if 'decoded' in message else decode(message['data'])
+            invalid = self._invalid(data)
+            if invalid:
+                raise CodecError(invalid)
+            self.process_reading(data)
+        except (CodecError, KeyError, TypeError, ValueError) as e:
+            # One bad reading must not end the drain loop, as in process_batch
+            self.logger.error(f"Error processing message: {e}")  # <-- Log error
+            print(f"Error processing message: {e}")
+            return
+
+        self.processing_latency.record(time.perf_counter() - started)
+        self.throughput.add()
+        # Binary readings carry epoch-millisecond timestamps: measure publish-to-processed age
+        timestamp = data.get('timestamp')
+        if isinstance(timestamp, int):
+            self.delivery_latency.record(max(0, now_ms() - timestamp) / 1000.0)
+
+    def process_batch(self, messages):
+        """Decode a micro-batch and evaluate every reading in one vectorized pass"""
+        started = time.perf_counter()
+        readings = []
+        for message in messages:
+            try:
+                reading = message['decoded'] if 'decoded' in message else decode(message['data'])
+            except CodecError as e:
+                self.logger.error(f"Error processing message: {e}")
+                continue
+            # Dropped one by one so a bad reading cannot fail the vectorized pass for the batch
+            invalid = self._invalid(reading)
+            if invalid:
+                self.logger.error(f"Error processing message: {invalid}")
+                continue
+            readings.append(reading)
+        if not readings:
+            return
+
+        result = self.detector.evaluate(readings)
+        temperatures = result.temperatures.tolist()
+        thresholds = result.thresholds.tolist()
+        reading_times = [to_epoch_ms(r.get('timestamp')) / 1000.0 for r in readings]
+        for i, reading in enumerate(readings):
+            self.track_reading(reading, temperatures[i], thresholds[i], reading_times[i])
+
+        # Only pallets breached or spoiled in this batch, or with an open incident, can change alert state
+        flagged = {readings[i]['pallet_id'] for i in np.flatnonzero(result.breach | result.spoiled).tolist()}
+        for i, reading in enumerate(readings):
+            if reading['pallet_id'] in flagged or reading['pallet_id'] in self.alert_states:
+                self.raise_alerts(reading, temperatures[i], thresholds[i], reading_times[i])
+
+        self.logger.debug(
+            f"Batch of {len(readings)} readings: {int(result.breach.sum())} breaches, "
+            f"{int(result.spoiled.sum())} spoiled"
+        )
+        # In batch mode processing latency is the time to evaluate the whole batch
+        self.processing_latency.record(time.perf_counter() - started)
+        self.throughput.add(len(readings))
+        timestamps = [r['timestamp'] for r in readings if isinstance(r.get('timestamp'), int)]
+        if timestamps:
+            ages = (now_ms() - np.asarray(timestamps, dtype=np.int64)).clip(min=0) / 1000.0
+            self.delivery_latency.record_many(ages)
+
+    def stats(self):
+        """Throughput and per-message latency percentiles (ms)"""
+        return {
+            'processed': self.throughput.count,
+            'tracked_pallets': len(self.analytics),
+            'alerts': self.alert_states.stats(),
+            'rate': round(self.throughput.window_rate(), 1),
+            'processing_latency_ms': self.processing_latency.percentiles(),
+            'delivery_latency_ms': self.delivery_latency.percentiles(),
+            'buffer': self.transport.stats() if isinstance(self.transport, BufferedTransport) else None
+        }
+
+    def _report_stats(self):
+        now = time.monotonic()
+        if now >= self._next_stats:
+            self.analytics.evict_idle(self.pallet_idle_timeout)
+            self.logger.info(f"Agent stats: {json.dumps(self.stats())}")
+            self._next_stats = now + self.stats_interval
+
+    def _run_blocking(self):
+        """Wait for the next message, then drain everything pending before waiting again"""
+        while True:
+            messages = self.transport.read(timeout=1.0)
+            for message in messages:
+                self.process_message(message)
+            self.transport.ack(messages)
+            self._report_stats()
+
+    def _collect_batch(self, max_batch, max_wait):
+        """Wait for a first message, then keep reading until `max_batch` messages or `max_wait` seconds"""
+        messages = self.transport.read(timeout=1.0, count=max_batch)
+        if not messages:
+            return messages
+        deadline = time.monotonic() + max_wait
+        while len(messages) < max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            messages.extend(self.transport.read(timeout=remaining, count=max_batch - len(messages)))
+        return messages
+
+    def _run_batched(self, max_batch, max_wait):
+        """Micro-batch loop: evaluate up to `max_batch` readings at a time"""
+        while True:
+            messages = self._collect_batch(max_batch, max_wait)
+            if messages:
+                self.process_batch(messages)
+                self.transport.ack(messages)
+            self._report_stats()
+
+    def _run_polling(self):
+        """Original loop: one message per poll followed by a fixed sleep"""
+        while True:
+            # Check for new messages
+            messages = self.transport.read(timeout=1.0, count=1)
+            for message in messages:
+                self.process_message(message)
+            self.transport.ack(messages)
+            self._report_stats()
+            time.sleep(0.1)
+
+    def run(self, mode='blocking', batch_size=500, batch_wait_ms=50):
+        """
+        Main loop to process messages.
+
+        Args:
+            mode (str): 'blocking' drains all pending messages per wakeup with no
+                added delay; 'batch' evaluates micro-batches of up to `batch_size`
+                readings collected within `batch_wait_ms`; 'poll' keeps the
+                original poll-and-sleep loop
+        """
         if not self.connect_to_redis():
             return
 
-        self.logger.info(f"Listening for temperature above {self.threshold}°C")  # <-- Log
+        self.logger.info(f"Listening for temperature above {self.threshold}°C ({mode} mode)")  # <-- Log
         print("Press Ctrl+C to stop...")
 
         try:
-            while True:
-                # Check for new messages
-                message = self.pubsub.get_message(timeout=1.0)
-                if message and message['type'] == 'message':
-                    try:
-                        data = json.loads(message['data'])
-                        pallet_id = data['pallet_id']
-                        temperature = float(data.get('temperature', 0))
-                        status = data.get('status', 'UNKNOWN')
-
-                        # Log the regular temperature reading
-                        self.logger.info(f"[{pallet_id}] Temp: {temperature}°C, Status: {status}")
-                        print(f"[{pallet_id}] Temp: {temperature}°C, Status: {status}")
-
-                        # Check for temperature breach
-                        if temperature > self.threshold:
-                            self.logger.warning(f"Temperature breach: {temperature}°C > threshold {self.threshold}°C")
-                            print(f"🚨 ALERT: Temperature breach! {temperature}°C > {self.threshold}°C")
-                            # Send alert to LogisticsAgent
-                            self.send_alert('temperature_breach', {
-                                'pallet_id': pallet_id,
-                                'temperature': temperature,
-                                'location': data.get('location', 'Unknown')
-                            })
-
-                        # Check if goods are spoiled
-                        if status == "SPOILED":
-                            self.logger.critical(f"GOODS SPOILED: {pallet_id}")
-                            print("❌ GOODS HAVE SPOILED! Taking action...")
-                            # Send alert to LogisticsAgent
-                            self.send_alert('spoilage', {
-                                'pallet_id': pallet_id,
-                                'location': data.get('location', 'Unknown')
-                            })
-
-                    except (json.JSONDecodeError, KeyError) as e:
-                        self.logger.error(f"Error processing message: {e}")  # <-- Log error
-                        print(f"Error processing message: {e}")
-
-                time.sleep(0.1)
+            if mode == 'poll':
+                self._run_polling()
+            elif mode == 'batch':
+                self._run_batched(batch_size, batch_wait_ms / 1000.0)
+            else:
+                self._run_blocking()
 
         except KeyboardInterrupt:
             self.logger.info("Agent stopped by user")  # <-- Log
@@ -159,11 +391,29 @@ class SimpleProductAgent:
             self.logger.error(f"Unexpected error: {e}")  # <-- Log unexpected errors
             print(f"Unexpected error: {e}")
         finally:
-            if self.pubsub:
-                self.pubsub.close()
-            self.logger.info("Agent shutdown complete")  # <-- Log
+            if self.transport:
+                self.transport.close()
+            self.logger.info(f"Agent shutdown complete: {json.dumps(self.stats())}")  # <-- Log
 
 
 if __name__ == "__main__":
-    agent = SimpleProductAgent(threshold=8.0)
-    agent.run()
+    parser = argparse.ArgumentParser(description="Temperature monitoring product agent")
+    parser.add_argument('--threshold', type=float, default=8.0)
+    parser.add_argument('--thresholds-file', help="CSV of per-pallet thresholds (pallet_id,threshold)")
+    parser.add_argument('--mode', choices=['blocking', 'batch', 'poll'], default='blocking')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--batch-wait-ms', type=float, default=50)
+    parser.add_argument('--hold-off', type=float, default=0.0, help="Seconds a breach must last before alerting")
+    parser.add_argument('--renotify-interval', type=float, default=300.0,
+                        help="Seconds between repeats of an open breach alert")
+    parser.add_argument('--quiet', action='store_true', help="Do not print every reading to stdout")
+    parser.add_argument('--buffer-size', type=int, default=10_000,
+                        help="Readings buffered in process before shedding; 0 disables the buffer")
+    parser.add_argument('--shed-policy', choices=SHED_POLICIES, default='drop_oldest')
+    args = parser.parse_args()
+
+    agent = SimpleProductAgent(threshold=args.threshold, thresholds_file=args.thresholds_file,
+                               alert_hold_off=args.hold_off, renotify_interval=args.renotify_interval,
+                               echo_readings=not args.quiet, buffer_size=args.buffer_size,
+                               shed_policy=args.shed_policy)
+    agent.run(mode=args.mode, batch_size=args.batch_size, batch_wait_ms=args.batch_wait_ms)
@@ -0,0 +1,178 @@
+import heapq
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(loc1, loc2):
+    """
+    Great-circle distance between two coordinates.
+
+    Args:
+        loc1 (list): [lat1, lon1] in degrees
+        loc2 (list): [lat2, lon2] in degrees
+
+    Returns:
+        float: Distance in kilometres
+    """
+    lat1, lon1 = math.radians(loc1[0]), math.radians(loc1[1])
+    lat2, lon2 = math.radians(loc2[0]), math.radians(loc2[1])
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+class WarehouseIndex:
+    """
+    Grid index of warehouses for k-nearest queries on haversine distance.
+
+    Warehouses are bucketed into `cell_deg` x `cell_deg` lat/lon cells. A
+    query scans rings of cells around the query point and stops as soon as
+    the k-th best distance is below the smallest great-circle distance any
+    unscanned cell could have, so only nearby cells are touched.
+
+    Availability and capacity are read from each warehouse record at query
+    time, so updating them is O(1); moving a warehouse re-buckets only that
+    warehouse.
+    """
+
+    def __init__(self, cell_deg=1.0):
+        self.cell_deg = cell_deg
+        self.lon_cells = int(round(360 / cell_deg))
+        self.lat_cells = int(round(180 / cell_deg))
+        self.warehouses = {}  # name -> {'location', 'capacity', 'available'}
+        self.cells = {}  # (lat cell, lon cell) -> set of names
+        self._cell_of = {}
+        self._extent = None  # occupied cell bounds, recomputed lazily
+
+    @classmethod
+    def from_dict(cls, warehouses, cell_deg=1.0):
+        """Build an index from a {name: {'location', 'capacity', 'available'}} mapping"""
+        index = cls(cell_deg)
+        for name, data in warehouses.items():
+            index.add(name, data['location'], data.get('capacity', 0), data.get('available', True))
+        return index
+
+    def __len__(self):
+        return len(self.warehouses)
+
+    def __contains__(self, name):
+        return name in self.warehouses
+
+    def __getitem__(self, name):
+        return self.warehouses[name]
+
+    # ---------------------------
+    # Updates
+    # ---------------------------
+    def _cell(self, lat, lon):
+        i = min(int(math.floor((lat + 90) / self.cell_deg)), self.lat_cells - 1)
+        j = int(math.floor((lon + 180) / self.cell_deg)) % self.lon_cells
+        return i, j
+
+    def add(self, name, location, capacity=0, available=True):
+        """Insert a warehouse, or replace an existing one with the same name"""
+        location = [float(location[0]), float(location[1])]
+        self.remove(name)
+        self.warehouses[name] = {'location': location, 'capacity': capacity, 'available': available}
+        cell = self._cell(*location)
+        self.cells.setdefault(cell, set()).add(name)
+        self._cell_of[name] = cell
+        self._extent = None
+
+    def remove(self, name):
+        if name not in self.warehouses:
+            return
+        del self.warehouses[name]
+        cell = self._cell_of.pop(name)
+        names = self.cells[cell]
+        names.discard(name)
+        if not names:
+            del self.cells[cell]
+        self._extent = None
+
+    def update(self, name, **fields):
+        """Change availability, capacity or location of a warehouse"""
+        data = self.warehouses[name]
+        if 'location' in fields and list(fields['location']) != data['location']:
+            self.add(name, fields['location'], fields.get('capacity', data['capacity']),
+                     fields.get('available', data['available']))
+            return
+        data.update(fields)
+
+    # ---------------------------
+    # Queries
+    # ---------------------------
+    def _occupied_extent(self):
+        if self._extent is None and self.cells:
+            rows = [i for i, _ in self.cells]
+            cols = [j for _, j in self.cells]
+            self._extent = (min(rows), max(rows), min(cols), max(cols))
+        return self._extent
+
+    def _lower_bound(self, lat, qi, ring):
+        """Smallest distance from the query to any cell outside `ring` rings around it"""
+        gap = math.radians(ring * self.cell_deg)
+        lat_bound = EARTH_RADIUS_KM * gap
+        # Outside in longitude but inside the scanned rows: the widest row gives the shortest distance
+        top = max(abs((qi - ring) * self.cell_deg - 90), abs((qi + ring + 1) * self.cell_deg - 90))
+        cos_top = math.cos(math.radians(min(90.0, top)))
+        h = math.cos(math.radians(lat)) * cos_top * math.sin(min(gap, math.pi) / 2) ** 2
+        lon_bound = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(max(0.0, h))))
+        return min(lat_bound, lon_bound)
+
+    def _ring(self, qi, qj, ring):
+        if ring == 0:
+            yield qi, qj
+            return
+        for i in range(qi - ring, qi + ring + 1):
+            if 0 <= i < self.lat_cells:
+                step = 1 if i in (qi - ring, qi + ring) else 2 * ring
+                for j in range(qj - ring, qj + ring + 1, step):
+                    yield i, j % self.lon_cells
+
+    def nearest(self, location, k=1, min_capacity=1, available_only=True):
+        """
+        Find the k nearest warehouses that can take a pallet.
+
+        Args:
+            location (list): [latitude, longitude] of the query point
+            k (int): Number of warehouses to return
+            min_capacity (int): Minimum remaining capacity
+            available_only (bool): Skip warehouses marked unavailable
+
+        Returns:
+            list: (name, distance_km) pairs, nearest first
+        """
+        if not self.cells or k <= 0:
+            return []
+        lat, lon = float(location[0]), float(location[1])
+        qi, qj = self._cell(lat, lon)
+        min_i, max_i, min_j, max_j = self._occupied_extent()
+
+        best = []  # max-heap of (-distance, name), at most k entries
+        seen = set()
+        ring = 0
+        while True:
+            for cell in self._ring(qi, qj, ring):
+                if cell in seen:
+                    continue
+                seen.add(cell)
+                for name in self.cells.get(cell, ()):
+                    data = self.warehouses[name]
+                    if (available_only and not data['available']) or data['capacity'] < min_capacity:
+                        continue
+                    distance = haversine_km((lat, lon), data['location'])
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, name))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, name))
+
+            if len(best) == k and -best[0][0] <= self._lower_bound(lat, qi, ring):
+                break
+            covers_rows = qi - ring <= min_i and qi + ring >= max_i
+            covers_cols = 2 * ring + 1 >= self.lon_cells or (qj - ring <= min_j and qj + ring >= max_j)
+            if covers_rows and covers_cols:
+                break
+            ring += 1
+
+        return [(name, -negative) for negative, name in sorted(best, reverse=True)]
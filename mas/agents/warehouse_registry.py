@@ -0,0 +1,259 @@
+import csv
+import time
+import logging
+import redis
+
+from messaging.codec import encode, decode, CodecError
+from mas.agents.warehouse_index import WarehouseIndex
+
+KEY_PREFIX = "warehouse:"
+NAMES_KEY = "warehouses"
+VERSION_KEY = "warehouses:version"
+# Plain pub/sub on purpose: every agent instance must see every invalidation
+UPDATES_CHANNEL = "warehouse_updates"
+
+
+class UnknownWarehouseError(KeyError):
+    """Raised when writing to a warehouse that is not registered"""
+
+
+def _to_record(fields):
+    """Redis hash fields -> index record, None if the hash is incomplete or malformed"""
+    fields = {k.decode(): v.decode() for k, v in fields.items()}
+    try:
+        return {
+            'location': [float(fields['lat']), float(fields['lon'])],
+            'capacity': int(fields.get('capacity', 0)),
+            'available': fields.get('available', '1') == '1'
+        }
+    except (KeyError, ValueError):
+        return None
+
+
+def _to_fields(location, capacity, available):
+    return {'lat': float(location[0]), 'lon': float(location[1]), 'capacity': int(capacity),
+            'available': 1 if available else 0}
+
+
+class WarehouseRegistry:
+    """
+    Warehouses stored in Redis hashes, cached locally in a WarehouseIndex.
+
+    Each warehouse is a `warehouse:<name>` hash; every write bumps
+    `warehouses:version` and announces the new version and the changed
+    names on the `warehouse_updates` channel. refresh() applies pending
+    announcements to the local cache without blocking: the next version
+    reloads only the named warehouses, a gap in versions reloads
+    everything. Lookups go to the local index and never touch Redis.
+    """
+
+    def __init__(self, redis_client=None, index=None, check_interval=30.0):
+        """
+        Args:
+            redis_client (redis.Redis): Client for the registry, defaults to db=1 like PalletStateTracker
+            index (WarehouseIndex): Local cache to keep in sync, a new one if not given
+            check_interval (float): Seconds between version checks that catch lost announcements
+        """
+        self.redis_client = redis_client or redis.Redis(host='localhost', port=6379, db=1)
+        self.index = index if index is not None else WarehouseIndex()
+        self.version = 0
+        self.check_interval = check_interval
+        self._next_check = 0.0
+        self.reloads = 0
+        self.logger = logging.getLogger('LogisticsAgent')
+        self.pubsub = None  # subscribed on the first load(); writers never need it
+
+    def __len__(self):
+        return len(self.index)
+
+    # ---------------------------
+    # Local cache
+    # ---------------------------
+    def load(self):
+        """Replace the local cache with the registry contents"""
+        if self.pubsub is None:
+            # Subscribe before reading so no announcement falls in between
+            self.pubsub = self.redis_client.pubsub()
+            self.pubsub.subscribe(UPDATES_CHANNEL)
+        # Version first: the data read afterwards is at least this new
+        version = int(self.redis_client.get(VERSION_KEY) or 0)
+        names = sorted(name.decode() for name in self.redis_client.smembers(NAMES_KEY))
+        records = self._fetch(names)
+
+        for name in [name for name in self.index.warehouses if name not in records]:
+            self.index.remove(name)
+        for name, record in records.items():
+            self.index.add(name, record['location'], record['capacity'], record['available'])
+        self.version = version
+        self.reloads += 1
+        self.logger.info(f"Loaded {len(records)} warehouses from registry (version {version})")
+
+    def _fetch(self, names):
+        """Records of the named warehouses; missing and incomplete ones are left out"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        for name in names:
+            pipe.hgetall(KEY_PREFIX + name)
+        records = {}
+        for name, fields in zip(names, pipe.execute()):
+            if not fields:
+                continue
+            record = _to_record(fields)
+            if record is None:
+                self.logger.warning(f"Skipping incomplete registry entry for warehouse {name}: {fields}")
+                continue
+            records[name] = record
+        return records
+
+    def _apply(self, names):
+        records = self._fetch(names)
+        for name in names:
+            if name in records:
+                record = records[name]
+                self.index.add(name, record['location'], record['capacity'], record['available'])
+            else:
+                self.index.remove(name)
+
+    def refresh_due(self):
+        """True if an announcement is waiting on the socket or a version check is due; reads nothing from Redis"""
+        if self.pubsub is None or self.pubsub.connection is None:
+            return False
+        return time.monotonic() >= self._next_check or self.pubsub.connection.can_read(timeout=0)
+
+    def refresh(self):
+        """Apply pending update announcements, and compare versions every `check_interval` seconds"""
+        if self.pubsub is None:
+            return
+        message = self.pubsub.get_message(timeout=0)
+        while message:
+            if message['type'] == 'message':
+                try:
+                    update = decode(message['data'])
+                except CodecError as e:
+                    self.logger.error(f"Bad warehouse update: {e}")
+                    update = {'version': self.version + 2}  # treat as a gap
+                version = update.get('version', 0)
+                if version == self.version + 1 and update.get('names') is not None:
+                    self._apply(update['names'])
+                    self.version = version
+                elif version > self.version:
+                    self.load()
+            message = self.pubsub.get_message(timeout=0)
+
+        # Pub/sub can drop announcements (e.g. during a reconnect); compare versions now and then
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            if int(self.redis_client.get(VERSION_KEY) or 0) != self.version:
+                self.load()
+
+    # ---------------------------
+    # Writes
+    # ---------------------------
+    def _commit(self, pipe, names):
+        """Bump the version with the queued writes and announce them"""
+        pipe.incr(VERSION_KEY)
+        version = pipe.execute()[-1]
+        self.redis_client.publish(UPDATES_CHANNEL, encode({'version': version, 'names': names}))
+        return version
+
+    def upsert(self, name, location, capacity=0, available=True):
+        pipe = self.redis_client.pipeline()
+        pipe.hset(KEY_PREFIX + name, mapping=_to_fields(location, capacity, available))
+        pipe.sadd(NAMES_KEY, name)
+        return self._commit(pipe, [name])
+
+    def remove(self, name):
+        pipe = self.redis_client.pipeline()
+        pipe.delete(KEY_PREFIX + name)
+        pipe.srem(NAMES_KEY, name)
+        return self._commit(pipe, [name])
+
+    def _update(self, names, write, skip_unknown=False):
+        """
+        Queue `write(pipe, name)` for each registered warehouse and commit them with the
+        version bump. NAMES_KEY is watched, so a concurrent remove() retries the check;
+        writing to an unregistered name would leave a hash without a location.
+
+        Returns:
+            int: The new version, or the current one if nothing was written
+        """
+        written = []
+
+        def transaction(pipe):
+            registered = [name for name in names if pipe.sismember(NAMES_KEY, name)]
+            unknown = [name for name in names if name not in registered]
+            if unknown and not skip_unknown:
+                raise UnknownWarehouseError(f"Not registered: {', '.join(unknown)}")
+            if unknown:
+                self.logger.warning(f"Ignoring writes to unregistered warehouses: {', '.join(unknown)}")
+            written[:] = registered
+            pipe.multi()
+            for name in registered:
+                write(pipe, name)
+            if registered:
+                pipe.incr(VERSION_KEY)
+
+        results = self.redis_client.transaction(transaction, NAMES_KEY)
+        if not written:
+            return self.version
+        version = results[-1]
+        self.redis_client.publish(UPDATES_CHANNEL, encode({'version': version, 'names': written}))
+        return version
+
+    def set_available(self, name, available):
+        """Raises UnknownWarehouseError if `name` is not registered"""
+        return self._update([name], lambda pipe, n: pipe.hset(KEY_PREFIX + n, 'available', 1 if available else 0))
+
+    def set_capacity(self, name, capacity):
+        """Raises UnknownWarehouseError if `name` is not registered"""
+        return self._update([name], lambda pipe, n: pipe.hset(KEY_PREFIX + n, 'capacity', int(capacity)))
+
+    def adjust_capacities(self, deltas):
+        """Atomically add `delta` to each registered warehouse's capacity, e.g. -1 per reserved slot"""
+        if not deltas:
+            return self.version
+        return self._update(list(deltas), lambda pipe, n: pipe.hincrby(KEY_PREFIX + n, 'capacity', int(deltas[n])),
+                            skip_unknown=True)
+
+    def import_rows(self, rows, chunk_size=1000):
+        """
+        Bulk upsert warehouses with one version bump and one announcement.
+
+        Args:
+            rows (iterable): (name, location, capacity, available) tuples
+
+        Returns:
+            int: Number of warehouses written
+        """
+        pipe = self.redis_client.pipeline(transaction=False)
+        count = 0
+        for name, location, capacity, available in rows:
+            pipe.hset(KEY_PREFIX + name, mapping=_to_fields(location, capacity, available))
+            pipe.sadd(NAMES_KEY, name)
+            count += 1
+            if count % chunk_size == 0:
+                pipe.execute()
+        pipe.execute()
+        # names=None: too many to list, every cache reloads
+        version = self.redis_client.incr(VERSION_KEY)
+        self.redis_client.publish(UPDATES_CHANNEL, encode({'version': version, 'names': None}))
+        return count
+
+    def import_csv(self, path, chunk_size=1000):
+        """
+        Bulk import from a CSV file with `name,lat,lon,capacity,available` columns.
+
+        Returns:
+            int: Number of warehouses written
+        """
+        with open(path, newline='') as f:
+            rows = (
+                (row['name'], [row['lat'], row['lon']], int(row.get('capacity') or 0),
+                 (row.get('available') or 'true').strip().lower() in ('true', '1', 'yes'))
+                for row in csv.DictReader(f)
+            )
+            return self.import_rows(rows, chunk_size)
+
+    def close(self):
+        if self.pubsub:
+            self.pubsub.close()
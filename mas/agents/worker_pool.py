@@ -0,0 +1,319 @@
+import os
+import sys
+import json
+import time
+import redis
+import logging
+import argparse
+import multiprocessing as mp
+from queue import Full
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(project_root)
+from config.logging_config import LogConfigure
+from mas.agents.simple_agent import SimpleProductAgent
+from messaging.codec import decode, pallet_id_of, CodecError
+from messaging.hashring import ConsistentHashRing
+from messaging.metrics import ThroughputMeter
+from messaging.transport import make_transport
+
+
+def _worker_main(worker_id, queue, processed, threshold, transport):
+    """Worker process: run SimpleProductAgent's checks on the readings routed to it"""
+    agent = SimpleProductAgent(threshold=threshold, transport=transport, echo_readings=False)
+    if not agent.connect_to_redis(subscribe=False):
+        return
+    agent.logger.info(f"Worker {worker_id} started (pid {os.getpid()})")
+
+    try:
+        while True:
+            batch = queue.get()
+            if batch is None:
+                break
+            for payload in batch:
+                agent.process_message({'type': 'message', 'data': payload})
+            with processed.get_lock():
+                processed.value += len(batch)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.transport.close()
+        agent.logger.info(f"Worker {worker_id} stopped: {json.dumps(agent.stats())}")
+
+
+class ProductAgentPool:
+    """
+    Supervisor that shards sensor readings across SimpleProductAgent worker processes.
+
+    A single reader consumes 'sensor_data' and routes each reading to a
+    worker by consistent hash of its pallet_id. Every pallet is handled by
+    exactly one worker through a FIFO queue, so per-pallet ordering is kept.
+    Workers can join or leave at runtime through 'pool_commands' (see
+    mas/send_command.py --pool); only the pallets whose ring segment changes
+    owner are moved, and the supervisor waits for their old owner to drain
+    first. A worker that dies is respawned under the same id, so it takes
+    back exactly its own segment.
+    """
+
+    def __init__(self, workers=None, threshold=8.0, transport=None, queue_size=1000,
+                 report_interval=10.0, respawn=True, log_file='../../logs/worker_pool.log'):
+        """
+        Args:
+            workers (int): Initial number of worker processes, defaults to the CPU count
+            threshold (float): Temperature threshold passed to every worker
+            transport (str): 'pubsub' or 'streams', defaults to MESSAGE_TRANSPORT
+            queue_size (int): Max batches queued per worker before the reader blocks
+            report_interval (float): Seconds between throughput/lag reports
+            respawn (bool): Replace workers that die
+        """
+        self.initial_workers = workers or os.cpu_count()
+        self.threshold = threshold
+        self.transport_kind = transport
+        self.transport = None
+        self.queue_size = queue_size
+        self.report_interval = report_interval
+        self.respawn = respawn
+        self.control = None  # pubsub on 'pool_commands'
+        self.ring = ConsistentHashRing()
+        self.workers = {}  # worker_id -> {'process', 'queue', 'processed', 'sent'}
+        self._dead = []  # ids of workers that died since the last reap
+        self._next_id = 0
+        self.throughput = ThroughputMeter()
+
+        self.logger = logging.getLogger('WorkerPool')
+        if not self.logger.handlers:
+            LogConfigure().setup_logging(log_file, self.logger)
+
+    # ---------------------------
+    # Membership
+    # ---------------------------
+    def _wait_drained(self, worker_ids, timeout=30.0):
+        """Block until the given workers have processed everything routed to them (dead ones never will)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if all(self.lag(w) == 0 for w in worker_ids
+                   if w in self.workers and self.workers[w]['process'].is_alive()):
+                return True
+            time.sleep(0.01)
+        self.logger.warning(f"Workers {list(worker_ids)} did not drain within {timeout}s")
+        return False
+
+    def add_worker(self, worker_id=None):
+        """Start a worker and give it its share of the hash ring; reusing an id reclaims that id's segment"""
+        if worker_id is None:
+            worker_id = f"worker-{self._next_id}"
+            self._next_id += 1
+        elif worker_id in self.workers:
+            self.logger.warning(f"{worker_id} is already running")
+            return worker_id
+        queue = mp.Queue(maxsize=self.queue_size)
+        processed = mp.Value('q', 0)
+        process = mp.Process(
+            target=_worker_main,
+            args=(worker_id, queue, processed, self.threshold, self.transport_kind),
+            name=worker_id,
+            daemon=True
+        )
+        process.start()
+
+        # Pallets moving to the new worker must not overtake readings still queued elsewhere
+        self._wait_drained(list(self.workers))
+        self.workers[worker_id] = {'process': process, 'queue': queue, 'processed': processed, 'sent': 0}
+        self.ring.add_node(worker_id)
+        self.logger.info(f"Added {worker_id}; pool size {len(self.workers)}")
+        return worker_id
+
+    def remove_worker(self, worker_id):
+        """Drain a worker, hand its pallets to the rest of the ring and stop it"""
+        worker = self.workers.get(worker_id)
+        if not worker:
+            self.logger.warning(f"Unknown worker: {worker_id}")
+            return
+        process = worker['process']
+        if process.is_alive():
+            self._wait_drained([worker_id])
+        self.ring.remove_node(worker_id)
+        try:
+            worker['queue'].put_nowait(None)
+        except Full:
+            pass  # Did not drain; terminated below
+        process.join(timeout=10)
+        if process.is_alive():
+            process.terminate()
+        del self.workers[worker_id]
+        self.logger.info(f"Removed {worker_id}; pool size {len(self.workers)}")
+
+    def _drop_dead(self, worker_id):
+        """Forget a worker that died; its ring segment moves to the remaining workers"""
+        worker = self.workers[worker_id]
+        self.logger.error(
+            f"{worker_id} died (exit code {worker['process'].exitcode}) with {self.lag(worker_id)} "
+            f"readings unprocessed; its pallets move to the rest of the ring"
+        )
+        self.ring.remove_node(worker_id)
+        del self.workers[worker_id]
+        self._dead.append(worker_id)
+
+    def reap(self):
+        """Drop every worker process that is no longer alive, and respawn it if enabled"""
+        for worker_id in [w for w, worker in self.workers.items() if not worker['process'].is_alive()]:
+            self._drop_dead(worker_id)
+        # Workers dropped here or by _deliver; the same id puts the same pallets back on the new process
+        for worker_id in self._dead if self.respawn else ():
+            self.add_worker(worker_id)
+        self._dead = []
+
+    def handle_command(self, command):
+        """Apply a 'pool_commands' message: {'type': 'add_worker'} or {'type': 'remove_worker', 'worker': id}"""
+        if command.get('type') == 'add_worker':
+            self.add_worker()
+        elif command.get('type') == 'remove_worker':
+            # Newest worker unless one is named
+            worker_id = command.get('worker') or (list(self.workers)[-1] if self.workers else None)
+            if worker_id:
+                self.remove_worker(worker_id)
+        else:
+            self.logger.warning(f"Unknown pool command: {command}")
+
+    def _poll_commands(self):
+        """Apply every pending membership command without blocking"""
+        while True:
+            message = self.control.get_message(ignore_subscribe_messages=True)
+            if message is None:
+                return
+            try:
+                self.handle_command(decode(message['data']))
+            except CodecError as e:
+                self.logger.error(f"Bad pool command: {e}")
+
+    # ---------------------------
+    # Routing and metrics
+    # ---------------------------
+    def _deliver(self, worker_id, payloads):
+        """Queue payloads for a worker, waiting while its queue is full; False if it died meanwhile"""
+        worker = self.workers[worker_id]
+        while worker['process'].is_alive():
+            try:
+                worker['queue'].put(payloads, timeout=1.0)
+            except Full:
+                continue
+            worker['sent'] += len(payloads)
+            return True
+        self._drop_dead(worker_id)
+        return False
+
+    def route(self, messages):
+        """
+        Group a batch of messages by owning worker and hand each group over in one put.
+
+        Returns:
+            list: The messages that were handed over or could never be routed, i.e.
+                those to acknowledge; none are handed over when no worker is alive
+        """
+        handled = []
+        batches = {}
+        for message in messages:
+            try:
+                pallet_id = pallet_id_of(message['data'])
+            except (CodecError, KeyError, TypeError) as e:
+                self.logger.error(f"Could not route message: {e}")
+                handled.append(message)
+                continue
+            batches.setdefault(pallet_id, []).append(message)
+
+        # Pallets of a dead worker are re-homed and retried on the next pass
+        while batches:
+            by_worker = {}
+            for pallet_id, pallet_messages in batches.items():
+                worker_id = self.ring.get_node(pallet_id)
+                if worker_id is None:
+                    self.logger.error(f"No live workers; {sum(map(len, batches.values()))} readings left unrouted")
+                    self.throughput.add(len(handled))
+                    return handled
+                by_worker.setdefault(worker_id, []).append(pallet_id)
+
+            retry = {}
+            for worker_id, pallet_ids in by_worker.items():
+                group = [message for pallet_id in pallet_ids for message in batches[pallet_id]]
+                if self._deliver(worker_id, [message['data'] for message in group]):
+                    handled.extend(group)
+                else:
+                    retry.update((pallet_id, batches[pallet_id]) for pallet_id in pallet_ids)
+            batches = retry
+        self.throughput.add(len(handled))
+        return handled
+
+    def lag(self, worker_id):
+        """Readings routed to a worker but not yet processed"""
+        worker = self.workers[worker_id]
+        return worker['sent'] - worker['processed'].value
+
+    def stats(self):
+        return {
+            'workers': len(self.workers),
+            'routed': self.throughput.count,
+            'rate': round(self.throughput.window_rate(), 1),
+            'per_worker': {
+                worker_id: {
+                    'processed': worker['processed'].value,
+                    'lag': self.lag(worker_id),
+                    'alive': worker['process'].is_alive()
+                }
+                for worker_id, worker in self.workers.items()
+            }
+        }
+
+    # ---------------------------
+    # Main loop
+    # ---------------------------
+    def run(self):
+        """Start the workers and route sensor_data to them until interrupted"""
+        try:
+            self.redis_client = redis.Redis(host='localhost', port=6379, db=0)
+            # Same group as SimpleProductAgent: the pool is a sharded instance of that agent
+            self.transport = make_transport(
+                self.redis_client, ['sensor_data'], kind=self.transport_kind, group='simple_product_agents'
+            )
+            self.control = self.redis_client.pubsub()
+            self.control.subscribe('pool_commands')
+        except redis.ConnectionError:
+            self.logger.error("Could not connect to Redis")
+            return
+
+        for _ in range(self.initial_workers):
+            self.add_worker()
+        self.logger.info(f"Routing sensor_data across {len(self.workers)} workers")
+        print("Press Ctrl+C to stop...")
+
+        next_report = time.monotonic() + self.report_interval
+        try:
+            while True:
+                messages = self.transport.read(timeout=1.0)
+                if messages:
+                    # Handed off to a worker queue; a worker crash loses at most its queued readings
+                    self.transport.ack(self.route(messages))
+                self._poll_commands()
+
+                if time.monotonic() >= next_report:
+                    self.reap()
+                    self.logger.info(f"Pool stats: {json.dumps(self.stats())}")
+                    next_report = time.monotonic() + self.report_interval
+
+        except KeyboardInterrupt:
+            self.logger.info("Worker pool stopped by user")
+            print("Stopping worker pool...")
+        finally:
+            for worker_id in list(self.workers):
+                self.remove_worker(worker_id)
+            self.control.close()
+            self.transport.close()
+            self.logger.info("Worker pool shutdown complete")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded SimpleProductAgent worker pool")
+    parser.add_argument('--workers', type=int, help="Number of worker processes (default: CPU count)")
+    parser.add_argument('--threshold', type=float, default=8.0)
+    args = parser.parse_args()
+
+    ProductAgentPool(workers=args.workers, threshold=args.threshold).run()
@@ -1,10 +1,23 @@
 # mas/send_command.py
-import json
+import os
 import redis
 import sys
 
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+from messaging.codec import encode
+from messaging.transport import make_transport
+from mas.agents.warehouse_registry import WarehouseRegistry, UnknownWarehouseError
+
 def send_warehouse_status(warehouse, status):
     """Send warehouse status update"""
+    # Persist in the shared registry; every agent's cache picks it up
+    try:
+        WarehouseRegistry().set_available(warehouse, status)
+    except UnknownWarehouseError:
+        print(f"Unknown warehouse: {warehouse}")
+        sys.exit(1)
+
     r = redis.Redis(host='localhost', port=6379, db=0)
     
     command = {
@@ -14,12 +27,49 @@ def send_warehouse_status(warehouse, status):
         'timestamp': '2023-10-05T12:00:00Z'
     }
     
-    r.publish('logistics_commands', json.dumps(command))
+    make_transport(r).publish('logistics_commands', encode(command))
     print(f"Sent status update: {warehouse} = {status}")
 
+def set_warehouse_capacity(warehouse, capacity):
+    """Set the remaining capacity of a warehouse in the registry"""
+    try:
+        WarehouseRegistry().set_capacity(warehouse, capacity)
+    except UnknownWarehouseError:
+        print(f"Unknown warehouse: {warehouse}")
+        sys.exit(1)
+    print(f"Set capacity: {warehouse} = {capacity}")
+
+def send_pool_command(action, worker=None):
+    """Add a worker to, or remove one from, a running worker pool"""
+    command = {'type': f'{action}_worker'}
+    if worker:
+        command['worker'] = worker
+    redis.Redis(host='localhost', port=6379, db=0).publish('pool_commands', encode(command))
+    print(f"Sent pool command: {action} {worker or ''}".rstrip())
+
+def import_warehouses(csv_path):
+    """Bulk import warehouses (name,lat,lon,capacity,available) into the registry"""
+    count = WarehouseRegistry().import_csv(csv_path)
+    print(f"Imported {count} warehouses from {csv_path}")
+
 if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == '--import':
+        import_warehouses(sys.argv[2])
+        sys.exit(0)
+
+    if len(sys.argv) in (3, 4) and sys.argv[1] == '--pool' and sys.argv[2] in ('add', 'remove'):
+        send_pool_command(sys.argv[2], sys.argv[3] if len(sys.argv) == 4 else None)
+        sys.exit(0)
+
+    if len(sys.argv) == 4 and sys.argv[1] == '--capacity':
+        set_warehouse_capacity(sys.argv[2], int(sys.argv[3]))
+        sys.exit(0)
+
     if len(sys.argv) != 3:
         print("Usage: python send_command.py <warehouse_name> <true/false>")
+        print("       python send_command.py --capacity <warehouse_name> <capacity>")
+        print("       python send_command.py --import <warehouses.csv>")
+        print("       python send_command.py --pool add|remove [worker_id]")
         sys.exit(1)
         
     warehouse = sys.argv[1]
@@ -0,0 +1,284 @@
+"""
+Bounded in-process buffering and load shedding for message consumers.
+
+A redis-py pub/sub subscriber that falls behind accumulates messages
+without limit. BufferedTransport drains the wrapped transport on a reader
+thread into a BoundedBuffer, so memory is capped by the buffer capacity and
+what gets dropped under overload is decided by a policy instead of by the
+OOM killer:
+
+- 'drop_oldest': when full, the oldest normal message is shed.
+- 'coalesce': a new normal message replaces the buffered one with the same
+  key (e.g. pallet_id), so only the latest reading per pallet waits; when
+  full the oldest normal message is shed as with 'drop_oldest'.
+
+Messages classified as critical (e.g. above threshold or SPOILED) are never
+shed; when the buffer holds nothing but critical messages the reader waits
+for room, which pushes back on Redis instead.
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+
+SHED_POLICIES = ('drop_oldest', 'coalesce')
+
+
+class BoundedBuffer:
+    """Thread-safe FIFO of at most `capacity` messages with a shedding policy."""
+
+    def __init__(self, capacity=10_000, policy='drop_oldest'):
+        if policy not in SHED_POLICIES:
+            raise ValueError(f"Unknown shed policy: {policy}")
+        self.capacity = capacity
+        self.policy = policy
+
+        self._entries = OrderedDict()  # seq -> (message, key, critical, put_at), oldest first
+        self._normal = deque()  # seqs of normal entries, oldest first; may hold stale seqs
+        self._normal_count = 0
+        self._latest = {}  # key -> seq of its buffered normal entry ('coalesce')
+        self._next_seq = 0
+        self._closed = False
+
+        lock = threading.Lock()
+        self._not_empty = threading.Condition(lock)
+        self._not_full = threading.Condition(lock)
+
+        self.high_watermark = 0
+        self.counters = {'received': 0, 'shed': 0, 'coalesced': 0, 'critical_waits': 0}
+
+    def __len__(self):
+        with self._not_empty:
+            return len(self._entries)
+
+    def _remove(self, seq):
+        message, key, critical, _ = self._entries.pop(seq)
+        if not critical:
+            self._normal_count -= 1
+            if key is not None and self._latest.get(key) == seq:
+                del self._latest[key]
+        return message
+
+    def _prune_normal(self):
+        while self._normal and self._normal[0] not in self._entries:
+            self._normal.popleft()
+
+    def put(self, message, key=None, critical=False):
+        """
+        Add one message, shedding according to the policy if needed.
+
+        Args:
+            message: Anything; returned unchanged by get()
+            key: Coalescing key, e.g. the pallet_id
+            critical (bool): Never shed; waits for room when the buffer is full of critical messages
+
+        Returns:
+            list: Messages shed to make room, including `message` itself if it was not accepted
+        """
+        shed = []
+        with self._not_full:
+            self.counters['received'] += 1
+
+            if self.policy == 'coalesce' and key is not None and not critical and key in self._latest:
+                # Re-queued at the back so it is never processed before older critical readings
+                shed.append(self._remove(self._latest[key]))
+                self.counters['coalesced'] += 1
+                self.counters['shed'] += 1
+
+            waited = False
+            while len(self._entries) >= self.capacity and not self._closed:
+                if self._normal_count:
+                    self._prune_normal()
+                    shed.append(self._remove(self._normal.popleft()))
+                    self.counters['shed'] += 1
+                elif not critical:
+                    self.counters['shed'] += 1
+                    shed.append(message)
+                    return shed
+                else:
+                    if not waited:
+                        self.counters['critical_waits'] += 1
+                        waited = True
+                    self._not_full.wait(0.5)
+
+            seq = self._next_seq
+            self._next_seq += 1
+            self._entries[seq] = (message, key, critical, time.monotonic())
+            if not critical:
+                self._normal.append(seq)
+                self._normal_count += 1
+                if key is not None and self.policy == 'coalesce':
+                    self._latest[key] = seq
+            self.high_watermark = max(self.high_watermark, len(self._entries))
+            self._not_empty.notify()
+        return shed
+
+    def get(self, count=1000, timeout=1.0):
+        """Remove and return up to `count` messages, oldest first, waiting up to `timeout` seconds for one."""
+        with self._not_empty:
+            if not self._entries:
+                self._not_empty.wait(timeout)
+            messages = []
+            while self._entries and len(messages) < count:
+                messages.append(self._remove(next(iter(self._entries))))
+            self._prune_normal()
+            if messages:
+                self._not_full.notify_all()
+            return messages
+
+    def lag(self):
+        """Seconds the oldest buffered message has been waiting"""
+        with self._not_empty:
+            if not self._entries:
+                return 0.0
+            return time.monotonic() - next(iter(self._entries.values()))[3]
+
+    def stats(self):
+        with self._not_empty:
+            depth = len(self._entries)
+            critical = depth - self._normal_count
+        return dict(
+            self.counters,
+            depth=depth,
+            critical=critical,
+            capacity=self.capacity,
+            high_watermark=self.high_watermark,
+            lag_s=round(self.lag(), 3),
+            policy=self.policy
+        )
+
+    def close(self):
+        """Release a reader waiting for room"""
+        with self._not_full:
+            self._closed = True
+            self._not_full.notify_all()
+
+
+class BufferedTransport:
+    """
+    Wraps a transport so a reader thread drains it into a BoundedBuffer.
+
+    Offers the same read()/ack()/publish()/close() interface as the wrapped
+    transport, so agent loops do not change. `classify(message)` returns
+    `(key, critical)` for each message; it runs on the reader thread and may
+    annotate the message (e.g. with its decoded payload) for the consumer.
+    Shed messages are acknowledged right away so Streams does not redeliver them.
+
+    With Streams, buffered entries stay pending under this consumer until
+    acked, possibly for longer than the transport's `claim_idle_ms`. The
+    reader therefore re-claims them every `claim_idle_ms / 3` to keep them
+    from looking abandoned, and drops entries a reclaim hands back while
+    they are still buffered, so nothing is processed twice.
+    """
+
+    def __init__(self, transport, capacity=10_000, policy='drop_oldest', classify=None, read_count=1000):
+        """
+        Args:
+            transport: PubSubTransport or StreamsTransport to drain
+            capacity (int): Messages buffered before shedding starts
+            policy (str): One of SHED_POLICIES
+            classify (callable): message -> (key, critical); all messages are normal and unkeyed if None
+            read_count (int): Messages fetched from the transport per read
+        """
+        self.transport = transport
+        self.kind = transport.kind
+        self.buffer = BoundedBuffer(capacity, policy)
+        self.classify = classify or (lambda message: (None, False))
+        self.read_count = read_count
+        self.read_errors = 0
+        self.classify_errors = 0
+        self.reader_restarts = 0
+        self.duplicates = 0
+        self.logger = logging.getLogger(__name__)
+
+        # Streams only: (stream, id) -> message, for entries buffered or being processed but not acked
+        self._held = {}
+        self._held_lock = threading.Lock()
+        self._track = transport.kind == 'streams'
+        self._touch_interval = getattr(transport, 'claim_idle_ms', 30_000) / 3000.0
+        self._next_touch = time.monotonic() + self._touch_interval
+
+        self._stopping = threading.Event()
+        self._start_reader()
+
+    def _start_reader(self):
+        self._reader = threading.Thread(target=self._run, name='transport-reader', daemon=True)
+        self._reader.start()
+
+    def _classify(self, message):
+        """classify(), with anything it cannot handle buffered as critical so processing reports it"""
+        try:
+            return self.classify(message)
+        except Exception as e:
+            self.classify_errors += 1
+            self.logger.error(f"Could not classify message, buffering it as critical: {e}")
+            return None, True
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                messages = self.transport.read(timeout=0.5, count=self.read_count)
+            except Exception as e:
+                self.read_errors += 1
+                self.logger.error(f"Transport read failed: {e}")
+                self._stopping.wait(1.0)
+                continue
+
+            try:
+                if self._track:
+                    messages = self._hold(messages)
+                shed = []
+                for message in messages:
+                    key, critical = self._classify(message)
+                    shed.extend(self.buffer.put(message, key, critical))
+                if shed:
+                    self.ack(shed)
+                if self._track and time.monotonic() >= self._next_touch:
+                    self._next_touch = time.monotonic() + self._touch_interval
+                    with self._held_lock:
+                        held = list(self._held.values())
+                    self.transport.touch(held)
+            except Exception:
+                # Never let the reader die silently; the consumer would wait on an empty buffer forever
+                self.read_errors += 1
+                self.logger.exception("Buffering messages failed")
+
+    def _hold(self, messages):
+        """Remember newly read entries; drop those already held (handed back by a reclaim)"""
+        fresh = []
+        with self._held_lock:
+            for message in messages:
+                entry = (message['stream'], message['id'])
+                if entry in self._held:
+                    self.duplicates += 1
+                    continue
+                self._held[entry] = message
+                fresh.append(message)
+        return fresh
+
+    def publish(self, channel, payload, client=None):
+        return self.transport.publish(channel, payload, client)
+
+    def read(self, timeout=1.0, count=1000):
+        if not self._reader.is_alive() and not self._stopping.is_set():
+            self.reader_restarts += 1
+            self.logger.error("Transport reader thread died, restarting it")
+            self._start_reader()
+        return self.buffer.get(count, timeout)
+
+    def ack(self, messages):
+        self.transport.ack(messages)
+        if self._track:
+            with self._held_lock:
+                for message in messages:
+                    self._held.pop((message['stream'], message['id']), None)
+
+    def stats(self):
+        return dict(self.buffer.stats(), read_errors=self.read_errors, classify_errors=self.classify_errors,
+                    reader_restarts=self.reader_restarts, duplicates=self.duplicates)
+
+    def close(self):
+        self._stopping.set()
+        self.buffer.close()
+        self._reader.join(2.0)
+        self.transport.close()
@@ -0,0 +1,188 @@
+"""
+Shared wire codec for the sensor_data, alerts, commands and events channels.
+
+Binary messages start with a one-byte magic marker, a format version and a
+message kind. Sensor readings use a fixed `struct` layout; every other
+message is packed with msgpack when it is installed. Timestamps travel as
+epoch milliseconds. decode() auto-detects the encoding, so plain JSON
+messages from publishers that have not migrated yet are still accepted.
+"""
+import os
+import json
+import struct
+from datetime import datetime, timezone
+
+try:
+    import msgpack
+except ImportError:  # Optional: without it, non-sensor messages are sent as JSON
+    msgpack = None
+
+MAGIC = 0xB7  # Never the first byte of a JSON document
+WIRE_VERSION = 1
+
+KIND_SENSOR = 1
+KIND_MSGPACK = 2
+
+# 'binary' or 'json'; publishers can stay on JSON while subscribers migrate
+WIRE_ENCODING = os.getenv("WIRE_ENCODING", "binary")
+
+STATUSES = ("IN_TRANSIT", "IN_WAREHOUSE", "DELIVERED", "SPOILED", "AWAITING_DISPOSAL")
+STATUS_CODES = {name: code for code, name in enumerate(STATUSES)}
+
+_HEADER = struct.Struct("<BBB")
+# timestamp_ms, lat, lon, temperature, status code, pallet_id length
+_SENSOR = struct.Struct("<qddfBH")
+_SENSOR_KEYS = frozenset(("pallet_id", "timestamp", "location", "temperature", "status"))
+
+
+class CodecError(ValueError):
+    """Raised when a message cannot be decoded."""
+
+
+# ---------------------------
+# Timestamps
+# ---------------------------
+# (iso string, epoch ms) of the last parse, swapped as one tuple so threads never mix pairs
+_last_parsed = (None, None)
+
+
+def now_ms():
+    """Current time as epoch milliseconds."""
+    return int(datetime.now(timezone.utc).timestamp() * 1000)
+
+
+def to_epoch_ms(value):
+    """Convert an ISO string, datetime or number to epoch milliseconds."""
+    global _last_parsed
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, datetime):
+        return int(value.timestamp() * 1000)
+    if isinstance(value, str):
+        # Fleet packets from one tick share a timestamp; parse it once
+        last_iso, last_ms = _last_parsed
+        if value == last_iso:
+            return last_ms
+        text = value[:-1] + "+00:00" if value.endswith("Z") else value
+        ms = int(datetime.fromisoformat(text).timestamp() * 1000)
+        _last_parsed = (value, ms)
+        return ms
+    if value is None:
+        return now_ms()
+    raise CodecError(f"Unsupported timestamp: {value!r}")
+
+
+def to_iso(timestamp):
+    """Render an epoch-millisecond (or already ISO) timestamp for logs and storage."""
+    if isinstance(timestamp, (int, float)):
+        return datetime.fromtimestamp(timestamp / 1000, timezone.utc).isoformat()
+    return timestamp
+
+
+# ---------------------------
+# Encoding
+# ---------------------------
+def _is_sensor_reading(message):
+    if message.keys() != _SENSOR_KEYS:
+        return False
+    location = message["location"]
+    return (isinstance(location, dict) and "lat" in location and "lon" in location
+            and message["status"] in STATUS_CODES)
+
+
+def _encode_sensor_reading(message):
+    pallet_id = str(message["pallet_id"]).encode()
+    location = message["location"]
+    return b"".join((
+        _HEADER.pack(MAGIC, WIRE_VERSION, KIND_SENSOR),
+        _SENSOR.pack(
+            to_epoch_ms(message["timestamp"]),
+            float(location["lat"]),
+            float(location["lon"]),
+            float(message["temperature"]),
+            STATUS_CODES[message["status"]],
+            len(pallet_id)
+        ),
+        pallet_id
+    ))
+
+
+def encode(message, encoding=None):
+    """
+    Serialize a message dict for publishing.
+
+    Args:
+        message (dict): Message to encode
+        encoding (str): 'binary' or 'json', defaults to WIRE_ENCODING
+
+    Returns:
+        bytes or str: Payload for redis publish()/xadd()
+    """
+    encoding = encoding or WIRE_ENCODING
+    if encoding == "json":
+        return json.dumps(message)
+
+    if _is_sensor_reading(message):
+        return _encode_sensor_reading(message)
+
+    if msgpack is None:
+        return json.dumps(message)
+
+    if "timestamp" in message:
+        message = dict(message, timestamp=to_epoch_ms(message["timestamp"]))
+    return _HEADER.pack(MAGIC, WIRE_VERSION, KIND_MSGPACK) + msgpack.packb(message, use_bin_type=True, default=str)
+
+
+# ---------------------------
+# Decoding
+# ---------------------------
+def _decode_sensor_reading(data):
+    timestamp, lat, lon, temperature, status, id_length = _SENSOR.unpack_from(data, _HEADER.size)
+    offset = _HEADER.size + _SENSOR.size
+    return {
+        "pallet_id": bytes(data[offset:offset + id_length]).decode(),
+        "timestamp": timestamp,
+        "location": {"lat": lat, "lon": lon},
+        "temperature": round(temperature, 2),
+        "status": STATUSES[status]
+    }
+
+
+def pallet_id_of(data):
+    """Pallet id of a payload; binary sensor readings are read without a full decode."""
+    if isinstance(data, (bytes, bytearray, memoryview)) and len(data) > _HEADER.size and data[0] == MAGIC \
+            and data[1] == WIRE_VERSION and data[2] == KIND_SENSOR:
+        id_length = _SENSOR.unpack_from(data, _HEADER.size)[-1]
+        offset = _HEADER.size + _SENSOR.size
+        return bytes(data[offset:offset + id_length]).decode()
+    return decode(data)["pallet_id"]
+
+
+def decode(data):
+    """
+    Deserialize a payload produced by encode() or by a legacy JSON publisher.
+
+    Raises:
+        CodecError: If the payload is malformed or uses an unknown version
+    """
+    try:
+        if isinstance(data, str):
+            return json.loads(data)
+        if not data or data[0] != MAGIC:
+            return json.loads(data)
+
+        _, version, kind = _HEADER.unpack_from(data)
+        if version != WIRE_VERSION:
+            raise CodecError(f"Unsupported wire version {version}")
+        if kind == KIND_SENSOR:
+            return _decode_sensor_reading(data)
+        if kind == KIND_MSGPACK:
+            if msgpack is None:
+                raise CodecError("msgpack payload received but msgpack is not installed")
+            return msgpack.unpackb(data[_HEADER.size:], raw=False)
+        raise CodecError(f"Unknown message kind {kind}")
+
+    except CodecError:
+        raise
+    except (ValueError, TypeError, struct.error, IndexError) as e:
+        raise CodecError(f"Could not decode message: {e}") from e
@@ -0,0 +1,53 @@
+import bisect
+import hashlib
+
+
+def _hash(key):
+    # str() first: pallet ids decoded from JSON or msgpack may be ints
+    return int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=8).digest(), 'big')
+
+
+class ConsistentHashRing:
+    """
+    Consistent hash ring with virtual nodes.
+
+    Each node owns `replicas` points on the ring, so adding or removing a
+    node only moves roughly 1/N of the keys, and those keys move to or from
+    that node alone.
+    """
+
+    def __init__(self, nodes=(), replicas=128):
+        self.replicas = replicas
+        self._points = []  # sorted hash points
+        self._owners = []  # node owning the point at the same index
+        self.nodes = set()
+        for node in nodes:
+            self.add_node(node)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add_node(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for replica in range(self.replicas):
+            point = _hash(f"{node}#{replica}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove_node(self, node):
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        keep = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [p for p, _ in keep]
+        self._owners = [o for _, o in keep]
+
+    def get_node(self, key):
+        """Node responsible for `key`, or None if the ring is empty."""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
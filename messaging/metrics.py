@@ -0,0 +1,85 @@
+import time
+import numpy as np
+
+
+class LatencyRecorder:
+    """Keeps a bounded reservoir of latency samples and reports percentiles.
+
+    Uses reservoir sampling so memory stays fixed no matter how many
+    samples are recorded during a long load test.
+    """
+
+    def __init__(self, capacity=100_000, seed=None):
+        self.capacity = capacity
+        self.samples = np.empty(capacity, dtype=np.float64)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rng = np.random.default_rng(seed)
+
+    def record(self, seconds):
+        """Record one latency sample, in seconds."""
+        if self.count < self.capacity:
+            self.samples[self.count] = seconds
+        else:
+            slot = self.rng.integers(0, self.count + 1)
+            if slot < self.capacity:
+                self.samples[slot] = seconds
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def record_many(self, seconds):
+        """Record an iterable or array of latency samples."""
+        for value in np.asarray(seconds, dtype=np.float64).ravel():
+            self.record(float(value))
+
+    def percentiles(self, quantiles=(50, 90, 99, 99.9)):
+        """Return {'p50': ms, ...} for the recorded samples, in milliseconds."""
+        if not self.count:
+            return {f"p{q:g}": 0.0 for q in quantiles}
+        filled = self.samples[:min(self.count, self.capacity)]
+        values = np.percentile(filled, quantiles) * 1000.0
+        return {f"p{q:g}": round(float(v), 3) for q, v in zip(quantiles, values)}
+
+    def summary(self):
+        """Percentiles plus count, mean and max, in milliseconds."""
+        stats = self.percentiles()
+        stats["count"] = self.count
+        stats["mean"] = round(self.total / self.count * 1000.0, 3) if self.count else 0.0
+        stats["max"] = round(self.max * 1000.0, 3)
+        return stats
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+class ThroughputMeter:
+    """Counts events and reports the achieved rate since start or last window."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.window_started = self.started
+        self.window_count = 0
+
+    def add(self, n=1):
+        self.count += n
+        self.window_count += n
+
+    def rate(self):
+        """Average events per second since the meter started."""
+        elapsed = time.perf_counter() - self.started
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    def window_rate(self):
+        """Events per second since the previous call, then starts a new window."""
+        now = time.perf_counter()
+        elapsed = now - self.window_started
+        rate = self.window_count / elapsed if elapsed > 0 else 0.0
+        self.window_started = now
+        self.window_count = 0
+        return rate
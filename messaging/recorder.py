@@ -0,0 +1,261 @@
+"""
+Record and replay agent channel traffic through memory-mapped capture files.
+
+Traffic is read from Redis pub/sub, or with the Streams transport from the
+channels' streams (XREAD, outside any consumer group, so agents lose
+nothing); replay publishes with the same transport.
+
+A capture segment is a small file header followed by frames:
+
+    receive time (int64 ns) | channel length (uint16) | payload length (uint32) | channel | payload
+
+Payloads are stored exactly as published, so JSON and binary codec
+messages replay byte for byte.
+"""
+import os
+import sys
+import mmap
+import time
+import struct
+import argparse
+import redis
+
+if __name__ == "__main__":
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from messaging.transport import MESSAGE_TRANSPORT, PAYLOAD_FIELD, STREAM_PREFIX, make_transport
+
+FILE_MAGIC = b"PGCAP\x00"
+FILE_VERSION = 1
+_FILE_HEADER = struct.Struct("<6sH8x")
+_FRAME_HEADER = struct.Struct("<qHI")
+
+DEFAULT_CHANNELS = ('sensor_data', 'alerts', 'commands', 'events')
+
+
+class CaptureRecorder:
+    """Subscribes to agent channels and appends every message to capture segments."""
+
+    def __init__(self, output_dir, channels=DEFAULT_CHANNELS, max_segment_bytes=256 * 1024 * 1024,
+                 redis_client=None, transport=None):
+        self.output_dir = output_dir
+        self.channels = channels
+        self.transport = transport or MESSAGE_TRANSPORT  # 'pubsub' or 'streams'
+        self.max_segment_bytes = max_segment_bytes
+        self.redis_client = redis_client
+        self.segment_index = 0
+        self.segment_bytes = 0
+        self.file = None
+        self.frames = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _segment_path(self, index):
+        return os.path.join(self.output_dir, f"capture-{index:06d}.seg")
+
+    def _open_segment(self):
+        if self.file:
+            self.file.close()
+        self.segment_index += 1
+        self.file = open(self._segment_path(self.segment_index), 'wb', buffering=1 << 20)
+        self.file.write(_FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION))
+        self.segment_bytes = _FILE_HEADER.size
+
+    def append(self, channel, payload, received_ns=None):
+        """Append one frame; starts a new segment once the current one is full."""
+        if isinstance(channel, str):
+            channel = channel.encode()
+        if isinstance(payload, str):
+            payload = payload.encode()
+        if self.file is None or self.segment_bytes >= self.max_segment_bytes:
+            self._open_segment()
+
+        header = _FRAME_HEADER.pack(received_ns or time.time_ns(), len(channel), len(payload))
+        self.file.write(header)
+        self.file.write(channel)
+        self.file.write(payload)
+        self.segment_bytes += len(header) + len(channel) + len(payload)
+        self.frames += 1
+
+    def run(self, duration=None):
+        """Record until interrupted or `duration` seconds have passed."""
+        client = self.redis_client or redis.Redis(host='localhost', port=6379, db=0)
+        print(f"Recording {', '.join(self.channels)} ({self.transport}) to {self.output_dir}. "
+              f"Press Ctrl+C to stop...")
+
+        deadline = time.monotonic() + duration if duration else None
+        try:
+            if self.transport == 'streams':
+                self._record_streams(client, deadline)
+            else:
+                self._record_pubsub(client, deadline)
+        except KeyboardInterrupt:
+            print("Recording stopped by user.")
+        finally:
+            self.close()
+        print(f"Recorded {self.frames} frames in {self.segment_index} segment(s)")
+
+    def _record_pubsub(self, client, deadline):
+        pubsub = client.pubsub()
+        pubsub.subscribe(*self.channels)
+        try:
+            while not deadline or time.monotonic() < deadline:
+                message = pubsub.get_message(timeout=1.0)
+                if message and message['type'] == 'message':
+                    self.append(message['channel'], message['data'])
+        finally:
+            pubsub.close()
+
+    def _record_streams(self, client, deadline, count=1000):
+        """Follow the channels' streams with plain XREAD, starting at their current end"""
+        last_ids = {}
+        for channel in self.channels:
+            # '$' would be re-evaluated on every call; pin the current end so nothing between reads is missed
+            newest = client.xrevrange(STREAM_PREFIX + channel, count=1)
+            last_ids[STREAM_PREFIX + channel] = newest[0][0] if newest else '0-0'
+        while not deadline or time.monotonic() < deadline:
+            for stream, entries in client.xread(last_ids, count=count, block=1000) or []:
+                stream = stream.decode() if isinstance(stream, bytes) else stream
+                for entry_id, fields in entries:
+                    payload = fields.get(PAYLOAD_FIELD)
+                    if payload is not None:
+                        self.append(stream[len(STREAM_PREFIX):], payload)
+                    last_ids[stream] = entry_id
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+class CaptureReader:
+    """Memory-maps a capture segment and iterates its frames without copying."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = _FILE_HEADER.unpack_from(self._map)
+        if magic != FILE_MAGIC:
+            raise ValueError(f"{path} is not a capture segment")
+        if version != FILE_VERSION:
+            raise ValueError(f"Unsupported capture version {version} in {path}")
+
+    def frames(self):
+        """Yield (received_ns, channel, payload) tuples; payload is a memoryview into the map."""
+        view = memoryview(self._map)
+        offset = _FILE_HEADER.size
+        end = len(self._map)
+        while offset + _FRAME_HEADER.size <= end:
+            received_ns, channel_len, payload_len = _FRAME_HEADER.unpack_from(self._map, offset)
+            offset += _FRAME_HEADER.size
+            if offset + channel_len + payload_len > end:
+                break  # Truncated final frame from an interrupted recording
+            channel = bytes(view[offset:offset + channel_len]).decode()
+            offset += channel_len
+            yield received_ns, channel, view[offset:offset + payload_len]
+            offset += payload_len
+
+    def close(self):
+        self._file.close()
+        try:
+            self._map.close()
+        except BufferError:
+            # Payload views from frames() are still referenced; the map is released with them
+            pass
+
+
+def segment_paths(path):
+    """A single segment file, or every segment in a capture directory in order."""
+    if os.path.isdir(path):
+        return [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.seg')]
+    return [path]
+
+
+class CaptureReplayer:
+    """
+    Republishes a capture to Redis, with PUBLISH or, for the Streams transport, XADD.
+
+    With a `speed` of 1.0 the original inter-arrival timing is reproduced,
+    N replays N times faster, and None publishes as fast as possible in
+    pipelined batches.
+    """
+
+    def __init__(self, path, speed=1.0, channels=None, channel_prefix='', batch_size=1000, redis_client=None,
+                 transport=None):
+        self.paths = segment_paths(path)
+        self.speed = speed
+        self.channels = set(channels) if channels else None
+        self.channel_prefix = channel_prefix
+        self.batch_size = batch_size
+        self.redis_client = redis_client or redis.Redis(host='localhost', port=6379, db=0)
+        self.transport = make_transport(self.redis_client, kind=transport)
+        self.published = 0
+
+    def frames(self):
+        """All frames of the capture, across segments, after channel filtering."""
+        for path in self.paths:
+            reader = CaptureReader(path)
+            try:
+                for received_ns, channel, payload in reader.frames():
+                    if self.channels is None or channel in self.channels:
+                        yield received_ns, channel, payload
+            finally:
+                reader.close()
+
+    def run(self):
+        """Replay the capture; returns the number of frames published."""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pending = 0
+        first_ns = None
+        started = time.perf_counter()
+
+        for received_ns, channel, payload in self.frames():
+            if self.speed:
+                if first_ns is None:
+                    first_ns = received_ns
+                # Sleep until this frame's original offset, scaled by the replay speed
+                delay = (received_ns - first_ns) / 1e9 / self.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+                self.transport.publish(self.channel_prefix + channel, payload)
+            else:
+                self.transport.publish(self.channel_prefix + channel, payload, client=pipe)
+                pending += 1
+                if pending >= self.batch_size:
+                    pipe.execute()
+                    pending = 0
+            self.published += 1
+
+        if pending:
+            pipe.execute()
+        elapsed = time.perf_counter() - started
+        rate = self.published / elapsed if elapsed > 0 else 0.0
+        print(f"Replayed {self.published} frames in {elapsed:.2f}s ({rate:.0f} msg/s)")
+        return self.published
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Record and replay agent channel traffic")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    record = sub.add_parser('record', help="Record live traffic to capture segments")
+    record.add_argument('output_dir')
+    record.add_argument('--channels', nargs='+', default=list(DEFAULT_CHANNELS))
+    record.add_argument('--duration', type=float)
+    record.add_argument('--transport', choices=['pubsub', 'streams'], help="Defaults to MESSAGE_TRANSPORT")
+
+    replay = sub.add_parser('replay', help="Republish a capture file or directory")
+    replay.add_argument('path')
+    replay.add_argument('--speed', type=float, default=1.0, help="Replay speed multiplier; 0 for max speed")
+    replay.add_argument('--channels', nargs='+')
+    replay.add_argument('--channel-prefix', default='')
+    replay.add_argument('--transport', choices=['pubsub', 'streams'], help="Defaults to MESSAGE_TRANSPORT")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == 'record':
+        CaptureRecorder(args.output_dir, channels=args.channels, transport=args.transport).run(duration=args.duration)
+    else:
+        CaptureReplayer(args.path, speed=args.speed or None, channels=args.channels,
+                        channel_prefix=args.channel_prefix, transport=args.transport).run()
@@ -0,0 +1,342 @@
+"""
+Message transports shared by the agents.
+
+Both transports expose the same publish()/read()/ack() interface and
+return messages shaped like redis-py pub/sub messages, so agent message
+handlers do not care which one is in use:
+
+- PubSubTransport: the original fire-and-forget Redis pub/sub.
+- StreamsTransport: Redis Streams with consumer groups. Messages survive
+  consumer restarts, can be shared by several consumers, and are only
+  removed from the pending list once acknowledged.
+
+AsyncPubSubTransport and AsyncStreamsTransport offer the same interface
+as coroutines for redis.asyncio clients (see make_async_transport()).
+"""
+import os
+import time
+import socket
+import redis
+
+# 'pubsub' or 'streams'; every publisher and consumer must agree
+MESSAGE_TRANSPORT = os.getenv("MESSAGE_TRANSPORT", "pubsub")
+
+STREAM_PREFIX = "stream:"
+PAYLOAD_FIELD = b"d"
+
+
+def default_consumer_name():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class PubSubTransport:
+    """Redis pub/sub; read() drains everything pending after the first message arrives."""
+
+    kind = 'pubsub'
+
+    def __init__(self, redis_client, channels=()):
+        self.redis_client = redis_client
+        self.channels = list(channels)
+        self.pubsub = None
+        if self.channels:
+            self.pubsub = redis_client.pubsub()
+            self.pubsub.subscribe(*self.channels)
+
+    def publish(self, channel, payload, client=None):
+        """Publish one payload; pass a pipeline as `client` to batch publishes."""
+        return (client or self.redis_client).publish(channel, payload)
+
+    def read(self, timeout=1.0, count=1000):
+        """Block up to `timeout` seconds for a message, then drain up to `count` pending ones."""
+        messages = []
+        message = self.pubsub.get_message(timeout=timeout)
+        while message:
+            # Subscribe confirmations are skipped without ending the drain
+            if message['type'] == 'message':
+                messages.append(message)
+                if len(messages) >= count:
+                    break
+            message = self.pubsub.get_message(timeout=0)
+        return messages
+
+    def ack(self, messages):
+        """Pub/sub has no delivery tracking"""
+
+    def close(self):
+        if self.pubsub:
+            self.pubsub.close()
+
+
+class StreamsTransport:
+    """
+    Redis Streams with consumer groups.
+
+    publish() appends with XADD and approximate MAXLEN trimming. read()
+    fetches batches with XREADGROUP and periodically reclaims entries left
+    pending by crashed consumers with XAUTOCLAIM. Entries stay pending
+    until ack() is called after they have been processed.
+    """
+
+    kind = 'streams'
+
+    def __init__(self, redis_client, channels=(), group=None, consumer=None, maxlen=100_000,
+                 claim_idle_ms=30_000, claim_interval=5.0):
+        """
+        Args:
+            redis_client (redis.Redis): Client used for all stream commands
+            channels (list): Channels to consume; empty for a publish-only transport
+            group (str): Consumer group shared by all instances of an agent
+            consumer (str): This consumer's name, unique per process
+            maxlen (int): Approximate maximum entries kept per stream
+            claim_idle_ms (int): Pending entries idle this long are reclaimed. Must exceed the
+                longest time an entry waits between read and ack, unless the consumer
+                touch()es entries it still holds (BufferedTransport does)
+            claim_interval (float): Seconds between reclaim passes
+        """
+        self.redis_client = redis_client
+        self.channels = list(channels)
+        self.group = group
+        self.consumer = consumer or default_consumer_name()
+        self.maxlen = maxlen
+        self.claim_idle_ms = claim_idle_ms
+        self.claim_interval = claim_interval
+        self._next_claim = 0.0
+        self._claim_cursors = {}  # stream -> XAUTOCLAIM cursor, so each pass resumes the scan
+        self.reclaimed = 0
+        if self.channels:
+            if not group:
+                raise ValueError("A consumer group is required to read from streams")
+            self._ensure_groups()
+
+    def _stream(self, channel):
+        return STREAM_PREFIX + (channel.decode() if isinstance(channel, bytes) else channel)
+
+    def _ensure_groups(self):
+        for channel in self.channels:
+            try:
+                self.redis_client.xgroup_create(self._stream(channel), self.group, id='$', mkstream=True)
+            except redis.ResponseError as e:
+                if 'BUSYGROUP' not in str(e):
+                    raise
+
+    def publish(self, channel, payload, client=None):
+        """Append one payload to the channel's stream; pass a pipeline as `client` to batch."""
+        return (client or self.redis_client).xadd(
+            self._stream(channel), {PAYLOAD_FIELD: payload}, maxlen=self.maxlen, approximate=True
+        )
+
+    def _to_message(self, stream, entry_id, fields):
+        return {
+            'type': 'message',
+            'channel': stream[len(STREAM_PREFIX):].encode() if isinstance(stream, str)
+            else stream[len(STREAM_PREFIX):],
+            'data': fields.get(PAYLOAD_FIELD),
+            'id': entry_id,
+            'stream': stream
+        }
+
+    def _reclaim(self, count):
+        """Take over entries that another consumer read but never acknowledged."""
+        messages = []
+        for channel in self.channels:
+            stream = self._stream(channel)
+            result = self.redis_client.xautoclaim(
+                stream, self.group, self.consumer, self.claim_idle_ms,
+                start_id=self._claim_cursors.get(stream, '0-0'), count=count
+            )
+            # '0-0' once the scan has reached the end of the pending list
+            self._claim_cursors[stream] = result[0]
+            for entry_id, fields in result[1]:
+                if fields is None:
+                    # Trimmed away before anyone processed it
+                    self.redis_client.xack(stream, self.group, entry_id)
+                    continue
+                messages.append(self._to_message(stream.encode(), entry_id, fields))
+        self.reclaimed += len(messages)
+        return messages
+
+    def read(self, timeout=1.0, count=1000):
+        """Return up to `count` messages, blocking up to `timeout` seconds for new ones."""
+        now = time.monotonic()
+        if now >= self._next_claim:
+            self._next_claim = now + self.claim_interval
+            claimed = self._reclaim(count)
+            if claimed:
+                return claimed
+
+        streams = {self._stream(channel): '>' for channel in self.channels}
+        try:
+            response = self.redis_client.xreadgroup(
+                self.group, self.consumer, streams, count=count, block=int(timeout * 1000)
+            )
+        except redis.ResponseError as e:
+            if 'NOGROUP' not in str(e):
+                raise
+            # Stream was deleted under us; recreate it and try again on the next read
+            self._ensure_groups()
+            return []
+
+        return [
+            self._to_message(stream, entry_id, fields)
+            for stream, entries in response or []
+            for entry_id, fields in entries
+        ]
+
+    def ack(self, messages):
+        """Acknowledge processed messages so they leave the pending entries list."""
+        by_stream = {}
+        for message in messages:
+            by_stream.setdefault(message['stream'], []).append(message['id'])
+        for stream, ids in by_stream.items():
+            self.redis_client.xack(stream, self.group, *ids)
+
+    def touch(self, messages, chunk_size=1000):
+        """Reset the idle time of entries this consumer still holds, so no reclaim hands them out again."""
+        by_stream = {}
+        for message in messages:
+            by_stream.setdefault(message['stream'], []).append(message['id'])
+        for stream, ids in by_stream.items():
+            for start in range(0, len(ids), chunk_size):
+                self.redis_client.xclaim(stream, self.group, self.consumer, 0, ids[start:start + chunk_size],
+                                         justid=True)
+
+    def close(self):
+        pass
+
+
+class AsyncPubSubTransport(PubSubTransport):
+    """PubSubTransport for a redis.asyncio client; reads await instead of blocking the event loop."""
+
+    def __init__(self, redis_client, channels=()):
+        # Subscribing needs the event loop; it happens in start()
+        super().__init__(redis_client, ())
+        self.channels = list(channels)
+
+    async def start(self):
+        if self.channels:
+            self.pubsub = self.redis_client.pubsub()
+            await self.pubsub.subscribe(*self.channels)
+        return self
+
+    async def publish(self, channel, payload, client=None):
+        return await (client or self.redis_client).publish(channel, payload)
+
+    async def read(self, timeout=1.0, count=1000):
+        messages = []
+        message = await self.pubsub.get_message(timeout=timeout)
+        while message:
+            if message['type'] == 'message':
+                messages.append(message)
+                if len(messages) >= count:
+                    break
+            message = await self.pubsub.get_message(timeout=0)
+        return messages
+
+    async def ack(self, messages):
+        """Pub/sub has no delivery tracking"""
+
+    async def close(self):
+        if self.pubsub:
+            await self.pubsub.aclose()
+
+
+class AsyncStreamsTransport(StreamsTransport):
+    """StreamsTransport for a redis.asyncio client."""
+
+    def __init__(self, redis_client, channels=(), group=None, **kwargs):
+        if channels and not group:
+            raise ValueError("A consumer group is required to read from streams")
+        # Group creation needs the event loop; it happens in start()
+        super().__init__(redis_client, (), group=group, **kwargs)
+        self.channels = list(channels)
+
+    async def start(self):
+        await self._ensure_groups()
+        return self
+
+    async def _ensure_groups(self):
+        for channel in self.channels:
+            try:
+                await self.redis_client.xgroup_create(self._stream(channel), self.group, id='$', mkstream=True)
+            except redis.ResponseError as e:
+                if 'BUSYGROUP' not in str(e):
+                    raise
+
+    async def publish(self, channel, payload, client=None):
+        return await (client or self.redis_client).xadd(
+            self._stream(channel), {PAYLOAD_FIELD: payload}, maxlen=self.maxlen, approximate=True
+        )
+
+    async def _reclaim(self, count):
+        messages = []
+        for channel in self.channels:
+            stream = self._stream(channel)
+            result = await self.redis_client.xautoclaim(
+                stream, self.group, self.consumer, self.claim_idle_ms,
+                start_id=self._claim_cursors.get(stream, '0-0'), count=count
+            )
+            self._claim_cursors[stream] = result[0]
+            for entry_id, fields in result[1]:
+                if fields is None:
+                    await self.redis_client.xack(stream, self.group, entry_id)
+                    continue
+                messages.append(self._to_message(stream.encode(), entry_id, fields))
+        self.reclaimed += len(messages)
+        return messages
+
+    async def read(self, timeout=1.0, count=1000):
+        now = time.monotonic()
+        if now >= self._next_claim:
+            self._next_claim = now + self.claim_interval
+            claimed = await self._reclaim(count)
+            if claimed:
+                return claimed
+
+        streams = {self._stream(channel): '>' for channel in self.channels}
+        try:
+            response = await self.redis_client.xreadgroup(
+                self.group, self.consumer, streams, count=count, block=int(timeout * 1000)
+            )
+        except redis.ResponseError as e:
+            if 'NOGROUP' not in str(e):
+                raise
+            await self._ensure_groups()
+            return []
+
+        return [
+            self._to_message(stream, entry_id, fields)
+            for stream, entries in response or []
+            for entry_id, fields in entries
+        ]
+
+    async def ack(self, messages):
+        by_stream = {}
+        for message in messages:
+            by_stream.setdefault(message['stream'], []).append(message['id'])
+        for stream, ids in by_stream.items():
+            await self.redis_client.xack(stream, self.group, *ids)
+
+    async def close(self):
+        pass
+
+
+def make_transport(redis_client, channels=(), kind=None, group=None, consumer=None, **kwargs):
+    """Create the configured transport (MESSAGE_TRANSPORT unless `kind` is given)."""
+    kind = kind or MESSAGE_TRANSPORT
+    if kind == 'streams':
+        return StreamsTransport(redis_client, channels, group=group, consumer=consumer, **kwargs)
+    if kind == 'pubsub':
+        return PubSubTransport(redis_client, channels)
+    raise ValueError(f"Unknown transport: {kind}")
+
+
+async def make_async_transport(redis_client, channels=(), kind=None, group=None, consumer=None, **kwargs):
+    """Async counterpart of make_transport() for a redis.asyncio client."""
+    kind = kind or MESSAGE_TRANSPORT
+    if kind == 'streams':
+        transport = AsyncStreamsTransport(redis_client, channels, group=group, consumer=consumer, **kwargs)
+    elif kind == 'pubsub':
+        transport = AsyncPubSubTransport(redis_client, channels)
+    else:
+        raise ValueError(f"Unknown transport: {kind}")
+    return await transport.start()
@@ -1,6 +1,12 @@
-import json
+import os
+import sys
 import numpy as np
 from datetime import datetime
+from route_cache import ROUTE_CACHE
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+from messaging.codec import decode
 
 class PalletSimulator:
     """Simulates a pallet of perishable goods with IoT sensors."""
@@ -27,12 +33,10 @@ class PalletSimulator:
                 f"temp={round(self.current_temp, 2)}°C>")
 
     def _calculate_route(self, origin, destination):
-        """Generates a simple linear route for demo purposes."""
+        """Returns the shared great-circle route between origin and destination."""
         # This is a simplified model. For a real project, use a routing API like OSRM.
         steps = 100  # Number of steps in the journey
-        lat_steps = np.linspace(origin[0], destination[0], steps)
-        lon_steps = np.linspace(origin[1], destination[1], steps)
-        return list(zip(lat_steps, lon_steps))
+        return ROUTE_CACHE.route(origin, destination, steps)
 
     def update(self):
         """Advance the simulation by one step."""
@@ -89,13 +93,14 @@ class PalletSimulator:
         try:
             message = self.command_pubsub.get_message()
             if message and message['type'] == 'message':
-                command = json.loads(message['data'])
+                command = decode(message['data'])
 
                 if command['type'] == 'reroute' and command['pallet_id'] == self.id:
                     new_destination = self.warehouses[command['warehouse']]['location']
                     self.logger.info(f"Rerouting to {command['warehouse']} at {new_destination}")
                     self.destination = new_destination
-                    self._calculate_route()  # Recalculate route
+                    self.route = self._calculate_route(self.current_location, new_destination)
+                    self.current_route_index = 0
 
                 elif command['type'] == 'dispose' and command['pallet_id'] == self.id:
                     self.logger.warning("Disposal command received - goods will be disposed")
@@ -103,3 +108,134 @@ class PalletSimulator:
 
         except Exception as e:
             self.logger.error(f"Error processing command: {e}")
+
+
+class FleetSimulator:
+    """Simulates a whole fleet of pallets as NumPy arrays (struct-of-arrays).
+
+    Every pallet follows the same physics as PalletSimulator, but the
+    fleet is advanced with a single vectorized update() per tick.
+    """
+
+    STATUSES = ("IN_TRANSIT", "IN_WAREHOUSE", "DELIVERED", "SPOILED", "AWAITING_DISPOSAL")
+    IN_TRANSIT, IN_WAREHOUSE, DELIVERED, SPOILED, AWAITING_DISPOSAL = range(len(STATUSES))
+
+    def __init__(self, pallet_ids, origins, destinations, ideal_temp=4.0, max_temp=8.0,
+                 external_temp=25.0, steps=100, seed=None, route_cache=ROUTE_CACHE):
+        self.pallet_ids = list(pallet_ids)
+        n = len(self.pallet_ids)
+        self.size = n
+        self.steps = steps
+        self.rng = np.random.default_rng(seed)
+        self.route_cache = route_cache
+
+        # Per-pallet state; scalars broadcast to the whole fleet
+        self.origins = np.broadcast_to(np.asarray(origins, dtype=np.float64), (n, 2)).copy()
+        self.destinations = np.broadcast_to(np.asarray(destinations, dtype=np.float64), (n, 2)).copy()
+        self.current_location = self.origins.copy()
+        self.route_ids = route_cache.route_ids(self.origins, self.destinations, steps)
+        self.ideal_temp = np.broadcast_to(np.asarray(ideal_temp, dtype=np.float64), (n,)).copy()
+        self.max_temp = np.broadcast_to(np.asarray(max_temp, dtype=np.float64), (n,)).copy()
+        self.external_temp = np.broadcast_to(np.asarray(external_temp, dtype=np.float64), (n,)).copy()
+        self.current_temp = self.ideal_temp.copy()
+        self.cooling_unit_efficiency = np.full(n, 0.97)
+        self.current_route_index = np.zeros(n, dtype=np.int32)
+        self.is_moving = np.ones(n, dtype=bool)
+        self.status = np.full(n, self.IN_TRANSIT, dtype=np.uint8)
+        self.step_count = 0
+        self.scenarios = None
+        self.scenario_ids = None
+
+    @classmethod
+    def uniform(cls, size, origin, destination, prefix="PALLET_", **kwargs):
+        """Create a fleet of `size` pallets sharing one origin and destination."""
+        pallet_ids = [f"{prefix}{i:06d}" for i in range(size)]
+        return cls(pallet_ids, origin, destination, **kwargs)
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        counts = np.bincount(self.status, minlength=len(self.STATUSES))
+        summary = ", ".join(f"{name}={count}" for name, count in zip(self.STATUSES, counts) if count)
+        return f"<FleetSimulator size={self.size} {summary}>"
+
+    @property
+    def active(self):
+        """Mask of pallets that are neither delivered nor spoiled."""
+        return (self.status != self.DELIVERED) & (self.status != self.SPOILED)
+
+    @property
+    def done(self):
+        return not self.active.any()
+
+    def _route_position(self, pallets):
+        """Great-circle position of the selected pallets along their cached routes."""
+        return self.route_cache.positions(self.route_ids[pallets], self.current_route_index[pallets])
+
+    def update(self, emit=True):
+        """Advance every active pallet by one step.
+
+        Returns the data packets of the pallets updated this tick, or the
+        boolean mask of those pallets when `emit` is False.
+        """
+        if self.scenarios is not None:
+            self.scenarios.apply(self, self.scenario_ids, self.step_count)
+
+        active = self.active
+        last_index = self.steps - 1
+
+        # Update Location
+        advancing = active & self.is_moving & (self.current_route_index < last_index)
+        self.current_route_index[advancing] += 1
+        self.current_location[advancing] = self._route_position(advancing)
+        self.is_moving[active & ~advancing] = False
+
+        # Simulate Temperature based on movement and cooling efficiency
+        efficiency = np.where(self.is_moving, self.cooling_unit_efficiency, self.cooling_unit_efficiency * 0.5)
+        temp_influence = (self.external_temp - self.ideal_temp) * (1 - efficiency)
+        noise = self.rng.uniform(0.1, 0.3, self.size)
+        self.current_temp[active] += (temp_influence * noise)[active]
+
+        # Check for spoilage, then delivery (delivery wins, as in PalletSimulator)
+        self.status[active & (self.current_temp > self.max_temp)] = self.SPOILED
+        delivered = active & (self.current_route_index >= last_index)
+        self.status[delivered] = self.DELIVERED
+        self.is_moving[delivered] = False
+        self.step_count += 1
+
+        if not emit:
+            return active
+        return self._generate_data_packets(active)
+
+    def _generate_data_packets(self, mask=None):
+        """Returns JSON packets in the same schema as PalletSimulator._generate_data_packet."""
+        indices = np.flatnonzero(mask) if mask is not None else np.arange(self.size)
+        timestamp = datetime.utcnow().isoformat() + 'Z'
+        lats = self.current_location[indices, 0].tolist()
+        lons = self.current_location[indices, 1].tolist()
+        temps = np.round(self.current_temp[indices], 2).tolist()
+        statuses = self.status[indices].tolist()
+        pallet_ids = self.pallet_ids
+        names = self.STATUSES
+        return [
+            {
+                "pallet_id": pallet_ids[i],
+                "timestamp": timestamp,
+                "location": {"lat": lat, "lon": lon},
+                "temperature": temp,
+                "status": names[status]
+            }
+            for i, lat, lon, temp, status in zip(indices.tolist(), lats, lons, temps, statuses)
+        ]
+
+    def use_scenarios(self, scenarios, scenario_ids=0):
+        """Drive the fleet from CompiledScenarios; `scenario_ids` picks each pallet's scenario row."""
+        self.scenarios = scenarios
+        self.scenario_ids = np.broadcast_to(np.asarray(scenario_ids, dtype=np.intp), (self.size,)).copy()
+
+    def apply_scenario(self, cooling_efficiency, is_moving, pallets=None):
+        """Change conditions for the whole fleet, or only for the `pallets` index/mask."""
+        selector = slice(None) if pallets is None else pallets
+        self.cooling_unit_efficiency[selector] = cooling_efficiency
+        self.is_moving[selector] = is_moving
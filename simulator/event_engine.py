@@ -0,0 +1,337 @@
+import json
+import time
+import heapq
+import argparse
+import itertools
+import numpy as np
+from datetime import datetime, timedelta
+from data_simulator import FleetSimulator
+from route_cache import ROUTE_CACHE
+from messaging.codec import encode
+from messaging.transport import make_transport
+
+# Event kinds, ordered so that simultaneous events resolve deterministically
+SCENARIO, DEPART, SAMPLE = range(3)
+
+# PalletSimulator scales each tick's drift by np.random.uniform(0.1, 0.3)
+NOISE_MEAN = 0.2
+NOISE_STD = 0.2 / np.sqrt(12)
+
+
+class EventQueue:
+    """Heap-based event queue ordered by simulated time."""
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, at, kind, payload=None):
+        heapq.heappush(self._heap, (at, kind, next(self._counter), payload))
+
+    def pop(self):
+        at, kind, _, payload = heapq.heappop(self._heap)
+        return at, kind, payload
+
+    def peek_time(self):
+        return self._heap[0][0] if self._heap else None
+
+
+class JsonLinesSink:
+    """Writes telemetry packets to a file, one JSON object per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'w', buffering=1 << 20)
+        self.count = 0
+
+    def write(self, timestamp, pallet_ids, lats, lons, temps, statuses):
+        # Same output as json.dumps() of the packet dict, without per-packet dict overhead
+        lines = [
+            f'{{"pallet_id": "{pid}", "timestamp": "{timestamp}", '
+            f'"location": {{"lat": {lat}, "lon": {lon}}}, "temperature": {temp}, "status": "{status}"}}\n'
+            for pid, lat, lon, temp, status in zip(pallet_ids, lats, lons, temps, statuses)
+        ]
+        self.file.writelines(lines)
+        self.count += len(lines)
+
+    def close(self):
+        self.file.close()
+
+
+class RedisSink:
+    """Bursts telemetry packets into a Redis channel, one pipeline per sample."""
+
+    def __init__(self, redis_client, channel='sensor_data', max_batch=10000, transport=None):
+        self.redis_client = redis_client
+        self.transport = make_transport(redis_client, kind=transport)
+        self.channel = channel
+        self.max_batch = max_batch
+        self.count = 0
+
+    def write(self, timestamp, pallet_ids, lats, lons, temps, statuses):
+        pipe = self.redis_client.pipeline(transaction=False)
+        for i, (pid, lat, lon, temp, status) in enumerate(zip(pallet_ids, lats, lons, temps, statuses), 1):
+            self.transport.publish(self.channel, encode({
+                "pallet_id": pid,
+                "timestamp": timestamp,
+                "location": {"lat": lat, "lon": lon},
+                "temperature": temp,
+                "status": status
+            }), client=pipe)
+            if i % self.max_batch == 0:
+                pipe.execute()
+        pipe.execute()
+        self.count += len(pallet_ids)
+
+    def close(self):
+        pass
+
+
+class DiscreteEventSimulator:
+    """
+    Accelerated-time fleet simulation driven by a discrete event queue.
+
+    Instead of stepping every pallet once per tick, the simulated clock
+    jumps straight to the next event (telemetry sample, scenario transition
+    or departure). Temperature and route progress in between are advanced
+    in closed form from the same drift model PalletSimulator applies per
+    tick, so idle stretches cost nothing. A trip scenario is replayed on
+    every journey, relative to each departure, as PalletSimulator does.
+    """
+
+    def __init__(self, pallet_ids, origins, destinations, ideal_temp=4.0, max_temp=8.0,
+                 external_temp=25.0, steps=100, step_seconds=300.0, sample_interval=300.0,
+                 turnaround=3600.0, start_time=None, seed=None, route_cache=ROUTE_CACHE):
+        """
+        Args:
+            pallet_ids (list): Pallet identifiers
+            origins, destinations: [lat, lon] or (n, 2) arrays
+            steps (int): Route resolution, as in PalletSimulator
+            step_seconds (float): Simulated seconds per PalletSimulator step
+            sample_interval (float): Simulated seconds between telemetry samples
+            turnaround (float): Simulated seconds before a finished pallet departs again
+            start_time (datetime): Simulated wall clock at t=0, defaults to now (UTC)
+        """
+        self.pallet_ids = list(pallet_ids)
+        n = len(self.pallet_ids)
+        self.size = n
+        self.steps = steps
+        self.step_seconds = float(step_seconds)
+        self.sample_interval = float(sample_interval)
+        self.turnaround = float(turnaround)
+        self.start_time = start_time or datetime.utcnow()
+        self.rng = np.random.default_rng(seed)
+        self.route_cache = route_cache
+
+        self.origins = np.broadcast_to(np.asarray(origins, dtype=np.float64), (n, 2)).copy()
+        self.destinations = np.broadcast_to(np.asarray(destinations, dtype=np.float64), (n, 2)).copy()
+        self.outbound_routes = route_cache.route_ids(self.origins, self.destinations, steps)
+        self.return_routes = route_cache.route_ids(self.destinations, self.origins, steps)
+        self.ideal_temp = np.broadcast_to(np.asarray(ideal_temp, dtype=np.float64), (n,)).copy()
+        self.max_temp = np.broadcast_to(np.asarray(max_temp, dtype=np.float64), (n,)).copy()
+        self.external_temp = np.broadcast_to(np.asarray(external_temp, dtype=np.float64), (n,)).copy()
+
+        self.route_ids = self.outbound_routes.copy()
+        self.outbound = np.ones(n, dtype=bool)
+        self.current_temp = self.ideal_temp.copy()
+        self.progress = np.zeros(n)  # route index, fractional between steps
+        self.cooling_unit_efficiency = np.full(n, 0.97)
+        self.is_moving = np.ones(n, dtype=bool)
+        self.status = np.full(n, FleetSimulator.IN_TRANSIT, dtype=np.uint8)
+        self.last_update = np.zeros(n)
+        self.trips = np.zeros(n, dtype=np.int64)
+
+        self.trip_scenario = []  # (seconds after departure, cooling efficiency, is_moving), replayed per trip
+        self.scenario_pallets = np.zeros(n, dtype=bool)  # pallets the trip scenario applies to
+
+        self.now = 0.0
+        self.queue = EventQueue()
+        self.events_processed = 0
+
+    # ---------------------------
+    # Scheduling
+    # ---------------------------
+    def schedule_transition(self, at, cooling_efficiency, is_moving, pallets=None, trip=None):
+        """
+        Change cooling efficiency and movement at simulated time `at` (seconds).
+        With `trip`, only pallets still on that trip number are affected.
+        """
+        self.queue.push(at, SCENARIO, (cooling_efficiency, is_moving, pallets, trip))
+
+    def schedule_trip_scenario(self, transitions, start=0.0, pallets=None):
+        """
+        Replay `transitions`, (seconds after departure, cooling efficiency, is_moving)
+        tuples, on every trip of the selected pallets, starting with the current one at `start`.
+        """
+        self.trip_scenario = list(transitions)
+        self.scenario_pallets[:] = pallets is None
+        if pallets is not None:
+            self.scenario_pallets[pallets] = True
+        for offset, cooling_efficiency, is_moving in self.trip_scenario:
+            self.schedule_transition(start + offset, cooling_efficiency, is_moving, pallets, trip=0)
+
+    def schedule_default_scenario(self, start=0.0, pallets=None):
+        """The default scenario's traffic jam (steps 30-60) on every trip, in simulated time."""
+        self.schedule_trip_scenario([
+            (30 * self.step_seconds, 0.85, False),
+            (60 * self.step_seconds, 0.97, True)
+        ], start, pallets)
+
+    # ---------------------------
+    # Closed-form state advance
+    # ---------------------------
+    def _advance(self, pallets, until):
+        """Bring the selected pallets' state forward to simulated time `until`."""
+        idx = np.arange(self.size) if pallets is None else np.asarray(pallets)
+        in_transit = self.status[idx] == FleetSimulator.IN_TRANSIT
+        idx = idx[in_transit]
+        if not idx.size:
+            return
+
+        last_step = self.steps - 1
+        ticks = (until - self.last_update[idx]) / self.step_seconds
+        moving = self.is_moving[idx]
+        efficiency = np.where(moving, self.cooling_unit_efficiency[idx], self.cooling_unit_efficiency[idx] * 0.5)
+        drift = (self.external_temp[idx] - self.ideal_temp[idx]) * (1 - efficiency)
+
+        # A moving pallet stops drifting once it reaches its destination
+        ticks_to_arrival = np.where(moving, last_step - self.progress[idx], np.inf)
+        ticks = np.minimum(ticks, ticks_to_arrival)
+
+        # Sum of `ticks` uniform(0.1, 0.3) draws: exact mean, normal approximation of the spread
+        noise = NOISE_MEAN * ticks + NOISE_STD * np.sqrt(ticks) * self.rng.standard_normal(idx.size)
+        self.current_temp[idx] += drift * noise
+        self.progress[idx] += np.where(moving, ticks, 0.0)
+        arrived_at = self.last_update[idx] + ticks * self.step_seconds
+        self.last_update[idx] = until
+
+        spoiled = self.current_temp[idx] > self.max_temp[idx]
+        delivered = self.progress[idx] >= last_step - 1e-9
+        # Delivery wins over spoilage, as in PalletSimulator.update()
+        self.status[idx[spoiled]] = FleetSimulator.SPOILED
+        self.status[idx[delivered]] = FleetSimulator.DELIVERED
+        self.is_moving[idx[delivered]] = False
+
+        finished = spoiled | delivered
+        finished_at = np.where(delivered, arrived_at, until)
+        for pallet, at in zip(idx[finished].tolist(), finished_at[finished].tolist()):
+            self.queue.push(max(at + self.turnaround, until), DEPART, pallet)
+
+    # ---------------------------
+    # Event handlers
+    # ---------------------------
+    def _handle_transition(self, cooling_efficiency, is_moving, pallets, trip=None):
+        if trip is not None:
+            # A trip that ended early must not receive the rest of its scenario on the next one
+            pallets = np.arange(self.size) if pallets is None else np.asarray(pallets)
+            pallets = pallets[self.trips[pallets] == trip]
+        self._advance(pallets, self.now)
+        selector = slice(None) if pallets is None else pallets
+        self.cooling_unit_efficiency[selector] = cooling_efficiency
+        self.is_moving[selector] = is_moving
+
+    def _handle_depart(self, pallet):
+        """Start the pallet's next trip, back along the lane it just travelled."""
+        self.outbound[pallet] = not self.outbound[pallet]
+        self.route_ids[pallet] = self.outbound_routes[pallet] if self.outbound[pallet] else self.return_routes[pallet]
+        self.progress[pallet] = 0.0
+        self.current_temp[pallet] = self.ideal_temp[pallet]
+        self.cooling_unit_efficiency[pallet] = 0.97
+        self.is_moving[pallet] = True
+        self.status[pallet] = FleetSimulator.IN_TRANSIT
+        self.last_update[pallet] = self.now
+        self.trips[pallet] += 1
+        if self.scenario_pallets[pallet]:
+            for offset, cooling_efficiency, is_moving in self.trip_scenario:
+                self.schedule_transition(self.now + offset, cooling_efficiency, is_moving, [pallet],
+                                         trip=int(self.trips[pallet]))
+
+    def _handle_sample(self, sink):
+        reporting = np.flatnonzero(self.status == FleetSimulator.IN_TRANSIT)
+        self._advance(reporting, self.now)
+        if not reporting.size:
+            return
+
+        positions = self.route_cache.positions(self.route_ids[reporting], np.floor(self.progress[reporting]))
+        timestamp = (self.start_time + timedelta(seconds=self.now)).isoformat() + 'Z'
+        names = FleetSimulator.STATUSES
+        pallet_ids = self.pallet_ids
+        sink.write(
+            timestamp,
+            [pallet_ids[i] for i in reporting.tolist()],
+            positions[:, 0].tolist(),
+            positions[:, 1].tolist(),
+            np.round(self.current_temp[reporting], 2).tolist(),
+            [names[s] for s in self.status[reporting].tolist()]
+        )
+
+    # ---------------------------
+    # Main loop
+    # ---------------------------
+    def run(self, duration, sink):
+        """
+        Simulate `duration` seconds of fleet operation, writing telemetry to `sink`.
+
+        Returns:
+            dict: Simulated span, event and packet counts and wall-clock time
+        """
+        started = time.perf_counter()
+        for at in np.arange(self.now, self.now + duration, self.sample_interval):
+            self.queue.push(float(at), SAMPLE)
+
+        end = self.now + duration
+        while len(self.queue) and self.queue.peek_time() < end:
+            self.now, kind, payload = self.queue.pop()
+            if kind == SAMPLE:
+                self._handle_sample(sink)
+            elif kind == SCENARIO:
+                self._handle_transition(*payload)
+            elif kind == DEPART:
+                self._handle_depart(payload)
+            self.events_processed += 1
+
+        self._advance(None, end)
+        self.now = end
+        elapsed = time.perf_counter() - started
+        return {
+            'simulated_seconds': duration,
+            'events': self.events_processed,
+            'packets': sink.count,
+            'trips': int(self.trips.sum()),
+            'wall_seconds': round(elapsed, 3),
+            'speedup': round(duration / elapsed, 1) if elapsed else None
+        }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Accelerated-time fleet telemetry generator")
+    parser.add_argument('--pallets', type=int, default=1000)
+    parser.add_argument('--days', type=float, default=30)
+    parser.add_argument('--sample-interval', type=float, default=300.0, help="Simulated seconds between samples")
+    parser.add_argument('--output', help="Write JSON lines to this file")
+    parser.add_argument('--redis', action='store_true', help="Burst the telemetry into Redis 'sensor_data'")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    ORIGIN = [52.5200, 13.4050]  # Berlin
+    DESTINATION = [52.3676, 4.9041]  # Amsterdam
+
+    if args.redis:
+        import redis
+        sink = RedisSink(redis.Redis(host='localhost', port=6379, db=0))
+    else:
+        sink = JsonLinesSink(args.output or 'telemetry.jsonl')
+
+    pallet_ids = [f"PALLET_{i:06d}" for i in range(args.pallets)]
+    engine = DiscreteEventSimulator(pallet_ids, ORIGIN, DESTINATION, sample_interval=args.sample_interval)
+    engine.schedule_default_scenario()
+    try:
+        report = engine.run(args.days * 86400, sink)
+    finally:
+        sink.close()
+    print(f"Simulation finished: {json.dumps(report, indent=2)}")
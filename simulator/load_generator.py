@@ -0,0 +1,150 @@
+import os
+import sys
+import time
+from itertools import islice
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+from messaging.metrics import LatencyRecorder, ThroughputMeter
+from messaging.codec import encode
+from messaging.transport import make_transport
+
+
+class TokenBucket:
+    """Token bucket used to pace publishing at a target messages-per-second rate."""
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.last_refill = time.perf_counter()
+
+    def _refill(self):
+        now = time.perf_counter()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def take(self, max_tokens):
+        """Take up to `max_tokens` whole tokens without blocking; returns how many were granted."""
+        self._refill()
+        granted = int(min(max_tokens, self.tokens))
+        self.tokens -= granted
+        return granted
+
+    def wait_time(self, tokens=1):
+        """Seconds until `tokens` tokens are available."""
+        self._refill()
+        missing = tokens - self.tokens
+        return max(0.0, missing / self.rate)
+
+
+class LoadGenerator:
+    """
+    Publishes fleet telemetry to Redis at a target rate.
+
+    Each tick takes a batch of tokens from a TokenBucket and publishes that
+    many packets through a single Redis pipeline, so the round trip cost is
+    paid once per batch rather than once per packet.
+    """
+
+    def __init__(self, redis_client, fleet_factory, rate, channel='sensor_data',
+                 tick_interval=0.01, max_batch=5000, report_interval=5.0, transport=None):
+        """
+        Args:
+            redis_client (redis.Redis): Client used for pipelined publishing
+            fleet_factory (callable): Returns a fresh FleetSimulator; called again
+                whenever the current fleet is delivered or spoiled
+            rate (float): Target messages per second
+            channel (str): Pub/Sub channel to publish to
+            tick_interval (float): Seconds between publishing batches
+            max_batch (int): Upper bound on packets per pipeline
+            report_interval (float): Seconds between progress reports
+            transport (str): 'pubsub' or 'streams', defaults to MESSAGE_TRANSPORT
+        """
+        self.redis_client = redis_client
+        self.transport = make_transport(redis_client, kind=transport)
+        self.fleet_factory = fleet_factory
+        self.rate = rate
+        self.channel = channel
+        self.batch_size = max(1, min(max_batch, int(rate * tick_interval)))
+        # Allow catching up after a slow flush, but never more than two batches at once
+        self.bucket = TokenBucket(rate, capacity=self.batch_size * 2)
+        self.report_interval = report_interval
+        self.latency = LatencyRecorder()
+        self.throughput = ThroughputMeter()
+        self.delivered = 0
+
+    def _packet_stream(self):
+        """Endless stream of sensor packets, restarting the fleet when it finishes."""
+        while True:
+            fleet = self.fleet_factory()
+            while not fleet.done:
+                yield from fleet.update()
+
+    def _publish_batch(self, packets):
+        pipe = self.redis_client.pipeline(transaction=False)
+        for packet in packets:
+            self.transport.publish(self.channel, encode(packet), client=pipe)
+        started = time.perf_counter()
+        results = pipe.execute()
+        self.latency.record(time.perf_counter() - started)
+        self.throughput.add(len(packets))
+        # PUBLISH returns the number of subscribers reached; XADD returns the entry id
+        self.delivered += sum(results) if self.transport.kind == 'pubsub' else len(results)
+
+    def report(self):
+        """Current throughput and publish (pipeline round trip) latency percentiles."""
+        return {
+            'target_rate': self.rate,
+            'achieved_rate': round(self.throughput.rate(), 1),
+            'published': self.throughput.count,
+            'delivered': self.delivered,
+            'batch_size': self.batch_size,
+            'publish_latency_ms': self.latency.summary()
+        }
+
+    def run(self, duration=None, max_messages=None):
+        """
+        Publish until `duration` seconds or `max_messages` have passed.
+
+        Returns:
+            dict: Final throughput and latency report
+        """
+        stream = self._packet_stream()
+        deadline = time.perf_counter() + duration if duration else None
+        next_report = time.perf_counter() + self.report_interval
+
+        try:
+            while True:
+                now = time.perf_counter()
+                if deadline and now >= deadline:
+                    break
+                if max_messages and self.throughput.count >= max_messages:
+                    break
+
+                wanted = self.batch_size
+                if max_messages:
+                    wanted = min(wanted, max_messages - self.throughput.count)
+                granted = self.bucket.take(wanted)
+                if not granted:
+                    time.sleep(self.bucket.wait_time(wanted))
+                    continue
+
+                self._publish_batch(list(islice(stream, granted)))
+
+                if now >= next_report:
+                    latency = self.latency.percentiles()
+                    print(
+                        f"Published {self.throughput.count} msgs at "
+                        f"{self.throughput.window_rate():.0f} msg/s (target {self.rate:.0f}), "
+                        f"pipeline latency p50={latency['p50']}ms p99={latency['p99']}ms"
+                    )
+                    next_report = now + self.report_interval
+
+        except KeyboardInterrupt:
+            print("Load generator stopped by user.")
+
+        return self.report()
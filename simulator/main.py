@@ -1,8 +1,13 @@
 import time
 import json
+import argparse
 import redis # Or use pika for RabbitMQ, or just print for simplest version
-from data_simulator import PalletSimulator
-from scenarios.default_scenario import run_default_scenario
+from data_simulator import PalletSimulator, FleetSimulator
+from load_generator import LoadGenerator
+from scenarios.default_scenario import run_default_scenario, DEFAULT_SEGMENTS
+from scenarios.timeline import CompiledScenarios
+from messaging.codec import encode
+from messaging.transport import make_transport
 
 # Configuration
 SIMULATION_SPEED = 1  # Seconds between updates
@@ -10,11 +15,48 @@ PALLET_ID = "PALLET_001"
 ORIGIN = [52.5200, 13.4050]  # Berlin
 DESTINATION = [52.3676, 4.9041]  # Amsterdam
 
+def run_load_generator(r, args):
+    """Stress-test the agents by publishing a fleet's telemetry at a target rate"""
+    print(f"Starting load generator: {args.pallets} pallets at {args.rate} msg/s...")
+    scenarios = CompiledScenarios({'default': DEFAULT_SEGMENTS})
+
+    def make_fleet():
+        fleet = FleetSimulator.uniform(args.pallets, ORIGIN, DESTINATION)
+        fleet.use_scenarios(scenarios, scenarios.index('default'))
+        return fleet
+
+    generator = LoadGenerator(
+        r,
+        make_fleet,
+        rate=args.rate,
+        max_batch=args.batch_size
+    )
+    report = generator.run(duration=args.duration, max_messages=args.messages)
+    print(f"Load test finished: {json.dumps(report, indent=2)}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pallet sensor data simulator")
+    parser.add_argument('--rate', type=float, help="Load-generator mode: target messages per second")
+    parser.add_argument('--pallets', type=int, default=1000, help="Fleet size in load-generator mode")
+    parser.add_argument('--batch-size', type=int, default=5000, help="Max packets per Redis pipeline")
+    parser.add_argument('--duration', type=float, help="Stop after this many seconds")
+    parser.add_argument('--messages', type=int, help="Stop after this many messages")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+
     # Connect to Redis to publish data (Agents will subscribe to this)
     # For a simpler version, just print the JSON and have agents read it.
     r = redis.Redis(host='localhost', port=6379, db=0)
 
+    if args.rate:
+        run_load_generator(r, args)
+        return
+
+    transport = make_transport(r)
     print("Initializing Pallet Simulator...")
     pallet = PalletSimulator(PALLET_ID, ORIGIN, DESTINATION)
 
@@ -28,7 +70,7 @@ def main():
             data_packet = pallet.update()
 
             # Publish the data to a channel for agents to listen to
-            r.publish('sensor_data', json.dumps(data_packet))
+            transport.publish('sensor_data', encode(data_packet))
             # Alternatively, for simplest setup: print(json.dumps(data_packet))
 
             print(f"Step {step_count}: {data_packet}")
@@ -0,0 +1,142 @@
+import numpy as np
+
+
+def _to_unit_vectors(latlon):
+    """Convert [..., (lat, lon)] in degrees to unit vectors on the sphere."""
+    lat = np.radians(latlon[..., 0])
+    lon = np.radians(latlon[..., 1])
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+class Route:
+    """
+    Read-only view of a cached route.
+
+    Behaves like the old list of (lat, lon) tuples (len() and indexing),
+    but positions are interpolated on demand from the shared route table.
+    """
+
+    __slots__ = ("cache", "route_id", "resolution")
+
+    def __init__(self, cache, route_id, resolution):
+        self.cache = cache
+        self.route_id = route_id
+        self.resolution = resolution
+
+    def __len__(self):
+        return self.resolution
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.resolution
+        if not 0 <= index < self.resolution:
+            raise IndexError("route index out of range")
+        lat, lon = self.cache.positions(np.array([self.route_id]), np.array([index]))[0]
+        return (float(lat), float(lon))
+
+    def __repr__(self):
+        return f"<Route id={self.route_id} steps={self.resolution}>"
+
+
+class RouteCache:
+    """
+    Shared cache of routes keyed by (origin, destination, resolution).
+
+    Each distinct route is stored once as a single row of a compact float
+    table (both endpoints as unit vectors, the central angle and the
+    resolution), so pallets on the same lane share the same buffer and no
+    per-step waypoint list is ever materialised. Positions are computed on
+    demand by great-circle (slerp) interpolation.
+    """
+
+    ROW_WIDTH = 8  # ax, ay, az, bx, by, bz, central angle, resolution
+
+    def __init__(self, initial_capacity=64, precision=6):
+        self.precision = precision
+        self._table = np.zeros((initial_capacity, self.ROW_WIDTH), dtype=np.float64)
+        self._ids = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def table(self):
+        """The route rows currently in use."""
+        return self._table[:len(self._ids)]
+
+    def _key(self, origin, destination, resolution):
+        p = self.precision
+        return (round(float(origin[0]), p), round(float(origin[1]), p),
+                round(float(destination[0]), p), round(float(destination[1]), p),
+                int(resolution))
+
+    def _grow(self):
+        grown = np.zeros((len(self._table) * 2, self.ROW_WIDTH), dtype=np.float64)
+        grown[:len(self._table)] = self._table
+        self._table = grown
+
+    def route_id(self, origin, destination, resolution=100):
+        """Return the id of the cached route, adding it to the table on first use."""
+        if resolution < 1:
+            raise ValueError("resolution must be at least 1")
+        key = self._key(origin, destination, resolution)
+        route_id = self._ids.get(key)
+        if route_id is not None:
+            return route_id
+
+        route_id = len(self._ids)
+        if route_id == len(self._table):
+            self._grow()
+        endpoints = _to_unit_vectors(np.array([key[0:2], key[2:4]], dtype=np.float64))
+        angle = np.arccos(np.clip(np.dot(endpoints[0], endpoints[1]), -1.0, 1.0))
+        self._table[route_id, 0:3] = endpoints[0]
+        self._table[route_id, 3:6] = endpoints[1]
+        self._table[route_id, 6] = angle
+        self._table[route_id, 7] = resolution
+        self._ids[key] = route_id
+        return route_id
+
+    def route(self, origin, destination, resolution=100):
+        """Return a shared Route view for the given lane."""
+        return Route(self, self.route_id(origin, destination, resolution), int(resolution))
+
+    def route_ids(self, origins, destinations, resolution=100):
+        """Vectorized route_id() for (n, 2) arrays; only distinct lanes are looked up."""
+        lanes = np.hstack([np.asarray(origins, dtype=np.float64), np.asarray(destinations, dtype=np.float64)])
+        unique_lanes, inverse = np.unique(np.round(lanes, self.precision), axis=0, return_inverse=True)
+        ids = np.array([
+            self.route_id(lane[0:2], lane[2:4], resolution) for lane in unique_lanes
+        ], dtype=np.int32)
+        return ids[inverse.ravel()]
+
+    def positions(self, route_ids, route_indices):
+        """
+        Great-circle positions for many (route id, route index) pairs at once.
+
+        Args:
+            route_ids (np.ndarray): Route id per position
+            route_indices (np.ndarray): Step index along each route
+
+        Returns:
+            np.ndarray: (n, 2) array of [lat, lon] in degrees
+        """
+        rows = self._table[route_ids]
+        start, end, angle, resolution = rows[:, 0:3], rows[:, 3:6], rows[:, 6], rows[:, 7]
+        fraction = np.asarray(route_indices, dtype=np.float64) / np.maximum(resolution - 1, 1)
+
+        sin_angle = np.sin(angle)
+        short = sin_angle < 1e-12
+        safe_sin = np.where(short, 1.0, sin_angle)
+        # Slerp weights; fall back to linear weights when the endpoints coincide
+        w_start = np.where(short, 1.0 - fraction, np.sin((1.0 - fraction) * angle) / safe_sin)
+        w_end = np.where(short, fraction, np.sin(fraction * angle) / safe_sin)
+        points = w_start[:, None] * start + w_end[:, None] * end
+
+        lat = np.degrees(np.arcsin(np.clip(points[:, 2] / np.linalg.norm(points, axis=1), -1.0, 1.0)))
+        lon = np.degrees(np.arctan2(points[:, 1], points[:, 0]))
+        return np.stack([lat, lon], axis=1)
+
+
+# Process-wide cache shared by every simulator
+ROUTE_CACHE = RouteCache()
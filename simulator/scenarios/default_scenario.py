@@ -1,3 +1,13 @@
+from scenarios.timeline import Segment
+
+# Declarative form of run_default_scenario, for compiling with CompiledScenarios
+DEFAULT_SEGMENTS = [
+    Segment(start=0, end=30, cooling_efficiency=0.97, is_moving=True),
+    Segment(start=30, end=60, cooling_efficiency=0.85, is_moving=False),
+    Segment(start=60, end=None, cooling_efficiency=0.97, is_moving=True),
+]
+
+
 def run_default_scenario(pallet_simulator, step_count):
     """
     A sample scenario: normal operation, then a traffic jam causes a problem.
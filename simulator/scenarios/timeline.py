@@ -0,0 +1,82 @@
+from collections import namedtuple
+import numpy as np
+
+# Conditions PalletSimulator starts with, used for steps no segment covers
+DEFAULT_COOLING_EFFICIENCY = 0.97
+DEFAULT_IS_MOVING = True
+
+
+class Segment(namedtuple('Segment', ['start', 'end', 'cooling_efficiency', 'is_moving'])):
+    """
+    Conditions that hold for steps [start, end). An `end` of None means
+    the segment lasts for the rest of the journey.
+    """
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a segment from a declarative dict, e.g. loaded from JSON."""
+        return cls(
+            int(data['start']),
+            None if data.get('end') is None else int(data['end']),
+            float(data['cooling_efficiency']),
+            bool(data['is_moving'])
+        )
+
+
+class CompiledScenarios:
+    """
+    A set of scenarios compiled once into per-step lookup tables.
+
+    Row k of `cooling_efficiency` and `is_moving` holds scenario k's
+    conditions for every step; the last column stands for every step past
+    the horizon. Applying the scenarios to a fleet is then a single array
+    gather per tick instead of one Python callback per pallet.
+    """
+
+    def __init__(self, scenarios):
+        """
+        Args:
+            scenarios (dict): Scenario name -> list of Segment (or segment dicts)
+        """
+        self.names = list(scenarios)
+        compiled = [
+            [s if isinstance(s, Segment) else Segment.from_dict(s) for s in segments]
+            for segments in scenarios.values()
+        ]
+
+        bounds = [seg.end if seg.end is not None else seg.start + 1 for segs in compiled for seg in segs]
+        self.horizon = max(bounds, default=0)
+        width = self.horizon + 1
+
+        self.cooling_efficiency = np.full((len(compiled), width), DEFAULT_COOLING_EFFICIENCY)
+        self.is_moving = np.full((len(compiled), width), DEFAULT_IS_MOVING, dtype=bool)
+        for row, segments in enumerate(compiled):
+            # Later segments win where segments overlap
+            for seg in segments:
+                stop = width if seg.end is None else seg.end
+                self.cooling_efficiency[row, seg.start:stop] = seg.cooling_efficiency
+                self.is_moving[row, seg.start:stop] = seg.is_moving
+
+    def index(self, name):
+        """Row index of a scenario, for building per-pallet scenario id arrays."""
+        return self.names.index(name)
+
+    def lookup(self, scenario_ids, steps):
+        """
+        Conditions for each pallet at its current step.
+
+        Args:
+            scenario_ids (np.ndarray): Scenario row per pallet
+            steps (int or np.ndarray): Step count, shared or per pallet
+
+        Returns:
+            tuple: (cooling_efficiency, is_moving) arrays
+        """
+        columns = np.minimum(steps, self.horizon)
+        return self.cooling_efficiency[scenario_ids, columns], self.is_moving[scenario_ids, columns]
+
+    def apply(self, fleet, scenario_ids, steps):
+        """Set a FleetSimulator's conditions for this tick in one gather."""
+        efficiency, moving = self.lookup(scenario_ids, steps)
+        fleet.cooling_unit_efficiency[:] = efficiency
+        fleet.is_moving[:] = moving